@@ -11,7 +11,7 @@ setup(
   download_url = 'https://github.com/bgutter/sylvia/archive/development/0.3.tar.gz',
   keywords = [ 'cmudict', 'phoneme', 'phonetic', 'rhyme', 'regex' ],
   classifiers = [],
-  package_data={ 'sylvia': [ 'data/cmudict.sylviabin' ] },
+  package_data={ 'sylvia': [ 'data/cmudict.sylviabin', 'data/inferencer.sylviabin' ] },
   install_requires=[
       "epc",
       ]
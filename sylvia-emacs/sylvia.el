@@ -75,6 +75,24 @@
   "Find rhymes for a word. If callback is given, the call is async."
   (sylvia:--epc-sync-or-async 'rhyme `(,word ,(symbol-name rhyme-level)) callback))
 
+(defun sylvia:homophones (word &optional callback)
+  "Find words pronounced exactly like a word. If callback is given, the call is async."
+  (sylvia:--epc-sync-or-async 'homophones `(,word) callback))
+
+(defun sylvia:words-pronounced (phonemes &optional callback)
+  "Find words pronounced exactly as a list of phonemes. If callback is given, the call is async."
+  (sylvia:--epc-sync-or-async 'words_pronounced `(,phonemes) callback))
+
+(defun sylvia:near (word &optional max-distance callback)
+  "Find (word distance) pairs for words sounding close to a word, closest first.
+If callback is given, the call is async."
+  (sylvia:--epc-sync-or-async 'near `(,word ,(or max-distance 1.0)) callback))
+
+(defun sylvia:similar (word &optional k callback)
+  "Rank the k words sounding most like a word, as (word score) pairs, best first.
+If callback is given, the call is async."
+  (sylvia:--epc-sync-or-async 'similar `(,word ,(or k 20)) callback))
+
 (defun sylvia:get-rhyme-levels (&optional callback)
   "Return list of supported rhyme levels."
   (sylvia:--epc-sync-or-async 'rhyme_levels '() callback))
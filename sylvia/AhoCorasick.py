@@ -0,0 +1,99 @@
+#
+# AhoCorasick.py
+#
+# Find every occurrence of many strings in a text in a single pass,
+# however many strings there are.
+#
+# The strings are stored in a trie, each node of which is a state. Each
+# state also knows where to go on any character which doesn't extend
+# its prefix: to the state of its longest proper suffix which is still
+# a prefix of some string. Following those transitions over a text
+# passes through a state whenever one of the strings ends there.
+#
+
+class AhoCorasickAutomaton( object ):
+    """
+    Matches a fixed set of non-empty byte strings, each with an output,
+    against a text.
+
+    Transitions are complete, and kept in one flat table with a column
+    for each character in the strings, plus one for every other
+    character, which always leads back to the start. The next state is
+    table[ state * width + columns[ byte ] ].
+    """
+
+    def __init__( self, patterns=None, alphabet=None, table=None, outputs=None ):
+        """
+        patterns is a list of ( string, output ) pairs. Strings may repeat,
+        each with its own output.
+
+        Instead of patterns, an automaton which has been saved can be
+        restored from its alphabet, table and outputs attributes.
+        """
+        if patterns is None:
+            self.setTables( alphabet, table, outputs )
+            return
+        goto = [ {} ]
+        outputs = [ [] ]
+        for string, output in patterns:
+            if not string:
+                raise ValueError( "AhoCorasickAutomaton can't match an empty string." )
+            state = 0
+            for c in string:
+                if c not in goto[ state ]:
+                    goto[ state ][ c ] = len( goto )
+                    goto.append( {} )
+                    outputs.append( [] )
+                state = goto[ state ][ c ]
+            outputs[ state ].append( ( len( string ), output ) )
+
+        #
+        # Breadth first, so that every state's suffix state is finished
+        # before it's needed
+        #
+        alphabet = "".join( sorted( set( [ c for string, output in patterns for c in string ] ) ) )
+        transitions = [ None ] * len( goto )
+        transitions[ 0 ] = dict( [ ( c, goto[ 0 ].get( c, 0 ) ) for c in alphabet ] )
+        fail = [ 0 ] * len( goto )
+        queue = goto[ 0 ].values()
+        for state in queue:
+            outputs[ state ] += outputs[ fail[ state ] ]
+            transitions[ state ] = dict( transitions[ fail[ state ] ] )
+            for c, child in goto[ state ].iteritems():
+                fail[ child ] = transitions[ fail[ state ] ][ c ]
+                transitions[ state ][ c ] = child
+                queue.append( child )
+
+        table = []
+        for stateTransitions in transitions:
+            table.extend( [ stateTransitions[ c ] for c in alphabet ] )
+            table.append( 0 )
+        self.setTables( alphabet, table, [ tuple( o ) for o in outputs ] )
+
+    def setTables( self, alphabet, table, outputs ):
+        """
+        Take on a transition table and outputs, and work out the column
+        of each byte from the alphabet.
+        """
+        self.alphabet = alphabet
+        self.table = table
+        self.outputs = outputs
+        self.width = len( alphabet ) + 1
+        self.columns = [ len( alphabet ) ] * 256
+        for column, c in enumerate( alphabet ):
+            self.columns[ ord( c ) ] = column
+
+    def findAll( self, text ):
+        """
+        Yield ( start, end, output ) for every occurrence in text of every
+        string, in order of where they end.
+        """
+        table = self.table
+        columns = self.columns
+        width = self.width
+        outputs = self.outputs
+        state = 0
+        for end, b in enumerate( bytearray( text ), 1 ):
+            state = table[ state * width + columns[ b ] ]
+            for length, output in outputs[ state ]:
+                yield end - length, end, output
@@ -0,0 +1,107 @@
+#
+# DictionaryCompiler.py
+#
+# Compiles a text phonetic dictionary and popularity file into a
+# .sylviabin, and keeps compiled files up to date with their sources.
+#
+# A compiled file records a hash of the text files it was compiled
+# from. Loading through loadCompiledPhoneticDictionary compares that
+# against the text files as they are now, and compiles again when
+# they differ.
+#
+
+from PhoneticDictionary import *
+
+import hashlib
+import os
+
+SOURCE_HASH_CHUNK_SIZE = 1 << 16
+
+def hashSources( paths ):
+    """
+    Return a hex digest of the contents of the files at paths, read a
+    chunk at a time.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update( "{}\n".format( os.path.getsize( path ) ) )
+        with open( path, "rb" ) as fin:
+            for chunk in iter( lambda: fin.read( SOURCE_HASH_CHUNK_SIZE ), "" ):
+                digest.update( chunk )
+    return digest.hexdigest()
+
+def compiledSourceHash( binPath ):
+    """
+    Return the source hash recorded in a compiled dictionary, or None if
+    there isn't one, or the file is missing or unreadable.
+    """
+    try:
+        with open( binPath, "rb" ) as fin:
+            reader = openSylviaBin( fin )
+    except ( IOError, ValueError ):
+        return None
+    if not reader.hasSection( SECTION_SOURCE_HASH ):
+        return None
+    return reader.stringTable( SECTION_SOURCE_HASH )[ 0 ]
+
+def defaultCompiledPath( phoneticPath ):
+    """
+    Where a text dictionary is compiled to when no path is given: beside
+    it, with a .sylviabin extension.
+    """
+    return os.path.splitext( phoneticPath )[ 0 ] + ".sylviabin"
+
+def saveBinAtomically( pd, outPath ):
+    """
+    Save pd to outPath by way of a temporary file, so that a reader never
+    sees a half written dictionary.
+    """
+    tempPath = outPath + ".tmp"
+    pd.saveBin( tempPath )
+    try:
+        os.rename( tempPath, outPath )
+    except OSError:
+        #
+        # Windows won't rename over an existing file
+        #
+        os.remove( outPath )
+        os.rename( tempPath, outPath )
+
+def compileDictionary( phoneticPath, popularityPath, outPath=None, **kwargs ):
+    """
+    Compile a text phonetic dictionary and popularity file into a
+    .sylviabin at outPath, defaulting to defaultCompiledPath(). Both
+    files are read a line at a time. Returns the compiled dictionary,
+    built with kwargs as for PhoneticDictionary.
+    """
+    if outPath is None:
+        outPath = defaultCompiledPath( phoneticPath )
+    sourceHash = hashSources( [ phoneticPath, popularityPath ] )
+    with open( phoneticPath, "r" ) as finPhonetic:
+        with open( popularityPath, "r" ) as finPop:
+            pd = PhoneticDictionary( textFile=finPhonetic, wordPopFile=finPop, **kwargs )
+    pd.sourceHash = sourceHash
+    saveBinAtomically( pd, outPath )
+    return pd
+
+def loadCompiledPhoneticDictionary( phoneticPath, popularityPath, binPath=None, **kwargs ):
+    """
+    Load a text phonetic dictionary and popularity file through their
+    compiled .sylviabin at binPath, defaulting to defaultCompiledPath().
+    The compiled file is rebuilt first if it's missing, or was compiled
+    from different text. If it can't be written, the text is loaded
+    directly.
+
+    kwargs are as for PhoneticDictionary.
+    """
+    if binPath is None:
+        binPath = defaultCompiledPath( phoneticPath )
+    if compiledSourceHash( binPath ) != hashSources( [ phoneticPath, popularityPath ] ):
+        try:
+            compileDictionary( phoneticPath, popularityPath, binPath )
+        except ( IOError, OSError ):
+            with open( phoneticPath, "r" ) as finPhonetic:
+                with open( popularityPath, "r" ) as finPop:
+                    return PhoneticDictionary( textFile=finPhonetic, wordPopFile=finPop, **kwargs )
+    with open( binPath, "rb" ) as fin:
+        return PhoneticDictionary( binFile=fin, **kwargs )
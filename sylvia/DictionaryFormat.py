@@ -0,0 +1,269 @@
+#
+# DictionaryFormat.py
+#
+# Reading and writing the versioned, indexed .sylviabin format.
+#
+# * Layout
+#
+# All integers are little-endian.
+#
+# |--------------------------------+----------------------------------------------|
+# | Field                          | Contents                                     |
+# |--------------------------------+----------------------------------------------|
+# | Magic                          | SYLVIA_BIN_MAGIC (8 bytes)                   |
+# | Version                        | uint32                                       |
+# | Section count                  | uint32                                       |
+# | Section table                  | ( 4 byte tag, uint32 offset, uint32 length ) |
+# |                                | for each section                             |
+# | Sections                       | Raw section data, located by the table       |
+# |--------------------------------+----------------------------------------------|
+#
+# Sections are either columns (a flat array of fixed width integers),
+# or string tables. A string table is a uint32 count, followed by
+# count + 1 uint32 offsets into a blob, followed by the blob itself.
+# The blob starts with a newline, and each string is followed by one,
+# so string i is blob[ offsets[ i ] : offsets[ i + 1 ] - 1 ]. Because
+# of this, a string table of encoded pronunciations can be searched
+# directly as a newline-delimited buffer.
+#
+# Readers ignore sections they do not know about.
+#
+
+import struct
+import mmap
+
+SYLVIA_BIN_MAGIC   = "SYLVBIN\x00"
+SYLVIA_BIN_VERSION = 2
+
+SECTION_WORDS          = "WORD" # String table of words, by descending popularity
+SECTION_ALPHABETICAL   = "ALPH" # uint32 column of word ids, in alphabetical order of their words
+SECTION_POPULARITIES   = "POPS" # int64 column of popularity, by word id
+SECTION_WORD_INDEX     = "WIDX" # uint32 column of first pronunciation id, by word id. One extra trailing entry.
+SECTION_PRONUNCIATIONS = "PRON" # String table of encoded pronunciations, grouped by word id
+SECTION_RHYME_KEYS     = "RKEY" # String table of the encoded vowels of each pronunciation, by pronunciation id
+SECTION_PRONUNCIATION_OWNERS = "POWN" # uint32 column of word id, by pronunciation id
+SECTION_WORD_LENGTH_ORDER    = "WLEN" # uint32 column of word ids, ordered by word length, then id
+SECTION_WORD_LENGTH_STARTS   = "WLST" # uint32 column of the position in WLEN of the first word of each length. One extra trailing entry.
+SECTION_SOURCE_HASH          = "SRCH" # String table holding the hash of the text files compiled into this one, if any
+SECTION_BUCKET_ORDER         = "BORD" # uint32 column of pronunciation ids, ordered by phoneme count, then vowel count, then id
+SECTION_BUCKET_KEYS          = "BKEY" # uint32 column of the phoneme count and vowel count of each run of BORD sharing both, in pairs
+SECTION_BUCKET_STARTS        = "BKST" # uint32 column of the position in BORD of each run's first pronunciation. One extra trailing entry.
+SECTION_NGRAM_GRAMS          = "NGRM" # String table of every phoneme n-gram in any pronunciation, sorted. See PhonemeNgramIndex.
+SECTION_NGRAM_STARTS         = "NGST" # uint32 column of the position in NGPS of each n-gram's first pronunciation id. One extra trailing entry.
+SECTION_NGRAM_POSTINGS       = "NGPS" # uint32 column of the ids of the pronunciations containing each n-gram, n-gram by n-gram
+
+HEADER_FORMAT        = "<8sII"
+SECTION_ENTRY_FORMAT = "<4sII"
+
+COLUMN_FORMATS = { "i" : "<i", "I" : "<I", "q" : "<q" }
+
+def isSylviaBin( prefix ):
+    """
+    Does this leading chunk of a file look like a versioned .sylviabin?
+    """
+    return prefix.startswith( SYLVIA_BIN_MAGIC )
+
+class MappedColumn( object ):
+    """
+    Read-only sequence of fixed width integers, backed by a buffer.
+
+    Values are unpacked on access, so nothing is copied out of the
+    buffer until asked for. Slices unpack only what they cover.
+    """
+
+    def __init__( self, buf, offset, count, typecode ):
+        self.buf    = buf
+        self.offset = offset
+        self.count  = count
+        self.fmt    = COLUMN_FORMATS[ typecode ]
+        self.width  = struct.calcsize( self.fmt )
+
+    def __len__( self ):
+        return self.count
+
+    def __getitem__( self, i ):
+        if isinstance( i, slice ):
+            start, stop, step = i.indices( self.count )
+            if step != 1:
+                return self.values()[ i ]
+            return struct.unpack_from( "<" + str( max( stop - start, 0 ) ) + self.fmt[ 1 ], self.buf, self.offset + start * self.width )
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError( "column index out of range" )
+        return struct.unpack_from( self.fmt, self.buf, self.offset + i * self.width )[ 0 ]
+
+    def __iter__( self ):
+        return iter( self.values() )
+
+    def values( self ):
+        """
+        Unpack the entire column at once.
+        """
+        return struct.unpack_from( "<" + str( self.count ) + self.fmt[ 1 ], self.buf, self.offset )
+
+class MappedStringTable( object ):
+    """
+    Read-only sequence of strings, backed by a buffer holding a
+    string table section.
+    """
+
+    def __init__( self, buf, offset ):
+        self.buf       = buf
+        self.count     = struct.unpack_from( "<I", buf, offset )[ 0 ]
+        self.offsets   = MappedColumn( buf, offset + 4, self.count + 1, "I" )
+        self.blobStart = offset + 4 + 4 * ( self.count + 1 )
+
+    def __len__( self ):
+        return self.count
+
+    def __getitem__( self, i ):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError( "string table index out of range" )
+        start, stop = struct.unpack_from( "<II", self.buf, self.offsets.offset + 4 * i )
+        return self.buf[ self.blobStart + start : self.blobStart + stop - 1 ]
+
+    def __iter__( self ):
+        return iter( self.values() )
+
+    def values( self ):
+        """
+        Split the entire table at once. Much faster than indexing
+        each string when scanning.
+        """
+        if self.count == 0:
+            return []
+        return self.buf[ self.blobStart + 1 : self.blobStart + self.blobLength() - 1 ].split( "\n" )
+
+    def blobLength( self ):
+        """
+        Size of the newline-delimited blob, in bytes.
+        """
+        return self.offsets[ self.count ]
+
+class SylviaBinReader( object ):
+    """
+    Locate the sections of a .sylviabin held in a buffer. The buffer may be
+    an mmap, in which case pages are only read in as sections are touched.
+    """
+
+    def __init__( self, buf ):
+        self.buf = buf
+        if not isSylviaBin( buf[ : len( SYLVIA_BIN_MAGIC ) ] ):
+            raise ValueError( "Not a .sylviabin file." )
+        #
+        # Everything read below is checked to lie within the buffer, so a
+        # truncated file is a ValueError rather than a struct.error
+        #
+        pos = struct.calcsize( HEADER_FORMAT )
+        if len( buf ) < pos:
+            raise ValueError( "Truncated .sylviabin header." )
+        magic, self.version, sectionCount = struct.unpack_from( HEADER_FORMAT, buf, 0 )
+        if self.version > SYLVIA_BIN_VERSION:
+            raise ValueError( "Unsupported .sylviabin version: {}".format( self.version ) )
+        if len( buf ) < pos + sectionCount * struct.calcsize( SECTION_ENTRY_FORMAT ):
+            raise ValueError( "Truncated .sylviabin section table." )
+        self.sections = {}
+        for i in range( sectionCount ):
+            tag, offset, length = struct.unpack_from( SECTION_ENTRY_FORMAT, buf, pos )
+            if offset + length > len( buf ):
+                raise ValueError( "Truncated .sylviabin section: {}".format( tag ) )
+            self.sections[ tag ] = ( offset, length )
+            pos += struct.calcsize( SECTION_ENTRY_FORMAT )
+
+    def hasSection( self, tag ):
+        return tag in self.sections
+
+    def section( self, tag ):
+        """
+        Get the ( offset, length ) of a section which must be present.
+        """
+        if tag not in self.sections:
+            raise ValueError( "Missing .sylviabin section: {}".format( tag ) )
+        return self.sections[ tag ]
+
+    def column( self, tag, typecode ):
+        """
+        Get a column section as a MappedColumn.
+        """
+        offset, length = self.section( tag )
+        return MappedColumn( self.buf, offset, length / struct.calcsize( COLUMN_FORMATS[ typecode ] ), typecode )
+
+    def stringTable( self, tag ):
+        """
+        Get a string table section as a MappedStringTable, checking that
+        its offsets and blob fit within the section.
+        """
+        offset, length = self.section( tag )
+        if length < 4:
+            raise ValueError( "Corrupt .sylviabin string table: {}".format( tag ) )
+        table = MappedStringTable( self.buf, offset )
+        if table.blobStart > offset + length or table.blobStart + table.blobLength() > offset + length:
+            raise ValueError( "Corrupt .sylviabin string table: {}".format( tag ) )
+        return table
+
+def sequenceValues( seq ):
+    """
+    Get something quick to iterate and index from either a plain list, or
+    one of the mapped sequences above.
+    """
+    if isinstance( seq, ( MappedColumn, MappedStringTable ) ):
+        return seq.values()
+    return seq
+
+def openSylviaBin( fin, consumed="" ):
+    """
+    Create a SylviaBinReader for an open file. Real files are memory mapped,
+    so that several processes share the same pages. Anything else is read
+    into memory, after whatever prefix the caller has already consumed.
+    """
+    try:
+        fileno = fin.fileno()
+    except ( AttributeError, IOError ):
+        fileno = None
+    if fileno is not None:
+        buf = mmap.mmap( fileno, 0, access=mmap.ACCESS_READ )
+    else:
+        buf = consumed + fin.read()
+    return SylviaBinReader( buf )
+
+def packColumn( values, typecode ):
+    """
+    Encode a sequence of integers as a column section.
+    """
+    return struct.pack( "<" + str( len( values ) ) + COLUMN_FORMATS[ typecode ][ 1 ], *values )
+
+def packStringTable( strings ):
+    """
+    Encode a sequence of strings as a string table section.
+    """
+    offsets = []
+    pos = 1
+    for s in strings:
+        offsets.append( pos )
+        pos += len( s ) + 1
+    offsets.append( pos )
+    blob = "\n" + "".join( [ s + "\n" for s in strings ] )
+    return struct.pack( "<I", len( strings ) ) + packColumn( offsets, "I" ) + blob
+
+def writeSylviaBin( fout, sections ):
+    """
+    Write a list of ( tag, data ) sections as a .sylviabin.
+    """
+    pos = struct.calcsize( HEADER_FORMAT ) + len( sections ) * struct.calcsize( SECTION_ENTRY_FORMAT )
+    table = []
+    for tag, data in sections:
+        # Keep sections 8 byte aligned
+        pos += ( -pos ) % 8
+        table.append( struct.pack( SECTION_ENTRY_FORMAT, tag, pos, len( data ) ) )
+        pos += len( data )
+    fout.write( struct.pack( HEADER_FORMAT, SYLVIA_BIN_MAGIC, SYLVIA_BIN_VERSION, len( sections ) ) )
+    fout.write( "".join( table ) )
+    pos = struct.calcsize( HEADER_FORMAT ) + len( sections ) * struct.calcsize( SECTION_ENTRY_FORMAT )
+    for tag, data in sections:
+        padding = ( -pos ) % 8
+        fout.write( "\x00" * padding )
+        fout.write( data )
+        pos += padding + len( data )
@@ -0,0 +1,168 @@
+#
+# InferenceBenchmark.py
+#
+# Score the PronunciationInferencer against the dictionary: how quickly
+# it guesses, and how close its guesses come to the real pronunciations.
+# Results can be written as JSON, to compare one version with the next.
+#
+# Run with:
+#   python2 -m sylvia.InferenceBenchmark [-n COUNT] [-j WORKERS] [--json PATH]
+#
+
+from PhoneticDictionary import *
+from PronunciationInferencer import *
+from PhonemeEditDistance import *
+
+import argparse
+import json
+import math
+import multiprocessing
+import sys
+import time
+
+#
+# Substituting a consonant for another with the same manner of
+# articulation, like M for N, costs less than SUBSTITUTION_COST.
+# Substitutions across vowels and consonants cost the most.
+#
+SAME_MANNER_SUBSTITUTION_COST = 0.75
+
+def evaluationCost( a, b ):
+    """
+    Return the cost of guessing encoded phoneme b where a is right.
+    """
+    cost = substitutionCost( a, b )
+    if cost == SUBSTITUTION_COST and PHONEME_DETAILS__by_encoded[ a ].manner == PHONEME_DETAILS__by_encoded[ b ].manner:
+        return SAME_MANNER_SUBSTITUTION_COST
+    return cost
+
+EVALUATION_COSTS = dict( [ ( a, dict( [ ( b, evaluationCost( a, b ) ) for b in PHONEME_DETAILS__by_encoded ] ) ) for a in PHONEME_DETAILS__by_encoded ] )
+
+def popularityWeight( popularity ):
+    """
+    How much a word's error counts, from its popularity. Popularities
+    span ten orders of magnitude, so they're dampened with a log. Words
+    of unknown popularity count for nothing.
+    """
+    return math.log1p( max( popularity, 0 ) )
+
+def percentile( sortedValues, fraction ):
+    """
+    Return the nearest rank percentile of a sorted list.
+    """
+    if not sortedValues:
+        return None
+    return sortedValues[ max( 0, int( math.ceil( fraction * len( sortedValues ) ) ) - 1 ) ]
+
+def scoreWords( pd, pi, wordIds ):
+    """
+    Infer each word, and compare it with the dictionary. Returns a list of
+    ( word id, seconds to infer, exact match, edit distance ) where the
+    distance is to the closest real pronunciation, with EVALUATION_COSTS.
+    """
+    scores = []
+    for wordId in wordIds:
+        word = pd.words[ wordId ]
+        start = time.time()
+        guess = pi.pronounce( word )
+        elapsed = time.time() - start
+        real = pd.findPronunciationsById( wordId )
+        encodedGuess = encodePronunciation( guess )
+        distance = min( [ phonemeEditDistance( encodePronunciation( r ), encodedGuess, EVALUATION_COSTS ) for r in real ] )
+        scores.append( ( wordId, elapsed, guess in real, distance ) )
+    return scores
+
+#
+# The dictionary and inferencer being scored by worker processes, which
+# inherit them when they're forked
+#
+_SCORING = None
+
+def _scoreChunk( wordIds ):
+    """
+    Worker side of evaluateInferencer.
+    """
+    pd, pi = _SCORING
+    return scoreWords( pd, pi, wordIds )
+
+def evaluateInferencer( pd, pi, count=None, workers=None, chunksize=PRONOUNCE_CHUNK_SIZE ):
+    """
+    Score pi on the count most popular words of pd with letters in them,
+    or all of them, in workers processes. Returns a dict of results.
+
+    Throughput is timed over pronounceMany. Each word is then inferred
+    again, and timed alone, while it's scored. The inferencer's cache is
+    turned off throughout, so every word is inferred from scratch, and
+    put back afterwards.
+    """
+    global _SCORING
+    wordIds = [ i for i in xrange( len( pd.words ) ) if superSanitizeWord( pd.words[ i ] ) ][ :count ]
+    words = [ pd.words[ i ] for i in wordIds ]
+    cache = pi.cache
+    pi.setCacheSize( 0 )
+    try:
+        start = time.time()
+        for word, pronunciation in pi.pronounceMany( words, workers=workers, chunksize=chunksize ):
+            pass
+        elapsed = time.time() - start
+
+        chunks = [ wordIds[ i : i + chunksize ] for i in xrange( 0, len( wordIds ), chunksize ) ]
+        if workers is None or workers <= 1:
+            scored = [ scoreWords( pd, pi, chunk ) for chunk in chunks ]
+        else:
+            _SCORING = ( pd, pi )
+            pool = multiprocessing.Pool( workers )
+            try:
+                scored = pool.map( _scoreChunk, chunks )
+            finally:
+                pool.terminate()
+                pool.join()
+                _SCORING = None
+    finally:
+        pi.cache = cache
+    scores = [ score for chunk in scored for score in chunk ]
+
+    latencies = sorted( [ seconds for wordId, seconds, exact, distance in scores ] )
+    weights = [ popularityWeight( pd.popularityColumn[ wordId ] ) for wordId, seconds, exact, distance in scores ]
+    totalWeight = sum( weights ) or 1.0
+    return {
+        "words"                     : len( scores ),
+        "workers"                   : workers or 1,
+        "rules"                     : len( pi.rules ),
+        "seconds"                   : elapsed,
+        "words_per_second"          : len( scores ) / elapsed if elapsed else None,
+        "latency_p50_us"            : percentile( latencies, 0.5 ) * 1e6 if scores else None,
+        "latency_p99_us"            : percentile( latencies, 0.99 ) * 1e6 if scores else None,
+        "exact_match_rate"          : float( sum( [ exact for wordId, seconds, exact, distance in scores ] ) ) / ( len( scores ) or 1 ),
+        "mean_distance"             : sum( [ distance for wordId, seconds, exact, distance in scores ] ) / ( len( scores ) or 1 ),
+        "weighted_exact_match_rate" : sum( [ w for w, s in zip( weights, scores ) if s[ 2 ] ] ) / totalWeight,
+        "weighted_distance"         : sum( [ w * s[ 3 ] for w, s in zip( weights, scores ) ] ) / totalWeight,
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument( "-n", "--count", type=int, help="Score only this many of the most popular words. Defaults to all of them." )
+    parser.add_argument( "-j", "--workers", type=int, default=multiprocessing.cpu_count(), help="Score with this many processes." )
+    parser.add_argument( "-c", "--chunksize", type=int, default=PRONOUNCE_CHUNK_SIZE, help="Send workers this many words at a time." )
+    parser.add_argument( "--json", help="Also write the results as JSON to this path, or - for stdout." )
+    args = parser.parse_args()
+    if args.count is not None and args.count < 1:
+        parser.error( "--count must be at least 1." )
+    if args.chunksize < 1:
+        parser.error( "--chunksize must be at least 1." )
+
+    results = evaluateInferencer( loadDefaultPhoneticDictionary(), loadDefaultPronunciationInferencer(), args.count, args.workers, args.chunksize )
+    if args.json == "-":
+        json.dump( results, sys.stdout, indent=2, sort_keys=True )
+        print
+    else:
+        for key in sorted( results.keys() ):
+            value = results[ key ]
+            if value is None:
+                value = "-"
+            elif not isinstance( value, int ):
+                value = "{:.4f}".format( value )
+            print "{:<28}{:>14}".format( key, value )
+        if args.json:
+            with open( args.json, "w" ) as fout:
+                json.dump( results, fout, indent=2, sort_keys=True )
@@ -0,0 +1,91 @@
+#
+# LruCache.py
+#
+# A bounded mapping which forgets its least recently used entries, for
+# memoizing results which are expensive to compute and likely to be
+# asked for again.
+#
+
+class LruCache( object ):
+    """
+    Maps keys to values, holding at most maxSize entries. Entries are
+    kept on a circular doubly linked list, most recently used first, so
+    that lookups, insertions and evictions are all O(1).
+
+    Counts hits and misses, for judging whether a cache pays its way.
+    """
+
+    PREV, NEXT, KEY, VALUE = 0, 1, 2, 3
+
+    def __init__( self, maxSize ):
+        if maxSize < 1:
+            raise ValueError( "LruCache needs a maxSize of at least 1, not {}.".format( maxSize ) )
+        self.maxSize = maxSize
+        self.clear()
+
+    def clear( self ):
+        """
+        Forget every entry, and reset the hit and miss counts.
+        """
+        self.links = {}
+        self.root = []
+        self.root[:] = [ self.root, self.root, None, None ]
+        self.hits = 0
+        self.misses = 0
+
+    def __len__( self ):
+        return len( self.links )
+
+    def __contains__( self, key ):
+        return key in self.links
+
+    def get( self, key, default=None ):
+        """
+        Return the value for key, marking it most recently used, or default
+        if we don't have it.
+        """
+        link = self.links.get( key )
+        if link is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        root = self.root
+        if link is not root[ self.NEXT ]:
+            prev, next = link[ self.PREV ], link[ self.NEXT ]
+            prev[ self.NEXT ] = next
+            next[ self.PREV ] = prev
+            first = root[ self.NEXT ]
+            link[ self.PREV ] = root
+            link[ self.NEXT ] = first
+            first[ self.PREV ] = link
+            root[ self.NEXT ] = link
+        return link[ self.VALUE ]
+
+    def put( self, key, value ):
+        """
+        Store value for key, as the most recently used entry, evicting the
+        least recently used if we're full.
+        """
+        root = self.root
+        link = self.links.get( key )
+        if link is not None:
+            prev, next = link[ self.PREV ], link[ self.NEXT ]
+            prev[ self.NEXT ] = next
+            next[ self.PREV ] = prev
+        elif len( self.links ) >= self.maxSize:
+            last = root[ self.PREV ]
+            before = last[ self.PREV ]
+            before[ self.NEXT ] = root
+            root[ self.PREV ] = before
+            del self.links[ last[ self.KEY ] ]
+        first = root[ self.NEXT ]
+        link = [ root, first, key, value ]
+        first[ self.PREV ] = link
+        root[ self.NEXT ] = link
+        self.links[ key ] = link
+
+    def stats( self ):
+        """
+        Return a dict of our size, capacity, hits and misses.
+        """
+        return { "size": len( self.links ), "maxSize": self.maxSize, "hits": self.hits, "misses": self.misses }
@@ -11,13 +11,27 @@ PHONEME_DETAILS__by_encoded = {}
 class PhonemeDetails( object ):
     EUPHONIOUS   = "e"
     CACOPHONIOUS = "c"
+
+    #
+    # Manners of articulation
+    #
+    VOWEL     = "vowel"
+    PLOSIVE   = "plosive"
+    AFFRICATE = "affricate"
+    FRICATIVE = "fricative"
+    NASAL     = "nasal"
+    LIQUID    = "liquid"
+    GLIDE     = "glide"
+
     encodedIndex = 0
-    def __init__( self, text, isVowel, example, euphony ):
+    def __init__( self, text, isVowel, example, euphony, manner, voiced ):
         self.text    = text
         self.index   = PhonemeDetails.encodedIndex
         self.isVowel = isVowel
         self.example = example
         self.euphony = euphony
+        self.manner  = manner
+        self.voiced  = voiced
         self.encodedValue = chr( 128 + self.index )
         PhonemeDetails.encodedIndex += 1
         PHONEME_DETAILS__by_text[ text ] = self
@@ -31,45 +45,45 @@ class PhonemeDetails( object ):
     def isEuphonious( self ):
         return self.euphony == PhonemeDetails.EUPHONIOUS
 
-PhonemeDetails( "AA", True,  "o in odd",      PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "AE", True,  "a in at",       PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "AH", True,  "u in hut",      PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "AO", True,  "ou in ought",   PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "AW", True,  "ow in cow",     PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "AY", True,  "i in hide",     PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "B",  False, "b in bee",      PhonemeDetails.CACOPHONIOUS )
-PhonemeDetails( "CH", False, "ch in cheese",  PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "D",  False, "d in dog",      PhonemeDetails.CACOPHONIOUS )
-PhonemeDetails( "DH", False, "th in thee",    PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "EH", True,  "e in red",      PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "ER", True,  "ur in hurt",    PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "EY", True,  "a in ate",      PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "F",  False, "f in fee",      PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "G",  False, "g in green",    PhonemeDetails.CACOPHONIOUS )
-PhonemeDetails( "HH", False, "h in he",       PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "IH", True,  "i in it",       PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "IY", True,  "ee in feet",    PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "JH", False, "j in jay",      PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "K",  False, "k in key",      PhonemeDetails.CACOPHONIOUS )
-PhonemeDetails( "L",  False, "l in law",      PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "M",  False, "m in me",       PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "N",  False, "n in now",      PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "NG", False, "ng in ring",    PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "OW", True,  "o in wrote",    PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "OY", True,  "oy in toy",     PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "P",  False, "p in press",    PhonemeDetails.CACOPHONIOUS )
-PhonemeDetails( "R",  False, "r in rat",      PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "S",  False, "s in sea",      PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "SH", False, "sh in shell",   PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "T",  False, "t in tea",      PhonemeDetails.CACOPHONIOUS )
-PhonemeDetails( "TH", False, "th wrath",      PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "UH", True,  "oo in hood",    PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "UW", True,  "oo in toot",    PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "V",  False, "v in victory",  PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "W",  False, "w in what",     PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "Y",  False, "y in year",     PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "Z",  False, "z in zero",     PhonemeDetails.EUPHONIOUS   )
-PhonemeDetails( "ZH", False, "z in seizure",  PhonemeDetails.EUPHONIOUS   )
+PhonemeDetails( "AA", True,  "o in odd",      PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "AE", True,  "a in at",       PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "AH", True,  "u in hut",      PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "AO", True,  "ou in ought",   PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "AW", True,  "ow in cow",     PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "AY", True,  "i in hide",     PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "B",  False, "b in bee",      PhonemeDetails.CACOPHONIOUS,  PhonemeDetails.PLOSIVE,   True  )
+PhonemeDetails( "CH", False, "ch in cheese",  PhonemeDetails.EUPHONIOUS,    PhonemeDetails.AFFRICATE, False )
+PhonemeDetails( "D",  False, "d in dog",      PhonemeDetails.CACOPHONIOUS,  PhonemeDetails.PLOSIVE,   True  )
+PhonemeDetails( "DH", False, "th in thee",    PhonemeDetails.EUPHONIOUS,    PhonemeDetails.FRICATIVE, True  )
+PhonemeDetails( "EH", True,  "e in red",      PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "ER", True,  "ur in hurt",    PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "EY", True,  "a in ate",      PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "F",  False, "f in fee",      PhonemeDetails.EUPHONIOUS,    PhonemeDetails.FRICATIVE, False )
+PhonemeDetails( "G",  False, "g in green",    PhonemeDetails.CACOPHONIOUS,  PhonemeDetails.PLOSIVE,   True  )
+PhonemeDetails( "HH", False, "h in he",       PhonemeDetails.EUPHONIOUS,    PhonemeDetails.FRICATIVE, False )
+PhonemeDetails( "IH", True,  "i in it",       PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "IY", True,  "ee in feet",    PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "JH", False, "j in jay",      PhonemeDetails.EUPHONIOUS,    PhonemeDetails.AFFRICATE, True  )
+PhonemeDetails( "K",  False, "k in key",      PhonemeDetails.CACOPHONIOUS,  PhonemeDetails.PLOSIVE,   False )
+PhonemeDetails( "L",  False, "l in law",      PhonemeDetails.EUPHONIOUS,    PhonemeDetails.LIQUID,    True  )
+PhonemeDetails( "M",  False, "m in me",       PhonemeDetails.EUPHONIOUS,    PhonemeDetails.NASAL,     True  )
+PhonemeDetails( "N",  False, "n in now",      PhonemeDetails.EUPHONIOUS,    PhonemeDetails.NASAL,     True  )
+PhonemeDetails( "NG", False, "ng in ring",    PhonemeDetails.EUPHONIOUS,    PhonemeDetails.NASAL,     True  )
+PhonemeDetails( "OW", True,  "o in wrote",    PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "OY", True,  "oy in toy",     PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "P",  False, "p in press",    PhonemeDetails.CACOPHONIOUS,  PhonemeDetails.PLOSIVE,   False )
+PhonemeDetails( "R",  False, "r in rat",      PhonemeDetails.EUPHONIOUS,    PhonemeDetails.LIQUID,    True  )
+PhonemeDetails( "S",  False, "s in sea",      PhonemeDetails.EUPHONIOUS,    PhonemeDetails.FRICATIVE, False )
+PhonemeDetails( "SH", False, "sh in shell",   PhonemeDetails.EUPHONIOUS,    PhonemeDetails.FRICATIVE, False )
+PhonemeDetails( "T",  False, "t in tea",      PhonemeDetails.CACOPHONIOUS,  PhonemeDetails.PLOSIVE,   False )
+PhonemeDetails( "TH", False, "th wrath",      PhonemeDetails.EUPHONIOUS,    PhonemeDetails.FRICATIVE, False )
+PhonemeDetails( "UH", True,  "oo in hood",    PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "UW", True,  "oo in toot",    PhonemeDetails.EUPHONIOUS,    PhonemeDetails.VOWEL,     True  )
+PhonemeDetails( "V",  False, "v in victory",  PhonemeDetails.EUPHONIOUS,    PhonemeDetails.FRICATIVE, True  )
+PhonemeDetails( "W",  False, "w in what",     PhonemeDetails.EUPHONIOUS,    PhonemeDetails.GLIDE,     True  )
+PhonemeDetails( "Y",  False, "y in year",     PhonemeDetails.EUPHONIOUS,    PhonemeDetails.GLIDE,     True  )
+PhonemeDetails( "Z",  False, "z in zero",     PhonemeDetails.EUPHONIOUS,    PhonemeDetails.FRICATIVE, True  )
+PhonemeDetails( "ZH", False, "z in seizure",  PhonemeDetails.EUPHONIOUS,    PhonemeDetails.FRICATIVE, True  )
 
 def isVowelSound( phonemeString ):
     """
@@ -83,6 +97,30 @@ def sanitizePhonemeString( phonemeString ):
     """
     return phonemeString.translate( None, string.digits ).upper()
 
-ANY_VOWEL_SOUND_REGEX_TEXT     = "(?:" + "|".join( [ x.encoded() for x in PHONEME_DETAILS__by_text.values() if x.isVowelSound() ] ) + ")"
-ANY_CONSONANT_SOUND_REGEX_TEXT = "(?:" + "|".join( [ x.encoded() for x in PHONEME_DETAILS__by_text.values() if not x.isVowelSound() ] ) + ")"
+def phonemeSetRegexText( phonemeDetailsList ):
+    """
+    Return a regex character set matching any one of these phonemes.
+    Each encodes to a single byte above 127, none of which mean anything
+    special inside a set.
+    """
+    return "[" + "".join( sorted( [ x.encoded() for x in phonemeDetailsList ] ) ) + "]"
+
+#
+# Sound classes usable in phonetic regexes as [:name:], like POSIX
+# character classes. Every vowel is voiced, so voiced and voiceless
+# split all the phonemes between them.
+#
+SOUND_CLASSES = {
+    "vowel":     [ x for x in PHONEME_DETAILS__by_text.values() if x.isVowelSound() ],
+    "consonant": [ x for x in PHONEME_DETAILS__by_text.values() if not x.isVowelSound() ],
+    "voiced":    [ x for x in PHONEME_DETAILS__by_text.values() if x.voiced ],
+    "voiceless": [ x for x in PHONEME_DETAILS__by_text.values() if not x.voiced ],
+    }
+for manner in [ PhonemeDetails.PLOSIVE, PhonemeDetails.AFFRICATE, PhonemeDetails.FRICATIVE, PhonemeDetails.NASAL, PhonemeDetails.LIQUID, PhonemeDetails.GLIDE ]:
+    SOUND_CLASSES[ manner ] = [ x for x in PHONEME_DETAILS__by_text.values() if x.manner == manner ]
+
+SOUND_CLASS_REGEX_TEXT = dict( [ ( name, phonemeSetRegexText( members ) ) for name, members in SOUND_CLASSES.iteritems() ] )
+
+ANY_VOWEL_SOUND_REGEX_TEXT     = SOUND_CLASS_REGEX_TEXT[ "vowel" ]
+ANY_CONSONANT_SOUND_REGEX_TEXT = SOUND_CLASS_REGEX_TEXT[ "consonant" ]
 ANY_SYLLABLE_REGEX_TEXT        = "(?:" + ANY_CONSONANT_SOUND_REGEX_TEXT + "*" + ANY_VOWEL_SOUND_REGEX_TEXT + ANY_CONSONANT_SOUND_REGEX_TEXT + "*)"
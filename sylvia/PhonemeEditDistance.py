@@ -0,0 +1,93 @@
+#
+# PhonemeEditDistance.py
+#
+# Weighted edit distance between encoded pronunciations, and a bounded
+# search for every pronunciation in a PronunciationTrie within some
+# distance of a query. Near and slant rhymes are pronunciations a small
+# distance apart.
+#
+# Walking the trie shares the work for common prefixes, and abandons a
+# branch as soon as every alignment of its prefix costs too much, so
+# only a small part of the dictionary is ever compared.
+#
+
+from PhonemeDetails import *
+
+INSERTION_COST           = 1.0
+VOWEL_SUBSTITUTION_COST  = 0.5 # One vowel for another, as in a slant rhyme
+SUBSTITUTION_COST        = 1.0 # One consonant for another
+CROSS_SUBSTITUTION_COST  = 1.5 # A vowel for a consonant, or the reverse
+
+def substitutionCost( a, b ):
+    """
+    Return the cost of substituting encoded phoneme b for a.
+    """
+    if a == b:
+        return 0.0
+    aIsVowel = PHONEME_DETAILS__by_encoded[ a ].isVowelSound()
+    bIsVowel = PHONEME_DETAILS__by_encoded[ b ].isVowelSound()
+    if aIsVowel and bIsVowel:
+        return VOWEL_SUBSTITUTION_COST
+    if aIsVowel or bIsVowel:
+        return CROSS_SUBSTITUTION_COST
+    return SUBSTITUTION_COST
+
+#
+# Default cost table: SUBSTITUTION_COSTS[ a ][ b ] is substitutionCost( a, b )
+# for every pair of encoded phonemes.
+#
+SUBSTITUTION_COSTS = dict( [ ( a, dict( [ ( b, substitutionCost( a, b ) ) for b in PHONEME_DETAILS__by_encoded ] ) ) for a in PHONEME_DETAILS__by_encoded ] )
+
+def _costRows( query, costs ):
+    """
+    Return a dict from each encoded phoneme to the list of its costs of
+    substitution for each phoneme of query.
+    """
+    return dict( [ ( symbol, [ row[ q ] for q in query ] ) for symbol, row in costs.iteritems() ] )
+
+def _nextRow( row, substitutions, insertionCost ):
+    """
+    Extend the last row of the edit distance table by one more phoneme,
+    whose substitution costs against the query are substitutions.
+    """
+    nextRow = [ row[ 0 ] + insertionCost ]
+    for j in xrange( 1, len( row ) ):
+        nextRow.append( min( row[ j ] + insertionCost, nextRow[ j - 1 ] + insertionCost, row[ j - 1 ] + substitutions[ j - 1 ] ) )
+    return nextRow
+
+def phonemeEditDistance( a, b, costs=None, insertionCost=INSERTION_COST ):
+    """
+    Return the weighted edit distance between encoded pronunciations a
+    and b. costs is a table like SUBSTITUTION_COSTS, which is the default.
+    """
+    if costs is None:
+        costs = SUBSTITUTION_COSTS
+    costRows = _costRows( b, costs )
+    row = [ j * insertionCost for j in xrange( len( b ) + 1 ) ]
+    for symbol in a:
+        row = _nextRow( row, costRows[ symbol ], insertionCost )
+    return row[ -1 ]
+
+def searchTrieWithin( trie, query, maxDistance, costs=None, insertionCost=INSERTION_COST ):
+    """
+    Yield ( distance, id ) for every key in a PronunciationTrie within
+    maxDistance of the encoded pronunciation query. costs is as for
+    phonemeEditDistance.
+    """
+    if costs is None:
+        costs = SUBSTITUTION_COSTS
+    costRows = _costRows( query, costs )
+    ids = trie.ids
+    stack = [ ( trie.root(), [ j * insertionCost for j in xrange( len( query ) + 1 ) ] ) ]
+    while stack:
+        node, row = stack.pop()
+        if row[ -1 ] <= maxDistance:
+            for i in xrange( node[ 0 ], trie.endingHere( node ) ):
+                yield row[ -1 ], ids[ i ]
+        for symbol, child in trie.children( node ):
+            childRow = _nextRow( row, costRows[ symbol ], insertionCost )
+            #
+            # Extending a prefix never makes any alignment cheaper
+            #
+            if min( childRow ) <= maxDistance:
+                stack.append( ( child, childRow ) )
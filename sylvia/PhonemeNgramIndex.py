@@ -0,0 +1,119 @@
+#
+# PhonemeNgramIndex.py
+#
+# Inverted index from short runs of encoded phonemes to the ids of the
+# pronunciations containing them, in the style of a code search trigram
+# index. A query's required literal phonemes narrow the dictionary down
+# to a few candidates before any regex is run.
+#
+
+import array
+import bisect
+
+#
+# Longest n-gram indexed
+#
+NGRAM_MAX_LENGTH = 3
+
+class PhonemeNgramIndex( object ):
+    """
+    Maps every phoneme n-gram, 1 <= n <= maxLength, to a sorted run of
+    the ids of the pronunciations containing it.
+
+    The grams are kept sorted, and their runs of ids laid end to end in
+    one postings array, with where each gram's run starts in another.
+    All three can be written to a .sylviabin, and read back from a
+    mapped one without being copied.
+    """
+
+    def __init__( self, pronunciations=None, maxLength=NGRAM_MAX_LENGTH, grams=None, starts=None, postings=None, count=None ):
+        """
+        Index pronunciations, a sequence of encoded pronunciations.
+
+        Instead of pronunciations, an index which has been saved can be
+        restored from its grams, starts and postings attributes, and the
+        number of pronunciations it covers.
+        """
+        self.maxLength = maxLength
+        if pronunciations is None:
+            self.grams    = grams
+            self.starts   = starts
+            self.postings = postings
+            self.count    = count
+            return
+        self.count = 0
+        lists = {}
+        for pronunciationId, pronunciation in enumerate( pronunciations ):
+            grams = set()
+            for n in xrange( 1, maxLength + 1 ):
+                for start in xrange( len( pronunciation ) - n + 1 ):
+                    grams.add( pronunciation[ start : start + n ] )
+            for gram in grams:
+                if gram in lists:
+                    lists[ gram ].append( pronunciationId )
+                else:
+                    lists[ gram ] = [ pronunciationId ]
+            self.count += 1
+        #
+        # Ids were added in increasing order, so each run is already sorted
+        #
+        self.grams    = sorted( lists.keys() )
+        self.starts   = array.array( "I", [ 0 ] )
+        self.postings = array.array( "I" )
+        for gram in self.grams:
+            self.postings.extend( lists[ gram ] )
+            self.starts.append( len( self.postings ) )
+
+    def postingRange( self, gram ):
+        """
+        Return the ( start, end ) of gram's run of ids in self.postings,
+        which is empty if no pronunciation contains it.
+        """
+        i = bisect.bisect_left( self.grams, gram )
+        if i < len( self.grams ) and self.grams[ i ] == gram:
+            return self.starts[ i ], self.starts[ i + 1 ]
+        return 0, 0
+
+    def gramsForRuns( self, runs ):
+        """
+        Return the distinct n-grams which any string containing each of
+        runs must contain: each run's n-grams of our longest length, or
+        the whole run if it is shorter.
+        """
+        n = self.maxLength
+        grams = set()
+        for run in runs:
+            if len( run ) <= n:
+                grams.add( run )
+            else:
+                for start in xrange( len( run ) - n + 1 ):
+                    grams.add( run[ start : start + n ] )
+        return grams
+
+    def postingRangesForRuns( self, runs ):
+        """
+        Return the posting ranges for gramsForRuns( runs ), shortest first.
+        """
+        return sorted( [ self.postingRange( gram ) for gram in self.gramsForRuns( runs ) ], key=lambda ( start, end ): end - start )
+
+    def candidates( self, runs, limit=None ):
+        """
+        Return the sorted ids of the pronunciations containing every one
+        of runs, as a superset by n-grams. Returns None if runs give us
+        nothing to go on, or if even the shortest run of ids is longer
+        than limit.
+        """
+        ranges = self.postingRangesForRuns( runs )
+        if not ranges:
+            return None
+        start, end = ranges[ 0 ]
+        if limit is not None and end - start > limit:
+            return None
+        postings = self.postings
+        candidates = postings[ start : end ]
+        for start, end in ranges[ 1: ]:
+            if not candidates:
+                break
+            run = set( postings[ start : end ] )
+            candidates = [ c for c in candidates if c in run ]
+        return list( candidates )
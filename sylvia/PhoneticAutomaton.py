@@ -0,0 +1,367 @@
+#
+# PhoneticAutomaton.py
+#
+# Compile parsed phonetic regexes into automata over the phoneme
+# alphabet. Every encoded pronunciation is a string over just these
+# symbols, so for the regex subset without backreferences or
+# lookarounds, an automaton can stand in for re.
+#
+
+from PhonemeDetails import *
+
+import sre_parse
+import sre_constants
+
+#
+# Encoded phoneme symbols, in encoded order. Bit i of a symbol mask
+# stands for PHONEME_SYMBOLS[ i ].
+#
+PHONEME_SYMBOLS     = sorted( PHONEME_DETAILS__by_encoded.keys() )
+PHONEME_SYMBOL_BITS = dict( [ ( s, 1 << i ) for i, s in enumerate( PHONEME_SYMBOLS ) ] )
+ALL_SYMBOLS_MASK    = ( 1 << len( PHONEME_SYMBOLS ) ) - 1
+VOWEL_SYMBOLS_MASK  = sum( [ PHONEME_SYMBOL_BITS[ s ] for s in PHONEME_SYMBOLS if PHONEME_DETAILS__by_encoded[ s ].isVowelSound() ] )
+
+#
+# How phoneme bytes (all above 127) fare against each character category,
+# without the LOCALE or UNICODE flags.
+#
+CATEGORY_MATCHES_PHONEMES = {
+    sre_constants.CATEGORY_DIGIT         : False,
+    sre_constants.CATEGORY_NOT_DIGIT     : True,
+    sre_constants.CATEGORY_SPACE         : False,
+    sre_constants.CATEGORY_NOT_SPACE     : True,
+    sre_constants.CATEGORY_WORD          : False,
+    sre_constants.CATEGORY_NOT_WORD      : True,
+    sre_constants.CATEGORY_LINEBREAK     : False,
+    sre_constants.CATEGORY_NOT_LINEBREAK : True,
+    }
+
+#
+# Cap on NFA size, mostly to protect against large counted repeats.
+#
+MAX_NFA_STATES = 20000
+
+class UnsupportedRegexError( Exception ):
+    """
+    Raised for regexes which can't be compiled to an automaton.
+    """
+    pass
+
+def symbolMask( op, av ):
+    """
+    Get the mask of phoneme symbols matched by a single-character op.
+    """
+    if op == sre_constants.ANY:
+        return ALL_SYMBOLS_MASK
+    if op == sre_constants.LITERAL:
+        return PHONEME_SYMBOL_BITS.get( chr( av ), 0 ) if av < 256 else 0
+    if op == sre_constants.NOT_LITERAL:
+        return ALL_SYMBOLS_MASK & ~symbolMask( sre_constants.LITERAL, av )
+    if op == sre_constants.IN:
+        mask = 0
+        negated = False
+        for itemOp, itemAv in av:
+            if itemOp == sre_constants.NEGATE:
+                negated = True
+            elif itemOp == sre_constants.LITERAL:
+                mask |= symbolMask( itemOp, itemAv )
+            elif itemOp == sre_constants.RANGE:
+                lo, hi = itemAv
+                for s in PHONEME_SYMBOLS:
+                    if lo <= ord( s ) <= hi:
+                        mask |= PHONEME_SYMBOL_BITS[ s ]
+            elif itemOp == sre_constants.CATEGORY and itemAv in CATEGORY_MATCHES_PHONEMES:
+                if CATEGORY_MATCHES_PHONEMES[ itemAv ]:
+                    mask |= ALL_SYMBOLS_MASK
+            else:
+                raise UnsupportedRegexError( "Unsupported character class item: {}".format( itemOp ) )
+        return ALL_SYMBOLS_MASK & ~mask if negated else mask
+    raise UnsupportedRegexError( "Not a single character op: {}".format( op ) )
+
+class PhoneticNfa( object ):
+    """
+    Thompson NFA for a parsed phonetic regex.
+
+    Besides character and epsilon edges, there are edges for the '^'
+    and '$' assertions, which may only be followed at the start and
+    end of a pronunciation respectively.
+
+    Acceptance follows re.match: a pronunciation matches if any prefix
+    of it reaches the accepting state. Sets of states are passed around
+    as frozensets, already closed over epsilon edges.
+    """
+
+    def __init__( self, parsed ):
+        flags = parsed.pattern.flags
+        if flags & ( sre_constants.SRE_FLAG_LOCALE | sre_constants.SRE_FLAG_UNICODE ):
+            raise UnsupportedRegexError( "LOCALE and UNICODE flags are not supported." )
+        self.charEdges  = []
+        self.epsEdges   = []
+        self.beginEdges = []
+        self.endEdges   = []
+        self.start, self.accept = self._buildSequence( parsed )
+        self.stepCache = {}
+        self.endCache  = {}
+        self.initial = self.closure( [ self.start ], atBeginning=True )
+
+    def newState( self ):
+        """
+        Allocate a state with no edges.
+        """
+        if len( self.charEdges ) >= MAX_NFA_STATES:
+            raise UnsupportedRegexError( "Regex is too large." )
+        self.charEdges.append( [] )
+        self.epsEdges.append( [] )
+        self.beginEdges.append( [] )
+        self.endEdges.append( [] )
+        return len( self.charEdges ) - 1
+
+    def stateCount( self ):
+        return len( self.charEdges )
+
+    def _buildSequence( self, items ):
+        """
+        Build a fragment for a sequence of ( op, av ), returning its
+        start and end states.
+        """
+        start = self.newState()
+        end = start
+        for op, av in items:
+            fragStart, fragEnd = self._buildItem( op, av )
+            self.epsEdges[ end ].append( fragStart )
+            end = fragEnd
+        return start, end
+
+    def _buildItem( self, op, av ):
+        """
+        Build a fragment for a single ( op, av ).
+        """
+        if op in ( sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.ANY, sre_constants.IN ):
+            start = self.newState()
+            end = self.newState()
+            mask = symbolMask( op, av )
+            if mask:
+                self.charEdges[ start ].append( ( mask, end ) )
+            return start, end
+
+        if op == sre_constants.SUBPATTERN:
+            return self._buildSequence( av[ 1 ] )
+
+        if op == sre_constants.BRANCH:
+            start = self.newState()
+            end = self.newState()
+            for alternative in av[ 1 ]:
+                altStart, altEnd = self._buildSequence( alternative )
+                self.epsEdges[ start ].append( altStart )
+                self.epsEdges[ altEnd ].append( end )
+            return start, end
+
+        if op in ( sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT ):
+            #
+            # Greediness doesn't change whether a match exists.
+            #
+            lo, hi, item = av
+            start = self.newState()
+            end = start
+            for i in range( lo ):
+                fragStart, fragEnd = self._buildSequence( item )
+                self.epsEdges[ end ].append( fragStart )
+                end = fragEnd
+            if hi == sre_constants.MAXREPEAT:
+                loopStart, loopEnd = self._buildSequence( item )
+                self.epsEdges[ end ].append( loopStart )
+                self.epsEdges[ loopEnd ].append( end )
+            else:
+                exit = self.newState()
+                self.epsEdges[ end ].append( exit )
+                for i in range( hi - lo ):
+                    fragStart, fragEnd = self._buildSequence( item )
+                    self.epsEdges[ end ].append( fragStart )
+                    self.epsEdges[ fragEnd ].append( exit )
+                    end = fragEnd
+                end = exit
+            return start, end
+
+        if op == sre_constants.AT:
+            start = self.newState()
+            end = self.newState()
+            if av in ( sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING ):
+                self.beginEdges[ start ].append( end )
+            elif av in ( sre_constants.AT_END, sre_constants.AT_END_STRING ):
+                self.endEdges[ start ].append( end )
+            elif av == sre_constants.AT_NON_BOUNDARY:
+                # Phonemes are never word characters, so there are no word boundaries.
+                self.epsEdges[ start ].append( end )
+            elif av != sre_constants.AT_BOUNDARY:
+                raise UnsupportedRegexError( "Unsupported assertion: {}".format( av ) )
+            return start, end
+
+        raise UnsupportedRegexError( "Unsupported regex op: {}".format( op ) )
+
+    def closure( self, states, atBeginning=False, atEnd=False ):
+        """
+        Close a collection of states over epsilon edges, and over
+        assertion edges which hold at this position.
+        """
+        seen = set( states )
+        stack = list( states )
+        while stack:
+            s = stack.pop()
+            targets = self.epsEdges[ s ]
+            if atBeginning:
+                targets = targets + self.beginEdges[ s ]
+            if atEnd:
+                targets = targets + self.endEdges[ s ]
+            for t in targets:
+                if t not in seen:
+                    seen.add( t )
+                    stack.append( t )
+        return frozenset( seen )
+
+    def step( self, states, symbol ):
+        """
+        Consume one encoded phoneme. Results are memoized, so repeated
+        walks build up a DFA lazily.
+        """
+        key = ( states, symbol )
+        if key in self.stepCache:
+            return self.stepCache[ key ]
+        bit = PHONEME_SYMBOL_BITS.get( symbol, 0 )
+        targets = [ t for s in states for mask, t in self.charEdges[ s ] if mask & bit ]
+        result = self.closure( targets )
+        self.stepCache[ key ] = result
+        return result
+
+    def acceptsPrefix( self, states ):
+        """
+        Has a prefix already matched? If so, so does anything that follows.
+        """
+        return self.accept in states
+
+    def acceptsAtEnd( self, states ):
+        """
+        Does the pronunciation match if it ends here?
+        """
+        if states not in self.endCache:
+            self.endCache[ states ] = self.accept in self.closure( states, atEnd=True )
+        return self.endCache[ states ]
+
+    def matches( self, encodedPronunciation ):
+        """
+        Match a single encoded pronunciation.
+        """
+        states = self.initial
+        for symbol in encodedPronunciation:
+            if self.acceptsPrefix( states ):
+                return True
+            states = self.step( states, symbol )
+            if not states:
+                return False
+        return self.acceptsPrefix( states ) or self.acceptsAtEnd( states )
+
+#
+# Cap on DFA size before minimization. Subset construction can blow up
+# exponentially, and past this point re is the better bet.
+#
+MAX_DFA_STATES = 5000
+
+class PhoneticDfa( object ):
+    """
+    Minimized DFA equivalent to a PhoneticNfa.
+
+    States are ints. Two are special: the dead state, from which nothing
+    can match, and the matched state, reached once a prefix has matched.
+    Both absorb every symbol, so matching can stop early at either one.
+    Matching costs one table lookup per phoneme, whatever the regex.
+    """
+
+    def __init__( self, nfa ):
+        transitions, acceptsAtEnd = self._determinize( nfa )
+        self._minimize( transitions, acceptsAtEnd )
+
+    def _determinize( self, nfa ):
+        """
+        Subset construction. State 0 is dead, state 1 is matched, and
+        state 2 is the start.
+        """
+        DEAD, MATCHED = 0, 1
+        transitions  = [ [ DEAD ] * len( PHONEME_SYMBOLS ), [ MATCHED ] * len( PHONEME_SYMBOLS ) ]
+        acceptsAtEnd = [ False, True ]
+        index = { frozenset() : DEAD }
+        pending = []
+
+        def stateFor( states ):
+            if nfa.acceptsPrefix( states ):
+                return MATCHED
+            if states not in index:
+                if len( transitions ) >= MAX_DFA_STATES:
+                    raise UnsupportedRegexError( "DFA is too large." )
+                index[ states ] = len( transitions )
+                transitions.append( None )
+                acceptsAtEnd.append( nfa.acceptsAtEnd( states ) )
+                pending.append( states )
+            return index[ states ]
+
+        # The start state must be state 2, even if the start is already matched.
+        start = len( transitions )
+        transitions.append( None )
+        acceptsAtEnd.append( nfa.acceptsPrefix( nfa.initial ) or nfa.acceptsAtEnd( nfa.initial ) )
+        if nfa.acceptsPrefix( nfa.initial ):
+            transitions[ start ] = [ MATCHED ] * len( PHONEME_SYMBOLS )
+        else:
+            index[ nfa.initial ] = start
+            pending.append( nfa.initial )
+
+        while pending:
+            states = pending.pop()
+            transitions[ index[ states ] ] = [ stateFor( nfa.step( states, symbol ) ) for symbol in PHONEME_SYMBOLS ]
+        return transitions, acceptsAtEnd
+
+    def _minimize( self, transitions, acceptsAtEnd ):
+        """
+        Moore's partition refinement, then build lookup tables keyed
+        by encoded symbol.
+        """
+        labels = [ ( i == 1, acceptsAtEnd[ i ] ) for i in range( len( transitions ) ) ]
+        blocks = self._renumber( labels )
+        while True:
+            signatures = [ ( blocks[ i ], tuple( [ blocks[ t ] for t in row ] ) ) for i, row in enumerate( transitions ) ]
+            refined = self._renumber( signatures )
+            if max( refined ) == max( blocks ):
+                break
+            blocks = refined
+
+        self.stateCount = max( blocks ) + 1
+        self.dead    = blocks[ 0 ]
+        self.matched = blocks[ 1 ]
+        self.start   = blocks[ 2 ]
+        self.table        = [ None ] * self.stateCount
+        self.acceptsAtEnd = [ False ] * self.stateCount
+        for i, row in enumerate( transitions ):
+            b = blocks[ i ]
+            if self.table[ b ] is None:
+                self.table[ b ] = dict( zip( PHONEME_SYMBOLS, [ blocks[ t ] for t in row ] ) )
+                self.acceptsAtEnd[ b ] = acceptsAtEnd[ i ]
+
+    def _renumber( self, keys ):
+        """
+        Map equal keys to the same small int, in order of first appearance.
+        """
+        numbers = {}
+        return [ numbers.setdefault( k, len( numbers ) ) for k in keys ]
+
+    def matches( self, encodedPronunciation ):
+        """
+        Match a single encoded pronunciation.
+        """
+        table   = self.table
+        dead    = self.dead
+        matched = self.matched
+        state   = self.start
+        for symbol in encodedPronunciation:
+            if state == matched:
+                return True
+            state = table[ state ][ symbol ]
+            if state == dead:
+                return False
+        return self.acceptsAtEnd[ state ]
@@ -7,6 +7,15 @@
 
 from PhonemeDetails import *
 from LetterDetails import *
+from DictionaryFormat import *
+from PhoneticQuery import *
+from SearchEngines import *
+from PronunciationTrie import *
+from PhonemeNgramIndex import *
+from PronunciationBuckets import *
+from LruCache import *
+from PhonemeEditDistance import *
+from PhoneticSimilarity import *
 
 import pkg_resources
 import sys
@@ -14,12 +23,16 @@ import re
 import os
 import itertools
 import code
+import bisect
+import sre_parse
+import cStringIO
 
-def loadDefaultPhoneticDictionary():
+def loadDefaultPhoneticDictionary( workers=None ):
     """
-    Load the encoded dictionary distributed with Sylvia.
+    Load the encoded dictionary distributed with Sylvia. See
+    PhoneticDictionary for workers.
     """
-    return PhoneticDictionary( binFile=pkg_resources.resource_stream( "sylvia", "data/cmudict.sylviabin" ) )
+    return PhoneticDictionary( binFile=pkg_resources.resource_stream( "sylvia", "data/cmudict.sylviabin" ), workers=workers )
 
 def dictListAdd( d, k, v ):
     """
@@ -51,17 +64,142 @@ def encodePronunciation( pronunciationTokens ):
     """
     return "".join( [ encodePhonemeString( p ) for p in pronunciationTokens ] )
 
-def decodePronunciation( pronunciationBuffer ):
+#
+# The phoneme string for every byte value, None where no phoneme encodes
+# to that byte. Decoding is indexing this with each byte.
+#
+PHONEME_DECODE_TABLE = tuple( [ PHONEME_DETAILS__by_encoded[ chr( i ) ].decoded() if chr( i ) in PHONEME_DETAILS__by_encoded else None for i in xrange( 256 ) ] )
+
+#
+# Optional LruCache of decoded pronunciations, see setDecodedPronunciationCache.
+#
+DECODED_PRONUNCIATIONS = None
+
+def setDecodedPronunciationCache( maxSize ):
+    """
+    Keep up to maxSize decoded pronunciations, so that decoding one again
+    returns the same tuple without building a new one. A maxSize of None
+    or 0 turns the cache off, which is the default: decoding through
+    PHONEME_DECODE_TABLE is cheap enough that the cache only pays off
+    for callers which keep decoded pronunciations around.
+
+    Returns the new cache, or None.
+    """
+    global DECODED_PRONUNCIATIONS
+    DECODED_PRONUNCIATIONS = LruCache( maxSize ) if maxSize else None
+    return DECODED_PRONUNCIATIONS
+
+def decodePronunciation( pronunciationBuffer, asList=False ):
+    """
+    Return the decoded tuple of phonemes corresponding to this encoded
+    buffer, or a new list of them if asList.
+    """
+    cache = DECODED_PRONUNCIATIONS
+    decoded = None if cache is None else cache.get( pronunciationBuffer )
+    if decoded is None:
+        decoded = tuple( map( PHONEME_DECODE_TABLE.__getitem__, bytearray( pronunciationBuffer ) ) )
+        if None in decoded:
+            raise KeyError( "Not an encoded pronunciation: {}".format( repr( pronunciationBuffer ) ) )
+        if cache is not None:
+            cache.put( pronunciationBuffer, decoded )
+    return list( decoded ) if asList else decoded
+
+CONSONANT_SOUNDS_ENCODED = "".join( [ x.encoded() for x in PHONEME_DETAILS__by_text.values() if not x.isVowelSound() ] )
+
+#
+# The n-gram index is only used when it narrows a query down to at
+# most this fraction of what would otherwise be searched. Past that,
+# checking candidates one by one costs more than a buffer search.
+#
+NGRAM_INDEX_MAX_FRACTION = 0.1
+
+#
+# Length and vowel count buckets are only searched on their own when
+# they hold at most this fraction of the dictionary. Their pronunciations
+# are matched one at a time, at some twenty times what each costs in a
+# buffer search, so past that, the search engine is as quick.
+#
+BUCKET_MAX_FRACTION = 0.04
+
+#
+# Default sizes of each dictionary's caches of compiled queries, and of
+# regexSearch results. A cached result holds a reference to each word
+# in it, so even the broadest queries cost only a few megabytes.
+#
+QUERY_CACHE_SIZE  = 256
+RESULT_CACHE_SIZE = 64
+
+def rhymeKey( encodedPronunciation ):
+    """
+    Return the encoded vowels of a pronunciation, in order. The "loose"
+    rhymes of a word are exactly the pronunciations whose key ends with
+    its key.
+    """
+    return encodedPronunciation.translate( None, CONSONANT_SOUNDS_ENCODED )
+
+#
+# A sound class, like [:nasal:]. See PhonemeDetails.SOUND_CLASSES.
+#
+SOUND_CLASS_RE = re.compile( r"(\[:[a-z]+:\])" )
+
+#
+# A sound class on its own, or a set of phonemes, which may hold sound
+# classes, like [[:nasal:] L] or [^[:vowel:]]
+#
+PHONEME_SET_RE = re.compile( r"(\[:[a-z]+:\]|\[\^?(?:\[:[a-z]+:\]|[^\]])*\])" )
+
+def soundClassRegexText( token ):
     """
-    Return the decoded list corresponding to this encoded buffer.
+    Return the character set for a sound class token, like [:nasal:].
     """
-    return [ decodePhonemeByte( x ) for x in pronunciationBuffer ]
+    name = token[ 2 : -2 ]
+    if name not in SOUND_CLASS_REGEX_TEXT:
+        raise ValueError( "Unknown sound class [:{}:]. Try one of: {}".format( name, ", ".join( sorted( SOUND_CLASS_REGEX_TEXT.keys() ) ) ) )
+    return SOUND_CLASS_REGEX_TEXT[ name ]
 
 def preprocessPhoneticRegex( regexTextUnpreprocessed ):
     """
     Perform proper substitutions and fomatting to convert user
     input for regex into one which is Python-compliant, and will
     function on our encoded pronunciations.
+
+    #, @ and sound classes become character sets of encoded phonemes,
+    which re matches with a single lookup, rather than trying each
+    phoneme in turn. Inside a set, they add their phonemes to it.
+    """
+    encodedTokens = []
+    for token in PHONEME_SET_RE.split( regexTextUnpreprocessed ):
+        if SOUND_CLASS_RE.match( token ):
+            encodedTokens.append( soundClassRegexText( token ) )
+        elif PHONEME_SET_RE.match( token ):
+            encodedTokens.append( preprocessPhonemeSet( token ) )
+        else:
+            encodedTokens.extend( preprocessPhonemeTokens( token ) )
+    return "".join( encodedTokens )
+
+def preprocessPhonemeSet( regexTextUnpreprocessed ):
+    """
+    Return the encoded character set for a set of phonemes, like
+    [[:nasal:] L #], with the members of each class merged into it.
+    """
+    negate = regexTextUnpreprocessed.startswith( "[^" )
+    members = []
+    for token in SOUND_CLASS_RE.split( regexTextUnpreprocessed[ 2 if negate else 1 : -1 ] ):
+        if SOUND_CLASS_RE.match( token ):
+            members.append( soundClassRegexText( token )[ 1 : -1 ] )
+            continue
+        for encoded in preprocessPhonemeTokens( token ):
+            if encoded == ANY_SYLLABLE_REGEX_TEXT:
+                raise ValueError( "A syllable, %, can't be part of a set of phonemes." )
+            if encoded in ( ANY_VOWEL_SOUND_REGEX_TEXT, ANY_CONSONANT_SOUND_REGEX_TEXT ):
+                encoded = encoded[ 1 : -1 ]
+            members.append( encoded )
+    return ( "[^" if negate else "[" ) + "".join( members ) + "]"
+
+def preprocessPhonemeTokens( regexTextUnpreprocessed ):
+    """
+    Return the list of encoded tokens for part of a phonetic regex with
+    no sound classes in it.
     """
     encodedTokens = []
     for token in re.split( "(%|#|@|(?:[^a-zA-Z#@%]+))", regexTextUnpreprocessed ):
@@ -79,17 +217,74 @@ def preprocessPhoneticRegex( regexTextUnpreprocessed ):
             encodedTokens.append( encodePhonemeString( tryPhoneme ) )
             continue
         encodedTokens.append( token.replace( " ", "" ) )
-    return "".join( encodedTokens )
+    return encodedTokens
+
+class DictionaryEntry( object ):
+    """
+    Lightweight view of one word in a PhoneticDictionary. Nothing is
+    read from the dictionary's tables until asked for.
+    """
+
+    __slots__ = ( "pd", "wordId" )
+
+    def __init__( self, pd, wordId ):
+        self.pd     = pd
+        self.wordId = wordId
+
+    @property
+    def word( self ):
+        return self.pd.words[ self.wordId ]
+
+    @property
+    def popularity( self ):
+        return self.pd.popularityColumn[ self.wordId ]
+
+    @property
+    def encodedPronunciations( self ):
+        pd = self.pd
+        return [ pd.pronunciations[ p ] for p in xrange( pd.wordIndex[ self.wordId ], pd.wordIndex[ self.wordId + 1 ] ) ]
+
+    @property
+    def pronunciations( self ):
+        return [ decodePronunciation( p ) for p in self.encodedPronunciations ]
+
+    def __repr__( self ):
+        return "DictionaryEntry( {} )".format( repr( self.word ) )
 
 class PhoneticDictionary( object ):
     """
     Software API for reading and working with dictionary files
     """
 
-    def __init__( self, textFile=None, binFile=None, wordPopFile=None ):
+    def __init__( self, textFile=None, binFile=None, wordPopFile=None, engine=None, workers=None, compact=False,
+                  queryCacheSize=QUERY_CACHE_SIZE, resultCacheSize=RESULT_CACHE_SIZE ):
         """
         Read input file
+
+        compact packs dictionaries read from text, or from the original binary
+        format, into the same in-memory layout as a versioned .sylviabin,
+        rather than keeping a Python object for every word and pronunciation.
+        Versioned .sylviabin files are always kept that way.
+
+        engine selects how regexSearch scans the dictionary. See SEARCH_ENGINES.
+        It defaults to "buffer", or to "parallel" when workers is more than one.
+
+        workers is the number of processes the "parallel" engine searches
+        with. It defaults to one per CPU.
+
+        queryCacheSize and resultCacheSize bound the caches of compiled
+        queries and of regexSearch results. See setCacheSizes.
         """
+        if engine is None:
+            engine = "parallel" if workers > 1 else "buffer"
+        if engine not in SEARCH_ENGINES:
+            raise ValueError( "Unknown search engine: {}".format( engine ) )
+        self.engine = engine
+        self.workers = workers
+        self.compact = compact
+        self.searchEngines = {}
+        self.sourceHash = None
+        self.setCacheSizes( queryCacheSize, resultCacheSize )
         if textFile is not None and wordPopFile is not None:
             self.load__text( textFile, wordPopFile )
         elif binFile is not None:
@@ -106,8 +301,8 @@ class PhoneticDictionary( object ):
         """
         wsre = re.compile( r"\s+" )
 
-        self.entries = {}
-        self.popularities = {}
+        entries = {}
+        popularities = {}
 
         #
         # Get pronunciations. May be multiple per word
@@ -118,7 +313,7 @@ class PhoneticDictionary( object ):
             parts         = [ x for x in wsre.split( line ) if len( x ) > 0 ]
             word          = sanitizeWord( parts[0] )
             pronunciation = encodePronunciation( parts[1:] )
-            dictListAdd( self.entries, word, pronunciation )
+            dictListAdd( entries, word, pronunciation )
 
         #
         # Get popularities. One for each unique word.
@@ -126,22 +321,548 @@ class PhoneticDictionary( object ):
         for line in finPop:
             parts = [ x for x in wsre.split( line ) if len( x ) > 0 ]
             word = sanitizeWord( parts[0] )
-            self.popularities[ word ] = int( parts[ 1 ] )
+            popularities[ word ] = int( parts[ 1 ] )
+
+        self.buildTables( entries, popularities )
 
     def load__bin( self, fin ):
         """
-        Load binary format dictionary into memory
+        Load binary format dictionary. Versioned files are memory mapped
+        when possible, and read lazily. The original newline-split format
+        is still accepted.
+        """
+        prefix = fin.read( len( SYLVIA_BIN_MAGIC ) )
+        if isSylviaBin( prefix ):
+            self.load__mappedBin( openSylviaBin( fin, prefix ) )
+        else:
+            self.load__legacyBin( prefix + fin.read() )
+
+    def load__mappedBin( self, reader ):
+        """
+        Point our tables at the sections of a versioned .sylviabin.
+        Nothing is parsed up front.
+        """
+        self.words             = reader.stringTable( SECTION_WORDS )
+        self.popularityColumn  = reader.column( SECTION_POPULARITIES, "q" )
+        self.wordIndex         = reader.column( SECTION_WORD_INDEX, "I" )
+        self.pronunciations    = reader.stringTable( SECTION_PRONUNCIATIONS )
+        self.clearIndexes()
+        if not reader.hasSection( SECTION_ALPHABETICAL ):
+            #
+            # Older files number words alphabetically. Renumber them.
+            #
+            self.rebuildTables()
+            return
+        self.alphabeticalOrder = reader.column( SECTION_ALPHABETICAL, "I" )
+        if reader.hasSection( SECTION_RHYME_KEYS ):
+            self.rhymeKeys = reader.stringTable( SECTION_RHYME_KEYS )
+        for tag in [ SECTION_PRONUNCIATION_OWNERS, SECTION_WORD_LENGTH_ORDER, SECTION_WORD_LENGTH_STARTS,
+                     SECTION_BUCKET_ORDER, SECTION_BUCKET_KEYS, SECTION_BUCKET_STARTS ]:
+            if reader.hasSection( tag ):
+                self.precomputedColumns[ tag ] = reader.column( tag, "I" )
+        if reader.hasSection( SECTION_SOURCE_HASH ):
+            self.sourceHash = reader.stringTable( SECTION_SOURCE_HASH )[ 0 ]
+        if reader.hasSection( SECTION_NGRAM_GRAMS ):
+            self.ngramIndex = PhonemeNgramIndex( grams=reader.stringTable( SECTION_NGRAM_GRAMS ),
+                                                 starts=reader.column( SECTION_NGRAM_STARTS, "I" ),
+                                                 postings=reader.column( SECTION_NGRAM_POSTINGS, "I" ),
+                                                 count=len( self.pronunciations ) )
+
+    def load__legacyBin( self, buf ):
+        """
+        Load the original, newline-split, binary format.
         """
-        self.entries = {}
-        self.popularities = {}
-        buf = fin.read()
+        entries = {}
+        popularities = {}
         lines = buf.split( "\n" )
         for line in lines:
             if len( line ) == 0:
                 continue
             word, popularity, pronunciation = line.split( " " )
-            self.popularities[ word ] = int( popularity )
-            dictListAdd( self.entries, word, pronunciation )
+            popularities[ word ] = int( popularity )
+            dictListAdd( entries, word, pronunciation )
+        self.buildTables( entries, popularities )
+
+    def buildTables( self, entries, popularities ):
+        """
+        Build our tables from a dict of word -> encoded pronunciation list, and a
+        dict of word -> popularity.
+
+        Words are given ids in order of descending popularity, so that sorting
+        results by popularity is sorting their ids, and a search which visits
+        words in id order finds the most popular first. Words are found by
+        bisecting the alphabetical order of ids.
+
+        Words which have no pronunciations are dropped.
+        """
+        self.words             = sorted( entries.keys(), key=lambda word: ( -popularities.get( word, -1 ), word ) )
+        self.popularityColumn  = [ popularities.get( word, -1 ) for word in self.words ]
+        self.alphabeticalOrder = sorted( xrange( len( self.words ) ), key=self.words.__getitem__ )
+        self.wordIndex         = []
+        self.pronunciations    = []
+        for word in self.words:
+            self.wordIndex.append( len( self.pronunciations ) )
+            self.pronunciations.extend( entries[ word ] )
+        self.wordIndex.append( len( self.pronunciations ) )
+        self.clearIndexes()
+        if self.compact:
+            self.compactTables()
+
+    def compactTables( self ):
+        """
+        Pack our tables into one in-memory .sylviabin buffer, and read
+        them from there, just as if they'd been loaded from a file.
+        """
+        fout = cStringIO.StringIO()
+        self.writeBin( fout )
+        self.load__mappedBin( SylviaBinReader( fout.getvalue() ) )
+
+    def rebuildTables( self ):
+        """
+        Build our tables again from their current contents.
+        """
+        entries = {}
+        popularities = {}
+        wordIndex = sequenceValues( self.wordIndex )
+        pronunciations = sequenceValues( self.pronunciations )
+        popularityColumn = sequenceValues( self.popularityColumn )
+        for wordId, word in enumerate( sequenceValues( self.words ) ):
+            entries[ word ] = pronunciations[ wordIndex[ wordId ] : wordIndex[ wordId + 1 ] ]
+            popularities[ word ] = popularityColumn[ wordId ]
+        self.buildTables( entries, popularities )
+
+    def clearIndexes( self ):
+        """
+        Drop everything derived from our tables. Called whenever they change.
+        """
+        self.closeSearchEngines()
+        self.pronunciationOwners = None
+        self.pronunciationIndex = None
+        self.pronunciationTrie = None
+        self.similarityIndex = None
+        self.suffixIndex = None
+        self.rhymeKeys = None
+        self.rhymeIndex = None
+        self.ngramIndex = None
+        self.pronunciationBuckets = None
+        self.wordLengthBuckets = None
+        self.precomputedColumns = {}
+        self.clearCaches()
+
+    def setCacheSizes( self, queryCacheSize=None, resultCacheSize=None ):
+        """
+        Resize the LruCaches of compiled queries, keyed by their text, and
+        of regexSearch results, keyed by preprocessed query, engine and
+        limit. A size of 0 turns a cache off. Sizes left as None are
+        unchanged. Resizing empties a cache.
+        """
+        if queryCacheSize is not None:
+            self.queryCache = LruCache( queryCacheSize ) if queryCacheSize else None
+        if resultCacheSize is not None:
+            self.resultCache = LruCache( resultCacheSize ) if resultCacheSize else None
+
+    def clearCaches( self ):
+        """
+        Empty the query and result caches, resetting their hit and miss
+        counts. Called whenever our tables change.
+        """
+        for cache in ( self.queryCache, self.resultCache ):
+            if cache is not None:
+                cache.clear()
+
+    def cacheStats( self ):
+        """
+        Return a dict with the LruCache stats of the "queries" and
+        "results" caches, or None for one that's turned off.
+        """
+        return dict( [ ( name, cache.stats() if cache is not None else None ) for name, cache in ( ( "queries", self.queryCache ), ( "results", self.resultCache ) ) ] )
+
+    def closeSearchEngines( self ):
+        """
+        Drop our search engines, stopping any worker processes they have.
+        """
+        for searchEngine in self.searchEngines.values():
+            if hasattr( searchEngine, "close" ):
+                searchEngine.close()
+        self.searchEngines = {}
+
+    def close( self ):
+        """
+        Stop any worker processes. The dictionary can still be used, and
+        will start them again if needed.
+        """
+        self.closeSearchEngines()
+
+    def setWorkers( self, workers ):
+        """
+        Change the number of processes the "parallel" engine searches with,
+        and make it the default engine if there's more than one.
+        """
+        if "parallel" in self.searchEngines:
+            self.searchEngines.pop( "parallel" ).close()
+        self.workers = workers
+        if workers > 1:
+            self.engine = "parallel"
+        elif self.engine == "parallel":
+            self.engine = "buffer"
+
+    def getPronunciationOwners( self ):
+        """
+        Get a list mapping each pronunciation id to its word id.
+        """
+        if self.pronunciationOwners is None and SECTION_PRONUNCIATION_OWNERS in self.precomputedColumns:
+            self.pronunciationOwners = list( self.precomputedColumns[ SECTION_PRONUNCIATION_OWNERS ].values() )
+        if self.pronunciationOwners is None:
+            wordIndex = sequenceValues( self.wordIndex )
+            owners = []
+            for wordId in xrange( len( wordIndex ) - 1 ):
+                owners.extend( [ wordId ] * ( wordIndex[ wordId + 1 ] - wordIndex[ wordId ] ) )
+            self.pronunciationOwners = owners
+        return self.pronunciationOwners
+
+    def getPronunciationIndex( self ):
+        """
+        Get a dict from every encoded pronunciation to the ascending list of
+        ids of the words pronounced that way, built on first use.
+        """
+        if self.pronunciationIndex is None:
+            owners = self.getPronunciationOwners()
+            index = {}
+            for pronunciationId, pronunciation in enumerate( sequenceValues( self.pronunciations ) ):
+                wordIds = index.get( pronunciation )
+                if wordIds is None:
+                    index[ pronunciation ] = [ owners[ pronunciationId ] ]
+                elif wordIds[ -1 ] != owners[ pronunciationId ]:
+                    wordIds.append( owners[ pronunciationId ] )
+            self.pronunciationIndex = index
+        return self.pronunciationIndex
+
+    def getPronunciationTrie( self ):
+        """
+        Get a PronunciationTrie of every pronunciation, carrying the id of
+        the word it belongs to, built on first use.
+        """
+        if self.pronunciationTrie is None:
+            self.pronunciationTrie = PronunciationTrie( list( sequenceValues( self.pronunciations ) ), self.getPronunciationOwners() )
+        return self.pronunciationTrie
+
+    def getSimilarityIndex( self ):
+        """
+        Get a PhoneticSimilarityIndex over every pronunciation, built on
+        first use. Needs NumPy.
+        """
+        if self.similarityIndex is None:
+            self.similarityIndex = PhoneticSimilarityIndex( sequenceValues( self.pronunciations ), sequenceValues( self.wordIndex ) )
+        return self.similarityIndex
+
+    def getSuffixIndex( self ):
+        """
+        Get a PronunciationTrie over every reversed pronunciation, built on
+        first use. Pronunciations ending in some suffix are then a single
+        range of it.
+        """
+        if self.suffixIndex is None:
+            self.suffixIndex = PronunciationTrie( [ p[ ::-1 ] for p in sequenceValues( self.pronunciations ) ], self.getPronunciationOwners() )
+        return self.suffixIndex
+
+    def findWordIdsBySuffix( self, encodedSuffix ):
+        """
+        Return the set of ids of words with a pronunciation ending in encodedSuffix.
+        """
+        index = self.getSuffixIndex()
+        lo, hi = index.prefixRange( encodedSuffix[ ::-1 ] )
+        return set( index.ids[ lo : hi ] )
+
+    def getRhymeKeys( self ):
+        """
+        Get the rhymeKey() of every pronunciation, by pronunciation id.
+        Read from the dictionary file if it has them.
+        """
+        if self.rhymeKeys is None:
+            self.rhymeKeys = [ rhymeKey( p ) for p in sequenceValues( self.pronunciations ) ]
+        return self.rhymeKeys
+
+    def getRhymeIndex( self ):
+        """
+        Get a dict from every non-empty tail of every rhyme key to the list
+        of ids of the pronunciations whose keys end with it, built on first use.
+        """
+        if self.rhymeIndex is None:
+            index = {}
+            for pronunciationId, key in enumerate( sequenceValues( self.getRhymeKeys() ) ):
+                for start in xrange( len( key ) ):
+                    dictListAdd( index, key[ start: ], pronunciationId )
+            self.rhymeIndex = index
+        return self.rhymeIndex
+
+    def getNgramIndex( self ):
+        """
+        Get the PhonemeNgramIndex over every pronunciation, or None if we
+        don't have one. Dictionary files carry it, mapped and shared like
+        their other sections. It's too big to build behind a caller's back,
+        so dictionaries read any other way only have one after
+        buildNgramIndex.
+        """
+        return self.ngramIndex
+
+    def buildNgramIndex( self ):
+        """
+        Build a PhonemeNgramIndex over every pronunciation, in memory, if
+        we don't already have one, and return it.
+        """
+        if self.ngramIndex is None:
+            self.ngramIndex = PhonemeNgramIndex( sequenceValues( self.pronunciations ) )
+        return self.ngramIndex
+
+    def findWordIdsByRhyme( self, query, limit=None ):
+        """
+        Return the set of ids of words matching a query with query.rhymeVowels
+        set. Only pronunciations ending in those vowels can match, and the
+        rhyme index lists exactly those.
+        """
+        return self.confirmCandidates( query, self.getRhymeIndex().get( query.rhymeVowels, [] ), limit )
+
+    def confirmCandidates( self, query, pronunciationIds, limit=None ):
+        """
+        Return the set of ids of words owning one of pronunciationIds which
+        matches query. Given ascending pronunciationIds, stop once limit
+        words are found.
+        """
+        owners = self.getPronunciationOwners()
+        pronunciations = self.pronunciations
+        matches = query.matches
+        matchingWordIds = set()
+        for pronunciationId in pronunciationIds:
+            wordId = owners[ pronunciationId ]
+            if wordId not in matchingWordIds and matches( pronunciations[ pronunciationId ] ):
+                matchingWordIds.add( wordId )
+                if len( matchingWordIds ) == limit:
+                    break
+        return matchingWordIds
+
+    def getPronunciationBuckets( self ):
+        """
+        Get a PronunciationBuckets over every pronunciation, on first use.
+        Its order is read from the dictionary file if it has it, and it
+        searches our own pronunciations.
+        """
+        if self.pronunciationBuckets is None:
+            columns = self.precomputedColumns
+            if SECTION_BUCKET_ORDER in columns and SECTION_BUCKET_KEYS in columns and SECTION_BUCKET_STARTS in columns:
+                order, keys, starts = columns[ SECTION_BUCKET_ORDER ], columns[ SECTION_BUCKET_KEYS ].values(), columns[ SECTION_BUCKET_STARTS ].values()
+            else:
+                vowelCounts = [ len( key ) for key in sequenceValues( self.getRhymeKeys() ) ]
+                order, keys, starts = bucketOrder( sequenceValues( self.pronunciations ), vowelCounts )
+            self.pronunciationBuckets = PronunciationBuckets( order, keys, starts, self.pronunciations, self.getPronunciationOwners() )
+        return self.pronunciationBuckets
+
+    def getWordLengthOrder( self ):
+        """
+        Get the word ids ordered by word length, then id, and a list of
+        where the words of each length start in that order, with one
+        extra trailing entry. Read from the dictionary file if it has them.
+        """
+        columns = self.precomputedColumns
+        if SECTION_WORD_LENGTH_ORDER in columns and SECTION_WORD_LENGTH_STARTS in columns:
+            return columns[ SECTION_WORD_LENGTH_ORDER ].values(), columns[ SECTION_WORD_LENGTH_STARTS ].values()
+        byLength = {}
+        for wordId, word in enumerate( sequenceValues( self.words ) ):
+            dictListAdd( byLength, len( word ), wordId )
+        order = []
+        starts = []
+        for length in xrange( max( byLength.keys() + [ 0 ] ) + 2 ):
+            starts.append( len( order ) )
+            order.extend( byLength.get( length, [] ) )
+        return order, starts
+
+    def getWordLengthBuckets( self ):
+        """
+        Get a dict from word length to a list of ( word id, word ) for
+        the words of that length, built on first use.
+        """
+        if self.wordLengthBuckets is None:
+            words = sequenceValues( self.words )
+            order, starts = self.getWordLengthOrder()
+            buckets = {}
+            for length in xrange( len( starts ) - 1 ):
+                if starts[ length ] < starts[ length + 1 ]:
+                    buckets[ length ] = [ ( wordId, words[ wordId ] ) for wordId in order[ starts[ length ] : starts[ length + 1 ] ] ]
+            self.wordLengthBuckets = buckets
+        return self.wordLengthBuckets
+
+    def planCandidates( self, query, searchSize=None ):
+        """
+        Return the ids of the only pronunciations which could match query,
+        found from the literal phonemes it requires, or None if the query
+        needs a full search. searchSize is how many pronunciations that
+        search would check, and defaults to all of them.
+        """
+        index = self.getNgramIndex()
+        if not query.requiredRuns or index is None:
+            return None
+        if searchSize is None:
+            searchSize = index.count
+        return index.candidates( query.requiredRuns, limit=int( searchSize * NGRAM_INDEX_MAX_FRACTION ) )
+
+    def selectBuckets( self, query ):
+        """
+        Return the keys of the pronunciation buckets query could match in,
+        and how many pronunciations they hold.
+        """
+        buckets = self.getPronunciationBuckets()
+        bucketKeys = buckets.select( query.lengthBounds, query.vowelBounds )
+        return bucketKeys, buckets.size( bucketKeys )
+
+    def matchWordIdsInBuckets( self, query, limit=None ):
+        """
+        Return the set of ids of words matching a PhoneticQuery if it can
+        only match in a small enough part of the pronunciation buckets to
+        search just those, or None if it needs a full search.
+        """
+        bucketKeys, bucketSize = self.selectBuckets( query )
+        buckets = self.getPronunciationBuckets()
+        if bucketSize > len( buckets ) * BUCKET_MAX_FRACTION:
+            return None
+        return buckets.matchWordIds( query, bucketKeys, limit )
+
+    def matchWordIdsByIndex( self, query, limit=None ):
+        """
+        Return the set of ids of words matching a PhoneticQuery if an index
+        can answer it without a search, or None if it needs one.
+        """
+        if query.literal is not None:
+            return set( self.getPronunciationIndex().get( query.literal, [] )[ :limit ] )
+        if query.literalTail is not None:
+            return self.findWordIdsBySuffix( query.literalTail )
+        if query.rhymeVowels is not None:
+            return self.findWordIdsByRhyme( query, limit )
+        if query.requiredRuns and self.getNgramIndex() is not None:
+            candidates = self.planCandidates( query, self.selectBuckets( query )[ 1 ] )
+            if candidates is not None:
+                return self.confirmCandidates( query, candidates, limit )
+        return None
+
+    def matchWordIds( self, query, engine=None, limit=None ):
+        """
+        Return the set of ids of words matching a PhoneticQuery. Unless an
+        engine is named, queries an index or a few buckets can answer skip
+        the search engine entirely. A named engine is always the one used,
+        so that its cost bounds hold.
+
+        If limit is given, the caller only wants the limit lowest ids, and
+        the search may stop once it has them.
+        """
+        matchingWordIds = None
+        if engine is None:
+            matchingWordIds = self.matchWordIdsByIndex( query, limit )
+            if matchingWordIds is None:
+                matchingWordIds = self.matchWordIdsInBuckets( query, limit )
+        if matchingWordIds is None:
+            matchingWordIds = self.getSearchEngine( engine ).matchWordIds( query, limit )
+        return matchingWordIds
+
+    def matchWordIdsForAny( self, regexTexts, engine=None, limit=None ):
+        """
+        Return the set of ids of words matching any of a list of phonetic
+        regexes. Those an index or a few buckets can answer are handled one
+        by one, and the rest are combined so that the search engine only
+        goes through the dictionary once. A named engine answers them all.
+
+        Already compiled PhoneticQuerys may be given in place of regexes.
+        """
+        queries = []
+        seen = set()
+        for regexText in regexTexts:
+            query = regexText if isinstance( regexText, PhoneticQuery ) else self.compileQuery( regexText )
+            if query.preprocessed not in seen:
+                seen.add( query.preprocessed )
+                queries.append( query )
+
+        matchingWordIds = set()
+        unanswered = []
+        for query in queries:
+            found = None
+            if engine is None:
+                found = self.matchWordIdsByIndex( query, limit )
+                if found is None:
+                    found = self.matchWordIdsInBuckets( query, limit )
+            if found is None:
+                unanswered.append( query )
+            else:
+                matchingWordIds |= found
+
+        if len( unanswered ) > 1:
+            union = unionQuery( unanswered )
+            if union is not None:
+                unanswered = [ union ]
+        searchEngine = self.getSearchEngine( engine )
+        for query in unanswered:
+            matchingWordIds |= searchEngine.matchWordIds( query, limit )
+        return matchingWordIds
+
+    def getSearchEngine( self, engine=None ):
+        """
+        Get a search engine by name, building it on first use. Defaults
+        to the engine chosen at construction.
+        """
+        if engine is None:
+            engine = self.engine
+        if engine not in self.searchEngines:
+            self.searchEngines[ engine ] = SEARCH_ENGINES[ engine ]( self )
+        return self.searchEngines[ engine ]
+
+    def compileQuery( self, regexTextUnpreprocessed ):
+        """
+        Preprocess and compile a phonetic regex into a PhoneticQuery, or
+        find it in the query cache. Runs of whitespace don't affect the
+        preprocessed regex, so they're collapsed in the cache key.
+        """
+        cache = self.queryCache
+        if cache is None:
+            return PhoneticQuery( preprocessPhoneticRegex( regexTextUnpreprocessed ) )
+        key = " ".join( regexTextUnpreprocessed.split() )
+        query = cache.get( key )
+        if query is None:
+            query = PhoneticQuery( preprocessPhoneticRegex( regexTextUnpreprocessed ) )
+            cache.put( key, query )
+        return query
+
+    def findWordId( self, word ):
+        """
+        Return the id of a word, or None if we don't know it.
+        """
+        return self.findSanitizedWordId( sanitizeWord( word ) )[ 0 ]
+
+    def findSanitizedWordId( self, word, lo=0 ):
+        """
+        Return the id of an already sanitized word, or None if we don't know
+        it, and its position in alphabetical order. Searches from position lo.
+        """
+        words = self.words
+        order = self.alphabeticalOrder
+        hi = len( order )
+        while lo < hi:
+            mid = ( lo + hi ) // 2
+            if words[ order[ mid ] ] < word:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len( order ) and words[ order[ lo ] ] == word:
+            return order[ lo ], lo
+        return None, lo
+
+    def iterEntries( self, startWordId=0, endWordId=None ):
+        """
+        Yield ( word id, encoded pronunciation ) for every pronunciation in the
+        dictionary, or only those of words with ids in [ startWordId, endWordId ).
+        """
+        wordIndex      = sequenceValues( self.wordIndex )
+        pronunciations = sequenceValues( self.pronunciations )
+        if endWordId is None:
+            endWordId = len( wordIndex ) - 1
+        for wordId in xrange( startWordId, endWordId ):
+            for pronunciationId in xrange( wordIndex[ wordId ], wordIndex[ wordId + 1 ] ):
+                yield wordId, pronunciations[ pronunciationId ]
 
     def getRhymeLevels( self ):
         """
@@ -151,29 +872,78 @@ class PhoneticDictionary( object ):
 
     def getEntries( self ):
         """
-        Get a list of all the words in the dictionary.
+        Get a list of all the words in the dictionary, most popular first.
         """
-        return self.entries.keys()
+        return list( sequenceValues( self.words ) )
 
     def sortWordsByPopularity( self, words ):
         """
-        Return a closure which sorts words based on their popularity
-        as the key function to sorted()
+        Sort words by descending popularity. Words we don't know go last.
+        """
+        known = []
+        unknown = []
+        for word in words:
+            wordId = self.findWordId( word )
+            if wordId is None:
+                unknown.append( word )
+            else:
+                known.append( ( wordId, word ) )
+        return [ word for wordId, word in sorted( known ) ] + unknown
+
+    def sortWordIdsByPopularity( self, wordIds, limit=None ):
+        """
+        Sort word ids by descending popularity, which is their own order,
+        returning the words. Only the first limit are returned, if given.
         """
-        return sorted( words, key=lambda x: -self.findPopularity( x ) )
+        wordIds = sorted( wordIds )[ :limit ]
+        words = self.words
+        if len( wordIds ) * 16 > len( words ):
+            # Cheaper to unpack the whole table than to look up each id
+            words = sequenceValues( words )
+        return [ words[ i ] for i in wordIds ]
 
     def saveBin( self, outPath ):
         """
         Dump compiled version of dictionary to disk.
         """
         with open( outPath, "wb" ) as fout:
-            for word, encodedPronunciations in self.entries.iteritems():
-                for encodedPronunciation in encodedPronunciations:
-                    # TODO: We actially shouldn't save popularity per-pronunciation, since it's keyed on text. Waste of space.
-                    fout.write( word + " " + str( self.findPopularity( word ) ) + " " + encodedPronunciation + "\n" )
-        fout.close()
+            self.writeBin( fout )
+
+    def writeBin( self, fout ):
+        """
+        Write compiled version of dictionary to an open file, along with
+        the indexes that are worth precomputing, and our sourceHash if
+        we were compiled from text. The n-gram index is built to be
+        written if we don't have one.
+
+        Word ids are already popularity ranks, so no separate ranking is
+        stored.
+        """
+        wordLengthOrder, wordLengthStarts = self.getWordLengthOrder()
+        buckets = self.getPronunciationBuckets()
+        ngramIndex = self.getNgramIndex() or PhonemeNgramIndex( sequenceValues( self.pronunciations ) )
+        sections = [
+            ( SECTION_WORDS,          packStringTable( sequenceValues( self.words ) ) ),
+            ( SECTION_ALPHABETICAL,   packColumn( sequenceValues( self.alphabeticalOrder ), "I" ) ),
+            ( SECTION_POPULARITIES,   packColumn( sequenceValues( self.popularityColumn ), "q" ) ),
+            ( SECTION_WORD_INDEX,     packColumn( sequenceValues( self.wordIndex ), "I" ) ),
+            ( SECTION_PRONUNCIATIONS, packStringTable( sequenceValues( self.pronunciations ) ) ),
+            ( SECTION_RHYME_KEYS,     packStringTable( sequenceValues( self.getRhymeKeys() ) ) ),
+            ( SECTION_PRONUNCIATION_OWNERS, packColumn( self.getPronunciationOwners(), "I" ) ),
+            ( SECTION_WORD_LENGTH_ORDER,    packColumn( wordLengthOrder, "I" ) ),
+            ( SECTION_WORD_LENGTH_STARTS,   packColumn( wordLengthStarts, "I" ) ),
+            ( SECTION_BUCKET_ORDER,         packColumn( sequenceValues( buckets.order ), "I" ) ),
+            ( SECTION_BUCKET_KEYS,          packColumn( buckets.keys, "I" ) ),
+            ( SECTION_BUCKET_STARTS,        packColumn( buckets.starts, "I" ) ),
+            ( SECTION_NGRAM_GRAMS,          packStringTable( sequenceValues( ngramIndex.grams ) ) ),
+            ( SECTION_NGRAM_STARTS,         packColumn( sequenceValues( ngramIndex.starts ), "I" ) ),
+            ( SECTION_NGRAM_POSTINGS,       packColumn( sequenceValues( ngramIndex.postings ), "I" ) ),
+            ]
+        if self.sourceHash is not None:
+            sections.append( ( SECTION_SOURCE_HASH, packStringTable( [ self.sourceHash ] ) ) )
+        writeSylviaBin( fout, sections )
 
-    def regexSearch( self, regexTextUnpreprocessed ):
+    def regexSearch( self, regexTextUnpreprocessed, engine=None, limit=None ):
         """
         Apply phonetic regex to each entry in the dict, returning
         a list of words.
@@ -182,51 +952,293 @@ class PhoneticDictionary( object ):
         query if you do not wish to align the match to start and/or end.
 
         If you pass a list of regex, the result will contain those which match any.
+
+        engine overrides the search engine chosen at construction, and
+        is used even where an index could answer instead.
+
+        If limit is given, only the limit most popular words are returned,
+        and searches stop as soon as they have found them.
+
+        Results are remembered in the result cache, so asking again, say
+        for the same rhymes, doesn't search again.
         """
+        #
+        # Results are keyed on the preprocessed text, so that queries
+        # written differently share them. Lists match the same words in
+        # any order.
+        #
         if regexTextUnpreprocessed.__class__ == list:
-            #
-            # Call recursively to handle lists of regexes.
-            # TODO: We're doing some pointless sorting here. Change to an inner/outer
-            #       architecture.
-            result = set()
-            for r in regexTextUnpreprocessed:
-                result |= set( self.regexSearch( r ) )
-            return self.sortWordsByPopularity( list( result ) )
-
-        matchingWords = []
-        regex = re.compile( preprocessPhoneticRegex( regexTextUnpreprocessed )  + "$" )
-        for word, encodedPronunciations in self.entries.iteritems():
-            for encodedPronunciation in encodedPronunciations:
-                if regex.match( encodedPronunciation ):
-                    matchingWords.append( word )
-        return self.sortWordsByPopularity( list( set( matchingWords ) ) )
-
-    def letterRegexSearch( self, regex ):
+            queries = [ self.compileQuery( r ) for r in regexTextUnpreprocessed ]
+            key = ( tuple( sorted( set( [ q.preprocessed for q in queries ] ) ) ), engine, limit )
+        else:
+            query = self.compileQuery( regexTextUnpreprocessed )
+            key = ( query.preprocessed, engine, limit )
+        cache = self.resultCache
+        if cache is not None:
+            results = cache.get( key )
+            if results is not None:
+                return list( results )
+
+        if regexTextUnpreprocessed.__class__ == list:
+            results = self.sortWordIdsByPopularity( self.matchWordIdsForAny( queries, engine, limit ), limit )
+        else:
+            results = self.sortWordIdsByPopularity( self.matchWordIds( query, engine, limit ), limit )
+        if cache is not None:
+            cache.put( key, tuple( results ) )
+        return results
+
+    def letterRegexSearch( self, regex, limit=None ):
         """
         Find words we know which match this regex. Note that this is a normal,
         character based regular expression, and has nothing to do with pronunciations.
 
         Regex will automatically be wrapped in '^' and '$'. Use '.*' before and after
         query if you do not wish to align the match to start and/or end.
+
+        If limit is given, only the limit most popular words are returned.
+        """
+        matchingWordIds = []
+        regex = "^" + regex + "$"
+        lengthBounds, vowelBounds = matchBounds( sre_parse.parse( regex, re.I ) )
+        regex = re.compile( regex, flags=re.I )
+        for length, entries in self.getWordLengthBuckets().iteritems():
+            if not inBounds( length, lengthBounds ):
+                continue
+            found = 0
+            for wordId, word in entries:
+                if regex.match( word ):
+                    matchingWordIds.append( wordId )
+                    found += 1
+                    if found == limit:
+                        # Each bucket is in id order, so the rest are less popular
+                        break
+        return self.sortWordIdsByPopularity( matchingWordIds, limit )
+
+    def findPronunciations( self, word, asList=False ):
+        """
+        Return a list of pronunciations for word in dictionary, each a tuple
+        of phonemes, or a list of them if asList.
+        """
+        return self.findPronunciationsById( self.findWordId( word ), asList )
+
+    def findPronunciationsById( self, wordId, asList=False ):
+        """
+        Return a list of pronunciations for a word id, or an empty list for None.
         """
-        matchingWords = []
-        regex = re.compile( "^" + regex + "$", flags=re.I )
-        for word in self.entries.keys():
-            if regex.match( word ):
-                matchingWords.append( word )
-        return self.sortWordsByPopularity( list( set( matchingWords ) ) )
+        if wordId is None:
+            return []
+        return [ decodePronunciation( self.pronunciations[ p ], asList ) for p in xrange( self.wordIndex[ wordId ], self.wordIndex[ wordId + 1 ] ) ]
 
-    def findPronunciations( self, word ):
+    def findEntry( self, word ):
         """
-        Return a list of pronunciations for word in dictionary
+        Return a DictionaryEntry for word, or None if we don't know it.
         """
-        return [ decodePronunciation( p ) for p in self.entries.get( sanitizeWord( word ), [] ) ]
+        wordId = self.findWordId( word )
+        if wordId is None:
+            return None
+        return DictionaryEntry( self, wordId )
+
+    def iterDictionaryEntries( self ):
+        """
+        Yield a DictionaryEntry for every word, most popular first.
+        """
+        for wordId in xrange( len( self.words ) ):
+            yield DictionaryEntry( self, wordId )
+
+    def batchFindPronunciations( self, words, asList=False ):
+        """
+        Return a dict from each of words to its list of pronunciations in the
+        dictionary, as findPronunciations would. Words are looked up in
+        alphabetical order, each search starting where the last one left off.
+        """
+        bySanitized = {}
+        for word in words:
+            dictListAdd( bySanitized, sanitizeWord( word ), word )
+        results = {}
+        lo = 0
+        for sanitized in sorted( bySanitized.keys() ):
+            wordId, lo = self.findSanitizedWordId( sanitized, lo )
+            pronunciations = self.findPronunciationsById( wordId, asList )
+            for word in bySanitized[ sanitized ]:
+                results[ word ] = pronunciations
+        return results
+
+    def batchRhyme( self, words, level="default", limit=None, pronounce=None ):
+        """
+        Find rhymes for many words at once. Returns a dict from each of words
+        to a list of its rhymes, most popular first, leaving out the word itself.
+
+        Words are grouped by their rhyme regexes, and each distinct regex is
+        searched for once, however many words share it.
+
+        pronounce is called to get a pronunciation for words not in the
+        dictionary. Without it, they have no rhymes. If limit is given, each
+        word gets only the limit most popular rhymes.
+        """
+        if level not in self.getRhymeLevels():
+            raise ValueError( "Unknown rhyme level given: {}".format( level ) )
+
+        regexesByWord = {}
+        for word, pronunciations in self.batchFindPronunciations( words ).iteritems():
+            if not pronunciations and pronounce is not None:
+                pronunciations = [ pronounce( word ) ]
+            regexes = []
+            for pronunciation in pronunciations:
+                try:
+                    regexes.extend( self.getRhymeRegex( list( pronunciation ), level ) )
+                except ValueError:
+                    # No vowels to rhyme with
+                    pass
+            regexesByWord[ word ] = regexes
+
+        #
+        # One extra, in case the word itself is among them
+        #
+        searchLimit = limit + 1 if limit is not None else None
+        wordIdsByRegex = {}
+        for regexes in regexesByWord.values():
+            for regex in regexes:
+                if regex not in wordIdsByRegex:
+                    wordIdsByRegex[ regex ] = self.matchWordIds( self.compileQuery( regex ), limit=searchLimit )
+
+        results = {}
+        for word, regexes in regexesByWord.iteritems():
+            wordIds = set()
+            for regex in regexes:
+                wordIds |= wordIdsByRegex[ regex ]
+            rhymes = self.sortWordIdsByPopularity( wordIds, searchLimit )
+            results[ word ] = [ r for r in rhymes if r.lower() != word.lower() ][ :limit ]
+        return results
+
+    def findWordsByPronunciation( self, phonemes, limit=None ):
+        """
+        Return the words pronounced exactly as phonemes, most popular first.
+        phonemes is a list of phonemes, or a string of them separated by
+        whitespace. Stress markers are ignored.
+        """
+        if isinstance( phonemes, basestring ):
+            phonemes = phonemes.split()
+        try:
+            encoded = encodePronunciation( phonemes )
+        except KeyError as e:
+            raise ValueError( "Unknown phoneme given: {}".format( e.args[ 0 ] ) )
+        return [ self.words[ wordId ] for wordId in self.getPronunciationIndex().get( encoded, [] )[ :limit ] ]
+
+    def homophones( self, word, limit=None, pronounce=None ):
+        """
+        Return the words pronounced exactly as some pronunciation of word,
+        most popular first, leaving out the word itself.
+
+        pronounce is called to get a pronunciation for a word not in the
+        dictionary. Without it, such a word has no homophones.
+        """
+        wordId = self.findWordId( word )
+        if wordId is not None:
+            pronunciations = [ self.pronunciations[ p ] for p in xrange( self.wordIndex[ wordId ], self.wordIndex[ wordId + 1 ] ) ]
+        elif pronounce is not None:
+            pronunciations = [ encodePronunciation( pronounce( word ) ) ]
+        else:
+            return []
+        index = self.getPronunciationIndex()
+        wordIds = set()
+        for pronunciation in pronunciations:
+            wordIds.update( index.get( pronunciation, [] ) )
+        wordIds.discard( wordId )
+        results = [ w for w in self.sortWordIdsByPopularity( wordIds ) if w.lower() != word.lower() ]
+        return results[ :limit ]
+
+    def findWordIdsNear( self, encodedPronunciation, maxDistance, costs=None ):
+        """
+        Return a dict from the id of every word with a pronunciation within
+        maxDistance of encodedPronunciation to its smallest distance. See
+        PhonemeEditDistance for distances, and costs.
+        """
+        distances = {}
+        for distance, wordId in searchTrieWithin( self.getPronunciationTrie(), encodedPronunciation, maxDistance, costs ):
+            if distance < distances.get( wordId, maxDistance + 1 ):
+                distances[ wordId ] = distance
+        return distances
+
+    def nearSearch( self, pronunciationOrWord, maxDistance=1.0, limit=None, pronounce=None, costs=None ):
+        """
+        Find words pronounced within maxDistance phoneme edits of a word, or
+        of a pronunciation given as a list of phonemes. Swapping one vowel
+        for another costs less than other edits, so slant rhymes come out
+        close. See PhonemeEditDistance for the default costs.
+
+        Returns a list of ( word, distance ), closest first, and the most
+        popular first among equally close words. A word is left out of
+        its own results.
+
+        pronounce is called to get a pronunciation for a word not in the
+        dictionary. Without it, such a word has no results.
+        """
+        word = None
+        if isinstance( pronunciationOrWord, basestring ):
+            word = pronunciationOrWord
+            wordId = self.findWordId( word )
+            if wordId is not None:
+                pronunciations = [ self.pronunciations[ p ] for p in xrange( self.wordIndex[ wordId ], self.wordIndex[ wordId + 1 ] ) ]
+            elif pronounce is not None:
+                pronunciations = [ encodePronunciation( pronounce( word ) ) ]
+            else:
+                return []
+        elif isinstance( pronunciationOrWord, ( list, tuple ) ):
+            pronunciations = [ encodePronunciation( pronunciationOrWord ) ]
+        else:
+            raise TypeError( "Can't interpret pronunciationOrWord of type {}.".format( pronunciationOrWord.__class__ ) )
+
+        distances = {}
+        for pronunciation in pronunciations:
+            for wordId, distance in self.findWordIdsNear( pronunciation, maxDistance, costs ).iteritems():
+                if distance < distances.get( wordId, maxDistance + 1 ):
+                    distances[ wordId ] = distance
+        ranked = sorted( distances.iteritems(), key=lambda ( wordId, distance ): ( distance, wordId ) )
+        results = [ ( self.words[ wordId ], distance ) for wordId, distance in ranked ]
+        if word is not None:
+            results = [ ( w, d ) for w, d in results if w.lower() != word.lower() ]
+        return results[ :limit ]
+
+    def similarityRank( self, pronunciationOrWord, k=20, pronounce=None ):
+        """
+        Score every word on how alike it sounds to a word, or to a
+        pronunciation given as a list of phonemes, and return the k best
+        as a list of ( word, score ), best first. A word is left out of
+        its own results. Needs NumPy.
+
+        Words score for sharing phonemes with the query counting back from
+        the end, with the last phonemes counting most, for ending on the
+        same vowel sound, and for having as many syllables. So this ranks
+        perfect rhymes, loose rhymes and near misses in one list. See
+        PhoneticSimilarity for the weights.
+
+        pronounce is called to get a pronunciation for a word not in the
+        dictionary. Without it, such a word has no results.
+        """
+        wordId = None
+        if isinstance( pronunciationOrWord, basestring ):
+            wordId = self.findWordId( pronunciationOrWord )
+            if wordId is not None:
+                pronunciations = [ self.pronunciations[ p ] for p in xrange( self.wordIndex[ wordId ], self.wordIndex[ wordId + 1 ] ) ]
+            elif pronounce is not None:
+                pronunciations = [ encodePronunciation( pronounce( pronunciationOrWord ) ) ]
+            else:
+                return []
+        elif isinstance( pronunciationOrWord, ( list, tuple ) ):
+            pronunciations = [ encodePronunciation( pronunciationOrWord ) ]
+        else:
+            raise TypeError( "Can't interpret pronunciationOrWord of type {}.".format( pronunciationOrWord.__class__ ) )
+        ranked = self.getSimilarityIndex().topWordIds( pronunciations, k, excludeWordId=wordId )
+        return [ ( self.words[ i ], score ) for i, score in ranked ]
 
     def findPopularity( self, word ):
         """
         Spit out the popularity for given word.
         """
-        return self.popularities.get( sanitizeWord( word ), -1 )
+        wordId = self.findWordId( word )
+        if wordId is None:
+            return -1
+        return self.popularityColumn[ wordId ]
 
     def getRhymeRegex( self, pronunciationOrWord, level="default" ):
         """
@@ -247,7 +1259,7 @@ class PhoneticDictionary( object ):
         if isinstance( pronunciationOrWord, basestring ):
             word = sanitizeWord( pronunciationOrWord )
             pronunciations = self.findPronunciations( word )
-        elif pronunciationOrWord.__class__ == list:
+        elif isinstance( pronunciationOrWord, ( list, tuple ) ):
             pronunciations = [ pronunciationOrWord ]
         else:
             raise TypeError( "Can't interpret pronunciationOrWord of type {}.".format( pronunciationOrWord.__class__ ) )
@@ -0,0 +1,361 @@
+#
+# PhoneticQuery.py
+#
+# Compiled form of a preprocessed phonetic regex, and what we can
+# learn about it ahead of searching.
+#
+
+from PhoneticAutomaton import *
+
+import re
+import sre_parse
+import sre_constants
+
+#
+# Constructs which can behave differently when a pronunciation is
+# matched in place inside a newline-delimited buffer, rather than
+# on its own.
+#
+BUFFER_UNSAFE_AT_CODES = set( [ sre_constants.AT_BEGINNING_STRING, sre_constants.AT_END_STRING ] )
+BUFFER_UNSAFE_OPS      = set( [ sre_constants.ASSERT, sre_constants.ASSERT_NOT ] )
+
+END_AT_CODES = set( [ sre_constants.AT_END, sre_constants.AT_END_STRING ] )
+
+#
+# Python's re refuses patterns with 100 or more groups
+#
+MAX_UNION_GROUPS = 99
+
+#
+# Character categories which include the newline
+#
+NEWLINE_CATEGORIES = set( [ sre_constants.CATEGORY_NOT_DIGIT, sre_constants.CATEGORY_SPACE,
+                            sre_constants.CATEGORY_NOT_WORD, sre_constants.CATEGORY_LINEBREAK ] )
+
+def iterRegexOps( parsed ):
+    """
+    Recursively yield every ( op, av ) pair in a parsed regex.
+    """
+    for op, av in parsed:
+        yield op, av
+        for child in _regexChildren( av ):
+            for x in iterRegexOps( child ):
+                yield x
+
+def _regexChildren( av ):
+    """
+    Find the nested subpatterns of an sre_parse argument.
+    """
+    if isinstance( av, sre_parse.SubPattern ):
+        yield av
+    elif isinstance( av, ( tuple, list ) ):
+        for x in av:
+            for child in _regexChildren( x ):
+                yield child
+
+def _canMatchNewline( op, av, flags ):
+    """
+    Can this single-character op match a newline? Such ops let a buffer
+    match run from one pronunciation into the next.
+    """
+    if op == sre_constants.ANY:
+        return bool( flags & sre_constants.SRE_FLAG_DOTALL )
+    if op == sre_constants.LITERAL:
+        return av == ord( "\n" )
+    if op == sre_constants.NOT_LITERAL:
+        return av != ord( "\n" )
+    if op == sre_constants.IN:
+        matched = False
+        negated = False
+        for itemOp, itemAv in av:
+            if itemOp == sre_constants.NEGATE:
+                negated = True
+            elif itemOp == sre_constants.LITERAL:
+                matched |= itemAv == ord( "\n" )
+            elif itemOp == sre_constants.RANGE:
+                matched |= itemAv[ 0 ] <= ord( "\n" ) <= itemAv[ 1 ]
+            elif itemOp == sre_constants.CATEGORY:
+                matched |= itemAv in NEWLINE_CATEGORIES
+        return matched != negated
+    return False
+
+def _singleSymbolMask( items ):
+    """
+    If a parsed sequence matches exactly one phoneme, return the mask of
+    phonemes it matches. Otherwise None.
+    """
+    items = list( items )
+    while len( items ) == 1 and items[ 0 ][ 0 ] == sre_constants.SUBPATTERN:
+        items = list( items[ 0 ][ 1 ][ 1 ] )
+    if len( items ) != 1:
+        return None
+    try:
+        return symbolMask( *items[ 0 ] )
+    except UnsupportedRegexError:
+        return None
+
+def _requiredLiteralRuns( items ):
+    """
+    Return a list of the runs of literal characters which any match of a
+    parsed sequence must contain. Alternations and optional parts are
+    skipped over, which only loses runs, never invents them.
+    """
+    runs = []
+    current = []
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            current.append( chr( av ) if av < 256 else unichr( av ) )
+            continue
+        if current:
+            runs.append( "".join( current ) )
+            current = []
+        if op == sre_constants.SUBPATTERN:
+            runs.extend( _requiredLiteralRuns( av[ 1 ] ) )
+        elif op in ( sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT ) and av[ 0 ] > 0:
+            runs.extend( _requiredLiteralRuns( av[ 2 ] ) )
+    if current:
+        runs.append( "".join( current ) )
+    return runs
+
+def _addBound( a, b ):
+    return None if a is None or b is None else a + b
+
+def _maxBound( a, b ):
+    return None if a is None or b is None else max( a, b )
+
+def _phoneticBounds( items ):
+    """
+    Return ( minLength, maxLength, minVowels, maxVowels ) for the phonemes
+    consumed by any match of a parsed sequence. A maximum of None means
+    unbounded.
+    """
+    minLength, maxLength, minVowels, maxVowels = 0, 0, 0, 0
+    for op, av in items:
+        if op in ( sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.ANY, sre_constants.IN ):
+            try:
+                mask = symbolMask( op, av )
+            except UnsupportedRegexError:
+                mask = ALL_SYMBOLS_MASK
+            bounds = ( 1, 1, 1 if mask and not mask & ~VOWEL_SYMBOLS_MASK else 0, 1 if mask & VOWEL_SYMBOLS_MASK else 0 )
+        elif op in ( sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT ):
+            bounds = ( 0, 0, 0, 0 )
+        elif op == sre_constants.SUBPATTERN:
+            bounds = _phoneticBounds( av[ 1 ] )
+        elif op == sre_constants.BRANCH:
+            branches = [ _phoneticBounds( branch ) for branch in av[ 1 ] ]
+            bounds = ( min( [ b[ 0 ] for b in branches ] ), reduce( _maxBound, [ b[ 1 ] for b in branches ] ),
+                       min( [ b[ 2 ] for b in branches ] ), reduce( _maxBound, [ b[ 3 ] for b in branches ] ) )
+        elif op in ( sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT ):
+            lo, hi, item = av
+            itemBounds = _phoneticBounds( item )
+            def repeated( x ):
+                if x == 0:
+                    return 0
+                if x is None or hi == sre_constants.MAXREPEAT:
+                    return None
+                return x * hi
+            bounds = ( itemBounds[ 0 ] * lo, repeated( itemBounds[ 1 ] ), itemBounds[ 2 ] * lo, repeated( itemBounds[ 3 ] ) )
+        else:
+            bounds = ( 0, None, 0, None )
+        minLength += bounds[ 0 ]
+        maxLength = _addBound( maxLength, bounds[ 1 ] )
+        minVowels += bounds[ 2 ]
+        maxVowels = _addBound( maxVowels, bounds[ 3 ] )
+    return minLength, maxLength, minVowels, maxVowels
+
+def matchBounds( parsed ):
+    """
+    Return the ( min, max ) length and the ( min, max ) vowel count of any
+    string re.match would accept for a parsed regex, with None for no maximum.
+
+    A match only has to cover the whole string when every way through the
+    regex ends with '$'. Otherwise the string may go on past it.
+    """
+    minLength, maxLength, minVowels, maxVowels = _phoneticBounds( parsed )
+    if not _endsAnchored( parsed ):
+        return ( minLength, None ), ( minVowels, None )
+    return ( minLength, maxLength ), ( minVowels, maxVowels )
+
+def _endsAnchored( items ):
+    """
+    Does every match of a parsed sequence end with '$'?
+    """
+    items = list( items )
+    if not items:
+        return False
+    op, av = items[ -1 ]
+    if op == sre_constants.AT:
+        return av in END_AT_CODES
+    if op == sre_constants.SUBPATTERN:
+        return _endsAnchored( av[ 1 ] )
+    if op == sre_constants.BRANCH:
+        return all( [ _endsAnchored( branch ) for branch in av[ 1 ] ] )
+    return False
+
+class PhoneticQuery( object ):
+    """
+    A preprocessed phonetic regex, compiled for each of the ways we
+    search the dictionary.
+
+    The regex keeps the semantics regexSearch has always had: it is
+    matched from the start of each pronunciation, with '$' appended.
+    """
+
+    def __init__( self, preprocessed ):
+        self.preprocessed = preprocessed
+        self.entryRegex   = re.compile( preprocessed + "$" )
+        self.parsed       = sre_parse.parse( preprocessed + "$" )
+        self.bufferSafe   = True
+        for op, av in iterRegexOps( self.parsed ):
+            if op in BUFFER_UNSAFE_OPS or ( op == sre_constants.AT and av in BUFFER_UNSAFE_AT_CODES ):
+                self.bufferSafe = False
+            elif _canMatchNewline( op, av, self.parsed.pattern.flags ):
+                self.bufferSafe = False
+        self.bufferRegex = re.compile( "^(?:" + preprocessed + "$)", re.M ) if self.bufferSafe else None
+        self.literal     = self._findLiteral()
+        self.literalTail = self._findLiteralTail()
+        self.rhymeVowels = self._findRhymeVowels()
+        if self.parsed.pattern.flags & sre_constants.SRE_FLAG_IGNORECASE:
+            self.requiredRuns = []
+        else:
+            self.requiredRuns = _requiredLiteralRuns( self.parsed )
+        self.lengthBounds, self.vowelBounds = matchBounds( self.parsed )
+        self.nfa = None
+        self.nfaUnsupported = False
+        self.dfa = None
+        self.dfaUnsupported = False
+
+    def _findTail( self ):
+        """
+        If the query is '.*' followed by more items and the end anchor,
+        return the items in between. Otherwise None.
+        """
+        items = list( self.parsed )
+        anchored = False
+        while items and items[ -1 ][ 0 ] == sre_constants.AT and items[ -1 ][ 1 ] in END_AT_CODES:
+            items.pop()
+            anchored = True
+        if not anchored or not items:
+            return None
+        op, av = items[ 0 ]
+        if op not in ( sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT ):
+            return None
+        lo, hi, item = av
+        if lo != 0 or hi != sre_constants.MAXREPEAT or list( item ) != [ ( sre_constants.ANY, None ) ]:
+            return None
+        return items[ 1: ]
+
+    def _findLiteral( self ):
+        """
+        If the query is nothing but literal phonemes and the end anchor,
+        so that it matches exactly one pronunciation, return the encoded
+        literal phonemes. Otherwise None.
+        """
+        items = list( self.parsed )
+        anchored = False
+        while items and items[ -1 ][ 0 ] == sre_constants.AT and items[ -1 ][ 1 ] in END_AT_CODES:
+            items.pop()
+            anchored = True
+        if not anchored or not items:
+            return None
+        literals = []
+        for op, av in items:
+            if op != sre_constants.LITERAL or av > 255:
+                return None
+            literals.append( chr( av ) )
+        return "".join( literals )
+
+    def _findLiteralTail( self ):
+        """
+        If the query is '.*' followed by literal phonemes and the end
+        anchor, return the encoded literal phonemes. Otherwise None.
+        """
+        tail = self._findTail()
+        if tail is None:
+            return None
+        literals = []
+        for op, av in tail:
+            if op != sre_constants.LITERAL or av > 255:
+                return None
+            literals.append( chr( av ) )
+        return "".join( literals )
+
+    def _findRhymeVowels( self ):
+        """
+        If the query is '.*' followed by literal phonemes, each of which
+        may be followed by any run of consonants, return the encoded vowels
+        among those literals. Any match must end in exactly these vowels.
+        This is the shape of the "default" and "loose" rhyme regexes.
+        """
+        tail = self._findTail()
+        if tail is None:
+            return None
+        vowels = []
+        for op, av in tail:
+            if op == sre_constants.LITERAL:
+                if av > 255 or chr( av ) not in PHONEME_SYMBOL_BITS:
+                    return None
+                if PHONEME_SYMBOL_BITS[ chr( av ) ] & VOWEL_SYMBOLS_MASK:
+                    vowels.append( chr( av ) )
+            elif op in ( sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT ):
+                lo, hi, item = av
+                mask = _singleSymbolMask( item )
+                if lo != 0 or mask is None or mask & VOWEL_SYMBOLS_MASK:
+                    return None
+            else:
+                return None
+        if not vowels:
+            return None
+        return "".join( vowels )
+
+    def matches( self, encodedPronunciation ):
+        """
+        Does this single encoded pronunciation match?
+        """
+        return self.entryRegex.match( encodedPronunciation ) is not None
+
+    def automaton( self ):
+        """
+        Get a PhoneticNfa for this query, built on first use. Returns None
+        if the regex uses features an automaton can't express.
+        """
+        if self.nfa is None and not self.nfaUnsupported:
+            try:
+                self.nfa = PhoneticNfa( self.parsed )
+            except UnsupportedRegexError:
+                self.nfaUnsupported = True
+        return self.nfa
+
+    def deterministicAutomaton( self ):
+        """
+        Get a minimized PhoneticDfa for this query, built on first use.
+        Returns None if there is no NFA, or if the DFA would be too large.
+        """
+        if self.dfa is None and not self.dfaUnsupported:
+            nfa = self.automaton()
+            try:
+                if nfa is None:
+                    raise UnsupportedRegexError( "No NFA for this query." )
+                self.dfa = PhoneticDfa( nfa )
+            except UnsupportedRegexError:
+                self.dfaUnsupported = True
+        return self.dfa
+
+def unionQuery( queries ):
+    """
+    Combine PhoneticQuerys into one which matches whatever any of them
+    matches, so that they can all be searched for in one pass. Returns
+    None if they can't be combined: group references and inline flags
+    would change meaning once the regexes are side by side.
+    """
+    groups = 0
+    for query in queries:
+        if query.parsed.pattern.flags & ~sre_constants.SRE_FLAG_UNICODE:
+            return None
+        for op, av in iterRegexOps( query.parsed ):
+            if op in ( sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS ):
+                return None
+        groups += query.parsed.pattern.groups - 1
+    if groups >= MAX_UNION_GROUPS:
+        return None
+    return PhoneticQuery( "|".join( [ "(?:" + query.preprocessed + "$)" for query in queries ] ) )
@@ -0,0 +1,172 @@
+#
+# PhoneticSimilarity.py
+#
+# Scores every pronunciation in the dictionary against a query at once,
+# with NumPy. Pronunciations are packed into a matrix of phoneme codes,
+# right aligned so that their endings, where rhymes happen, line up in
+# the same columns.
+#
+# NumPy is only needed here, and is imported on first use.
+#
+
+from PhonemeDetails import *
+
+#
+# Only this many trailing phonemes of each pronunciation are compared
+#
+SIMILARITY_TAIL_WIDTH = 12
+
+#
+# Each phoneme further from the end counts this much less than the one after it
+#
+SIMILARITY_TAIL_DECAY = 0.7
+
+#
+# Score for a phoneme matching the query in the same place from the end. A
+# different phoneme of the same kind, vowel or consonant, earns
+# SIMILARITY_KIND_WEIGHT of that.
+#
+SIMILARITY_KIND_WEIGHT = 0.25
+
+SIMILARITY_LAST_VOWEL_WEIGHT = 1.0 # Score for ending on the query's last vowel sound
+SIMILARITY_SYLLABLE_WEIGHT   = 0.5 # Score for having as many syllables as the query
+
+def importNumpy():
+    """
+    Import NumPy, or explain that similarity ranking needs it.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError( "Similarity ranking needs NumPy. Try: pip2 install numpy" )
+    return numpy
+
+def hasNumpy():
+    """
+    Is NumPy available?
+    """
+    try:
+        importNumpy()
+    except ImportError:
+        return False
+    return True
+
+def phonemeCode( encodedPhoneme ):
+    """
+    Return the small integer code of an encoded phoneme. Code 0 is padding.
+    """
+    return ord( encodedPhoneme ) - 127
+
+class PhoneticSimilarityIndex( object ):
+    """
+    Every pronunciation as a row of phoneme codes, with the features each
+    row is scored on.
+    """
+
+    def __init__( self, pronunciations, wordIndex ):
+        """
+        pronunciations are encoded, and grouped by word. wordIndex gives
+        the id of each word's first pronunciation, with one extra
+        trailing entry, and every word has at least one.
+        """
+        np = importNumpy()
+        self.np = np
+        width = SIMILARITY_TAIL_WIDTH
+        self.wordStarts = np.array( wordIndex[ :-1 ], dtype=np.intp )
+        self.wordCount = len( self.wordStarts )
+
+        #
+        # Right aligned, left padded with zeros
+        #
+        codes = np.zeros( ( len( pronunciations ), width ), dtype=np.uint8 )
+        for row, pronunciation in enumerate( pronunciations ):
+            tail = pronunciation[ -width: ]
+            codes[ row, width - len( tail ): ] = bytearray( tail )
+        codes[ codes != 0 ] -= 127
+
+        #
+        # Per-code features: whether the phoneme is a vowel, with padding
+        # as neither vowel nor consonant
+        #
+        self.kinds = np.zeros( 256, dtype=np.int8 )
+        for details in PHONEME_DETAILS__by_text.values():
+            self.kinds[ phonemeCode( details.encoded() ) ] = 2 if details.isVowelSound() else 1
+        vowels = self.kinds[ codes ] == 2
+
+        #
+        # Syllable count, and code of the last vowel (0 for none), of each row
+        #
+        self.syllables = np.array( [ sum( [ PHONEME_DETAILS__by_encoded[ p ].isVowelSound() for p in pronunciation ] ) for pronunciation in pronunciations ], dtype=np.uint8 )
+        lastVowelColumn = width - 1 - np.argmax( vowels[ :, ::-1 ], axis=1 )
+        self.lastVowels = np.where( vowels.any( axis=1 ), codes[ np.arange( len( pronunciations ) ), lastVowelColumn ], 0 ).astype( np.uint8 )
+
+        self.weights = SIMILARITY_TAIL_DECAY ** np.arange( width - 1, -1, -1, dtype=np.float32 )
+
+        #
+        # Scoring goes a column at a time, so keep each one contiguous
+        #
+        self.columns = np.ascontiguousarray( codes.T )
+
+    def queryFeatures( self, encodedPronunciation ):
+        """
+        Return the right aligned code row, syllable count and last vowel
+        code of a query pronunciation.
+        """
+        np = self.np
+        width = SIMILARITY_TAIL_WIDTH
+        tail = encodedPronunciation[ -width: ]
+        row = np.zeros( width, dtype=np.uint8 )
+        row[ width - len( tail ): ] = [ phonemeCode( p ) for p in tail ]
+        vowels = [ phonemeCode( p ) for p in encodedPronunciation if PHONEME_DETAILS__by_encoded[ p ].isVowelSound() ]
+        return row, len( vowels ), ( vowels[ -1 ] if vowels else 0 )
+
+    def scorePronunciations( self, encodedPronunciation ):
+        """
+        Return an array with the score of every pronunciation against one query.
+        """
+        np = self.np
+        row, syllables, lastVowel = self.queryFeatures( encodedPronunciation )
+        scores = np.zeros( len( self.syllables ), dtype=np.float32 )
+        for column, code in enumerate( row ):
+            if code == 0:
+                continue
+            #
+            # The score of every code in this column, looked up for each row
+            #
+            table = np.where( self.kinds == self.kinds[ code ], SIMILARITY_KIND_WEIGHT, 0.0 ).astype( np.float32 )
+            table[ code ] = 1.0
+            scores += np.take( table * self.weights[ column ], self.columns[ column ] )
+        if lastVowel:
+            scores += SIMILARITY_LAST_VOWEL_WEIGHT * ( self.lastVowels == lastVowel )
+        scores += SIMILARITY_SYLLABLE_WEIGHT * ( self.syllables == syllables )
+        return scores
+
+    def topWordIds( self, encodedPronunciations, k, excludeWordId=None ):
+        """
+        Return ( word id, score ) for the k best scoring words against any
+        of encodedPronunciations, best first. A word scores as its best
+        pronunciation. Ties go to the more popular word.
+        """
+        np = self.np
+        wordScores = np.full( self.wordCount, -np.inf )
+        for encodedPronunciation in encodedPronunciations:
+            #
+            # Each word's pronunciations are contiguous, so its best is one reduction
+            #
+            np.maximum( wordScores, np.maximum.reduceat( self.scorePronunciations( encodedPronunciation ), self.wordStarts ), out=wordScores )
+        if excludeWordId is not None:
+            wordScores[ excludeWordId ] = -np.inf
+        k = min( k, self.wordCount )
+        if k <= 0:
+            return []
+        best = np.argpartition( -wordScores, k - 1 )[ :k ]
+        #
+        # Word ids are in order of popularity, so ties at the cut go to the
+        # lowest ids, and ties within the top k are ordered by id
+        #
+        threshold = wordScores[ best ].min()
+        above = np.flatnonzero( wordScores > threshold )
+        tied = np.flatnonzero( wordScores == threshold )[ : k - len( above ) ]
+        best = np.concatenate( ( above, tied ) )
+        best = best[ np.lexsort( ( best, -wordScores[ best ] ) ) ]
+        return [ ( int( wordId ), float( wordScores[ wordId ] ) ) for wordId in best if wordScores[ wordId ] > -np.inf ]
@@ -0,0 +1,98 @@
+#
+# PronunciationBuckets.py
+#
+# Pronunciations grouped by their phoneme count and vowel count. A query
+# which pins either count only has to search the groups which can match.
+#
+# Groups are runs of one ordering of pronunciation ids, so they can be
+# written to a .sylviabin, and searched through the dictionary's own
+# pronunciations, without a second copy of them.
+#
+
+import array
+
+def inBounds( value, bounds ):
+    """
+    Is value within ( lo, hi )? A hi of None means no upper bound.
+    """
+    lo, hi = bounds
+    return value >= lo and ( hi is None or value <= hi )
+
+def bucketOrder( pronunciations, vowelCounts ):
+    """
+    Return the ids of pronunciations ordered by ( phoneme count, vowel
+    count, id ), the ( phoneme count, vowel count ) of each bucket, laid
+    end to end, and where each bucket starts in the order, with one
+    extra trailing entry.
+    """
+    groups = {}
+    for pronunciationId, pronunciation in enumerate( pronunciations ):
+        key = ( len( pronunciation ), vowelCounts[ pronunciationId ] )
+        if key in groups:
+            groups[ key ].append( pronunciationId )
+        else:
+            groups[ key ] = [ pronunciationId ]
+    order  = array.array( "I" )
+    keys   = array.array( "I" )
+    starts = array.array( "I" )
+    for key in sorted( groups.keys() ):
+        keys.extend( key )
+        starts.append( len( order ) )
+        order.extend( groups[ key ] )
+    starts.append( len( order ) )
+    return order, keys, starts
+
+class PronunciationBuckets( object ):
+    """
+    Every pronunciation, bucketed by ( phoneme count, vowel count ).
+    """
+
+    def __init__( self, order, keys, starts, pronunciations, owners ):
+        """
+        order, keys and starts are as bucketOrder gives them. owners maps
+        each pronunciation id to the id of its word.
+        """
+        self.order          = order
+        self.keys           = keys
+        self.starts         = starts
+        self.pronunciations = pronunciations
+        self.owners         = owners
+        self.buckets = dict( [ ( ( keys[ 2 * i ], keys[ 2 * i + 1 ] ), ( starts[ i ], starts[ i + 1 ] ) ) for i in xrange( len( starts ) - 1 ) ] )
+
+    def __len__( self ):
+        return len( self.order )
+
+    def select( self, lengthBounds, vowelBounds ):
+        """
+        Return the keys of the buckets within both bounds.
+        """
+        return [ key for key in self.buckets if inBounds( key[ 0 ], lengthBounds ) and inBounds( key[ 1 ], vowelBounds ) ]
+
+    def size( self, keys ):
+        """
+        Return the number of pronunciations in the buckets with these keys.
+        """
+        return sum( [ self.buckets[ key ][ 1 ] - self.buckets[ key ][ 0 ] for key in keys ] )
+
+    def matchWordIds( self, query, keys, limit=None ):
+        """
+        Return the set of ids of words with a pronunciation matching query,
+        searching only the buckets with these keys. Each bucket is in id
+        order, so if limit is given, each stops once it has found its limit
+        lowest ids.
+        """
+        pronunciations = self.pronunciations
+        owners = self.owners
+        matches = query.matches
+        matchingWordIds = set()
+        for key in keys:
+            start, end = self.buckets[ key ]
+            found = set()
+            for pronunciationId in self.order[ start : end ]:
+                wordId = owners[ pronunciationId ]
+                if wordId not in found and matches( pronunciations[ pronunciationId ] ):
+                    found.add( wordId )
+                    if len( found ) == limit:
+                        break
+            matchingWordIds |= found
+        return matchingWordIds
@@ -8,11 +8,89 @@
 
 from PhonemeDetails import *
 from LetterDetails import *
+from AhoCorasick import *
+from DictionaryFormat import *
+from LruCache import *
 
 import re
+import pkg_resources
+import itertools
+import collections
+import multiprocessing
+import cStringIO
 
 ACCEPTABLE_CHARS_RE = re.compile( '[^a-zA-Z]' )
 
+#
+# How a rule's sequence must sit in the word, for the rule automaton
+#
+RULE_ANYWHERE    = 0
+RULE_ALIGN_START = 1
+RULE_ALIGN_END   = 2
+
+#
+# A compiled model is a .sylviabin holding these sections. Rules are
+# listed highest priority first, and automaton states in the order they
+# were built, the start state first. Bump INFERENCER_MODEL_VERSION when
+# their meaning changes.
+#
+INFERENCER_MODEL_VERSION = 1
+
+#
+# Default number of inferred pronunciations to remember, by word
+#
+PRONUNCIATION_CACHE_SIZE = 4096
+
+#
+# Default number of words pronounceMany sends a worker process at a time
+#
+PRONOUNCE_CHUNK_SIZE = 1000
+
+#
+# Chunks pronounceMany keeps sent to its workers at once, for each worker.
+# Enough to keep them busy, without reading far ahead of the caller.
+#
+PRONOUNCE_CHUNKS_PER_WORKER = 2
+
+SECTION_MODEL_VERSION        = "MVER" # uint32 column holding INFERENCER_MODEL_VERSION
+SECTION_RULE_SEQUENCES       = "RSEQ" # String table of each rule's letter sequence
+SECTION_RULE_PHONEMES        = "RPHN" # String table of each rule's phonemes, separated by spaces
+SECTION_RULE_ALIGNMENTS      = "RALN" # uint32 column of each rule's RULE_* alignment
+SECTION_AUTOMATON_ALPHABET   = "AALP" # String table holding the automaton's alphabet
+SECTION_AUTOMATON_TABLE      = "ATAB" # uint32 column of the automaton's flat transition table
+SECTION_AUTOMATON_OUTPUTS    = "AOUT" # uint32 column of rule ranks output by each state, state by state
+SECTION_AUTOMATON_OUT_STARTS = "AOST" # uint32 column of the position in AOUT of each state's first output. One extra trailing entry.
+
+def loadDefaultPronunciationInferencer():
+    """
+    Load the compiled model which comes with Sylvia, falling back to
+    generating the rules if it's missing or of another version.
+    """
+    try:
+        with pkg_resources.resource_stream( "sylvia", "data/inferencer.sylviabin" ) as fin:
+            return PronunciationInferencer( modelFile=fin )
+    except ( IOError, ValueError ):
+        return PronunciationInferencer()
+
+#
+# The inferencer of a pronounceMany worker process, loaded once when the
+# process starts
+#
+_WORKER_INFERENCER = None
+
+def _startInferenceWorker( model ):
+    """
+    Worker side of pronounceMany: load the model we were started with.
+    """
+    global _WORKER_INFERENCER
+    _WORKER_INFERENCER = PronunciationInferencer( modelFile=cStringIO.StringIO( model ) )
+
+def _pronounceChunk( words ):
+    """
+    Worker side of pronounceMany: pronounce a list of words.
+    """
+    return _WORKER_INFERENCER.pronounceList( words )
+
 def get_all_substrings(input_string):
     """
     https://stackoverflow.com/questions/22469997/how-to-get-all-the-contiguous-substrings-of-a-string-in-python
@@ -81,31 +159,195 @@ class PronunciationRule( object ):
                 return ( idx, idx + len( sequence ), self.kwargs[ 'phonemes' ] )
             return None
 
+def ruleAlignment( rule ):
+    """
+    Return how a rule's sequence must sit in the word, as one of the
+    RULE_* alignments. As in applyOnce, alignEnd wins over alignStart.
+    """
+    if rule.kwargs.get( 'alignEnd' ):
+        return RULE_ALIGN_END
+    if rule.kwargs.get( 'alignStart' ):
+        return RULE_ALIGN_START
+    return RULE_ANYWHERE
+
 class PronunciationInferencer( object ):
     """
     Construct a ruleset for translating character patterns to
     pronunciations, or find character<->phoneme alignments.
     """
 
-    def __init__( self ):
-        self.rules = []
-        self._generateRules()
+    def __init__( self, modelFile=None, cacheSize=PRONUNCIATION_CACHE_SIZE ):
+        """
+        Generate our rules, or load them, and their automaton, from an
+        open modelFile written by dumpModel.
+
+        cacheSize bounds the cache of inferred pronunciations. See setCacheSize.
+        """
+        self.addedRules = []
+        self.prioritizedRules = None
+        self.ruleAutomaton = None
+        self.setCacheSize( cacheSize )
+        if modelFile is not None:
+            self.loadModel( modelFile )
+        else:
+            self._generateRules()
+
+    @property
+    def rules( self ):
+        """
+        Every rule, highest priority first. Each rule takes priority over
+        those added before it.
+        """
+        if self.prioritizedRules is None:
+            self.prioritizedRules = self.addedRules[ ::-1 ]
+        return self.prioritizedRules
 
     def addRule( self, rule, priorityOver=[] ):
         """
         Add a PronunciationRule
         """
-        self.rules = [ rule ] + self.rules
+        self.addedRules.append( rule )
+        self.rulesChanged()
+
+    def rulesChanged( self ):
+        """
+        Drop everything derived from our rules. Called whenever they change.
+        """
+        self.prioritizedRules = None
+        self.ruleAutomaton = None
+        if self.cache is not None:
+            self.cache.clear()
+
+    def setCacheSize( self, maxSize ):
+        """
+        Resize the LruCache of inferred pronunciations, keyed by sanitized
+        word. A size of 0 turns it off. Resizing empties it.
+        """
+        self.cache = LruCache( maxSize ) if maxSize else None
+
+    def cacheStats( self ):
+        """
+        Return the LruCache stats of the pronunciation cache, or None if
+        it's turned off.
+        """
+        return self.cache.stats() if self.cache is not None else None
+
+    def getRuleAutomaton( self ):
+        """
+        Get an AhoCorasickAutomaton of every rule's sequence, built on first
+        use. Each output is the rule's rank in self.rules, how its sequence
+        must be aligned, and its phonemes.
+        """
+        if self.ruleAutomaton is None:
+            patterns = []
+            for rank, rule in enumerate( self.rules ):
+                if 'sequence' not in rule.kwargs:
+                    continue
+                patterns.append( ( rule.kwargs[ 'sequence' ], ( rank, ruleAlignment( rule ), rule.kwargs[ 'phonemes' ] ) ) )
+            self.ruleAutomaton = AhoCorasickAutomaton( patterns )
+        return self.ruleAutomaton
+
+    def findRuleMatches( self, word ):
+        """
+        Return every place a rule could apply in word, as a list of
+        ( rank, start, end, alignment, phonemes ), best rule first, and
+        leftmost first for each rule.
+
+        Aligned rules only ever apply in one place. An alignEnd rule
+        applies to a range ending at the end of the word, and starting
+        no later than its sequence. An alignStart rule, like applyOnce,
+        applies only when the range is exactly its sequence at the start
+        of the word, and at least that many letters follow.
+        """
+        length = len( word )
+        matches = []
+        for start, end, ( rank, alignment, phonemes ) in self.getRuleAutomaton().findAll( word ):
+            if alignment == RULE_ALIGN_END and end != length:
+                continue
+            if alignment == RULE_ALIGN_START and ( start != 0 or length - end < end ):
+                continue
+            matches.append( ( rank, start, end, alignment, phonemes ) )
+        matches.sort()
+        return matches
 
     def dumpModel( self, path ):
         """
         Save model to a file
         """
-        pass
+        with open( path, "wb" ) as fout:
+            self.writeModel( fout )
+
+    def writeModel( self, fout ):
+        """
+        Write our rules, and their automaton, to an open file as a
+        .sylviabin. Only sequence rules can be written.
+        """
+        rules = self.rules
+        for rule in rules:
+            if 'sequence' not in rule.kwargs:
+                raise ValueError( "Can't write a rule without a sequence: {}".format( rule ) )
+        automaton = self.getRuleAutomaton()
+        outputStarts = [ 0 ]
+        outputs = []
+        for stateOutputs in automaton.outputs:
+            outputs.extend( [ rank for length, ( rank, alignment, phonemes ) in stateOutputs ] )
+            outputStarts.append( len( outputs ) )
+        writeSylviaBin( fout, [
+            ( SECTION_MODEL_VERSION,        packColumn( [ INFERENCER_MODEL_VERSION ], "I" ) ),
+            ( SECTION_RULE_SEQUENCES,       packStringTable( [ rule.kwargs[ 'sequence' ] for rule in rules ] ) ),
+            ( SECTION_RULE_PHONEMES,        packStringTable( [ " ".join( rule.kwargs[ 'phonemes' ] ) for rule in rules ] ) ),
+            ( SECTION_RULE_ALIGNMENTS,      packColumn( [ ruleAlignment( rule ) for rule in rules ], "I" ) ),
+            ( SECTION_AUTOMATON_ALPHABET,   packStringTable( [ automaton.alphabet ] ) ),
+            ( SECTION_AUTOMATON_TABLE,      packColumn( automaton.table, "I" ) ),
+            ( SECTION_AUTOMATON_OUTPUTS,    packColumn( outputs, "I" ) ),
+            ( SECTION_AUTOMATON_OUT_STARTS, packColumn( outputStarts, "I" ) ),
+            ] )
+
+    def loadModel( self, fin ):
+        """
+        Replace our rules, and their automaton, with those of a model
+        written by dumpModel, from an open file.
+        """
+        reader = openSylviaBin( fin )
+        if not reader.hasSection( SECTION_MODEL_VERSION ):
+            raise ValueError( "Not a pronunciation inferencer model." )
+        version = reader.column( SECTION_MODEL_VERSION, "I" )[ 0 ]
+        if version != INFERENCER_MODEL_VERSION:
+            raise ValueError( "Unsupported pronunciation inferencer model version: {}".format( version ) )
+
+        sequences = reader.stringTable( SECTION_RULE_SEQUENCES ).values()
+        phonemes = [ p.split() for p in reader.stringTable( SECTION_RULE_PHONEMES ).values() ]
+        alignments = reader.column( SECTION_RULE_ALIGNMENTS, "I" ).values()
+        rules = []
+        for sequence, rulePhonemes, alignment in zip( sequences, phonemes, alignments ):
+            if alignment == RULE_ALIGN_END:
+                rules.append( PronunciationRule( sequence=sequence, phonemes=rulePhonemes, alignEnd=True ) )
+            elif alignment == RULE_ALIGN_START:
+                rules.append( PronunciationRule( sequence=sequence, phonemes=rulePhonemes, alignStart=True ) )
+            else:
+                rules.append( PronunciationRule( sequence=sequence, phonemes=rulePhonemes ) )
+
+        #
+        # Each rule's output is shared by every state which ends with its sequence
+        #
+        ruleOutputs = [ ( len( sequences[ rank ] ), ( rank, alignments[ rank ], phonemes[ rank ] ) ) for rank in xrange( len( rules ) ) ]
+        outputRanks = reader.column( SECTION_AUTOMATON_OUTPUTS, "I" ).values()
+        outputStarts = reader.column( SECTION_AUTOMATON_OUT_STARTS, "I" ).values()
+        outputs = [ tuple( [ ruleOutputs[ rank ] for rank in outputRanks[ outputStarts[ state ] : outputStarts[ state + 1 ] ] ] ) for state in xrange( len( outputStarts ) - 1 ) ]
+        alphabet = reader.stringTable( SECTION_AUTOMATON_ALPHABET )[ 0 ]
+        table = reader.column( SECTION_AUTOMATON_TABLE, "I" ).values()
+
+        self.addedRules = rules[ ::-1 ]
+        self.rulesChanged()
+        self.prioritizedRules = rules
+        self.ruleAutomaton = AhoCorasickAutomaton( alphabet=alphabet, table=table, outputs=outputs )
 
     def _generateRules( self ):
         """
         Build up our ruleset
+
+        After changing these, regenerate the default model with:
+          PronunciationInferencer().dumpModel( "sylvia/data/inferencer.sylviabin" )
         """
 
         #
@@ -287,9 +529,39 @@ class PronunciationInferencer( object ):
         #
         self.addRule( PronunciationRule( sequence="th", phonemes=[ "DH" ], alignEnd=True ) )
 
-    def _pronouncePartial( self, word, startIdx, endIdx ):
+    def _pronouncePartial( self, word, startIdx, endIdx, matches=None ):
         """
-        Recursive prnunciation generation call
+        Recursive pronunciation generation call. The best rule which
+        applies within the range consumes its leftmost match, and the
+        letters either side are pronounced the same way.
+
+        matches is the result of findRuleMatches( word ), found once and
+        shared by every range.
+        """
+        if matches is None:
+            matches = self.findRuleMatches( word )
+        for rank, start, end, alignment, phonemes in matches:
+            if alignment == RULE_ANYWHERE:
+                if start < startIdx or end > endIdx:
+                    continue
+            elif alignment == RULE_ALIGN_END:
+                if endIdx != len( word ) or start < startIdx:
+                    continue
+            elif startIdx != 0 or end != endIdx:
+                continue
+            ret = list( phonemes )
+            if start > startIdx:
+                ret = self._pronouncePartial( word, startIdx, start, matches ) + ret
+            if end < endIdx:
+                ret = ret + self._pronouncePartial( word, end, endIdx, matches )
+            return ret
+        print word
+        assert( False )
+
+    def _pronouncePartialByRules( self, word, startIdx, endIdx ):
+        """
+        _pronouncePartial, trying each rule's applyOnce in turn. Kept to
+        check the rule automaton against.
         """
         for rule in self.rules:
             ret = rule.applyOnce( word, startIdx, endIdx )
@@ -297,12 +569,12 @@ class PronunciationInferencer( object ):
                 consumedCharsStart, consumedCharsStop, correspondingPhonemes = ret
                 if consumedCharsStart > startIdx:
                     if consumedCharsStop < endIdx:
-                        return self._pronouncePartial( word, startIdx, consumedCharsStart ) + correspondingPhonemes + self._pronouncePartial( word, consumedCharsStop, endIdx )
+                        return self._pronouncePartialByRules( word, startIdx, consumedCharsStart ) + correspondingPhonemes + self._pronouncePartialByRules( word, consumedCharsStop, endIdx )
                     else:
-                        return self._pronouncePartial( word, startIdx, consumedCharsStart ) + correspondingPhonemes
+                        return self._pronouncePartialByRules( word, startIdx, consumedCharsStart ) + correspondingPhonemes
                 else:
                     if consumedCharsStop < endIdx:
-                        return correspondingPhonemes + self._pronouncePartial( word, consumedCharsStop, endIdx )
+                        return correspondingPhonemes + self._pronouncePartialByRules( word, consumedCharsStop, endIdx )
                     else:
                         return correspondingPhonemes
             else:
@@ -311,10 +583,89 @@ class PronunciationInferencer( object ):
         print word
         assert( False )
 
-    def pronounce( self, word ):
+    def pronounce( self, word, asList=False ):
+        """
+        Do it. Returns a tuple of phonemes, or a list of them if asList.
+
+        Pronunciations are remembered in the cache, by sanitized word, so
+        words which come up again, like the unknown words of a poem being
+        edited, are only inferred once.
+        """
+        word = sanitizeWord( word ).lower()
+        word = superSanitizeWord( word )
+        cache = self.cache
+        pronunciation = cache.get( word ) if cache is not None else None
+        if pronunciation is None:
+            pronunciation = tuple( self._pronouncePartial( word, 0, len( word ) ) )
+            if cache is not None:
+                cache.put( word, pronunciation )
+        if asList:
+            return list( pronunciation )
+        return pronunciation
+
+    def pronounceList( self, words ):
+        """
+        Return a list of the pronunciations of words, as pronounce would
+        give them, except that words without any letters get an empty tuple.
+        """
+        return [ self.pronounce( word ) if superSanitizeWord( word ) else () for word in words ]
+
+    def pronounceMany( self, words, workers=None, chunksize=PRONOUNCE_CHUNK_SIZE ):
+        """
+        Pronounce every distinct word of an iterable, which may be far
+        too long to hold at once. Yields ( word, pronunciation ) for each,
+        in the order they first appear, as pronounceList would give them.
+
+        With more than one worker, words are sent chunksize at a time to
+        a pool of that many processes, each of which is given our
+        compiled model once, when it starts. Only a few chunks per worker
+        are read ahead of what's been yielded. Otherwise words are
+        pronounced here, a chunk at a time.
+        """
+        if chunksize < 1:
+            raise ValueError( "pronounceMany needs a chunksize of at least 1, not {}.".format( chunksize ) )
+        seen = set()
+        def distinct():
+            for word in words:
+                if word not in seen:
+                    seen.add( word )
+                    yield word
+        distinctWords = distinct()
+        chunks = iter( lambda: list( itertools.islice( distinctWords, chunksize ) ), [] )
+
+        if workers is None or workers <= 1:
+            for chunk in chunks:
+                for word, pronunciation in zip( chunk, self.pronounceList( chunk ) ):
+                    yield word, pronunciation
+            return
+
+        model = cStringIO.StringIO()
+        self.writeModel( model )
+        pool = multiprocessing.Pool( workers, _startInferenceWorker, ( model.getvalue(), ) )
+        try:
+            #
+            # Keep the pool topped up with chunks, and give their results
+            # back in order. Only pronunciations come back, so remember the
+            # words of each chunk sent to pair them with.
+            #
+            maxInFlight = workers * PRONOUNCE_CHUNKS_PER_WORKER
+            inFlight = collections.deque()
+            while True:
+                for chunk in itertools.islice( chunks, maxInFlight - len( inFlight ) ):
+                    inFlight.append( ( chunk, pool.apply_async( _pronounceChunk, ( chunk, ) ) ) )
+                if not inFlight:
+                    break
+                chunk, result = inFlight.popleft()
+                for pair in zip( chunk, result.get() ):
+                    yield pair
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def pronounceByRules( self, word ):
         """
-        Do it.
+        pronounce, without the rule automaton.
         """
         word = sanitizeWord( word ).lower()
         word = superSanitizeWord( word )
-        return self._pronouncePartial( word, 0, len( word ) )
+        return self._pronouncePartialByRules( word, 0, len( word ) )
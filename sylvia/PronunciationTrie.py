@@ -0,0 +1,76 @@
+#
+# PronunciationTrie.py
+#
+# A trie over encoded pronunciations, stored implicitly as a sorted
+# array. Each node is the range of keys sharing a prefix, and its
+# children are found by bisection, so no per-node objects are needed.
+#
+
+import bisect
+
+class PronunciationTrie( object ):
+    """
+    Trie over a set of keys, each carrying an id. Keys may repeat.
+
+    Nodes are ( lo, hi, depth ) tuples: keys[ lo : hi ] all share the
+    same prefix of length depth.
+    """
+
+    def __init__( self, keys, ids ):
+        order = sorted( xrange( len( keys ) ), key=keys.__getitem__ )
+        self.keys = [ keys[ i ] for i in order ]
+        self.ids  = [ ids[ i ] for i in order ]
+
+        #
+        # Count distinct prefixes, including the empty one at the root
+        #
+        self.nodeCount = 1
+        previous = ""
+        for key in self.keys:
+            common = 0
+            limit = min( len( previous ), len( key ) )
+            while common < limit and previous[ common ] == key[ common ]:
+                common += 1
+            self.nodeCount += len( key ) - common
+            previous = key
+
+    def __len__( self ):
+        return len( self.keys )
+
+    def root( self ):
+        return ( 0, len( self.keys ), 0 )
+
+    def endingHere( self, node ):
+        """
+        Return the end of the range of keys which end exactly at node.
+        They sort ahead of the longer keys sharing their prefix.
+        """
+        lo, hi, depth = node
+        keys = self.keys
+        while lo < hi and len( keys[ lo ] ) == depth:
+            lo += 1
+        return lo
+
+    def children( self, node ):
+        """
+        Yield ( symbol, child node ) for each child of node.
+        """
+        lo, hi, depth = node
+        keys = self.keys
+        pos = self.endingHere( node )
+        if pos >= hi:
+            return
+        prefix = keys[ pos ][ : depth ]
+        while pos < hi:
+            symbol = keys[ pos ][ depth ]
+            childHi = bisect.bisect_left( keys, prefix + chr( ord( symbol ) + 1 ), pos, hi )
+            yield symbol, ( pos, childHi, depth + 1 )
+            pos = childHi
+
+    def prefixRange( self, prefix ):
+        """
+        Return the ( lo, hi ) range of keys starting with prefix.
+        """
+        lo = bisect.bisect_left( self.keys, prefix )
+        hi = bisect.bisect_left( self.keys, prefix + "\xff", lo )
+        return lo, hi
@@ -0,0 +1,271 @@
+#
+# SearchEngines.py
+#
+# Strategies for finding the pronunciations in a PhoneticDictionary
+# which match a PhoneticQuery.
+#
+
+from DictionaryFormat import *
+from PronunciationTrie import *
+from PhoneticQuery import *
+
+import bisect
+import heapq
+import itertools
+import multiprocessing
+
+class ScanSearchEngine( object ):
+    """
+    Match each pronunciation on its own, one at a time.
+    """
+
+    def __init__( self, pd ):
+        self.pd = pd
+
+    def matchWordIds( self, query, limit=None, startWordId=0, endWordId=None ):
+        """
+        Return the set of word ids with a pronunciation matching query,
+        stopping once there are limit of them. Only words with ids in
+        [ startWordId, endWordId ) are searched.
+        """
+        matchingWordIds = set()
+        for wordId, encodedPronunciation in self.pd.iterEntries( startWordId, endWordId ):
+            if query.entryRegex.match( encodedPronunciation ):
+                matchingWordIds.add( wordId )
+                if len( matchingWordIds ) == limit:
+                    break
+        return matchingWordIds
+
+class BufferSearchEngine( object ):
+    """
+    Match every pronunciation in one pass over a newline-delimited
+    buffer, using a MULTILINE regex anchored to the start of each line.
+    Match offsets are mapped back to word ids through the sorted array
+    of offsets at which each word's pronunciations start.
+
+    Queries which can't be matched in place fall back to a scan.
+    """
+
+    def __init__( self, pd ):
+        self.pd = pd
+        pronunciations = pd.pronunciations
+        if isinstance( pronunciations, MappedStringTable ):
+            #
+            # The string table blob is already what we need, and
+            # searching it in place keeps it in the shared mapping.
+            #
+            self.buf       = pronunciations.buf
+            blobStart      = pronunciations.blobStart
+            offsets        = pronunciations.offsets.values()
+        else:
+            self.buf       = "\n" + "".join( [ p + "\n" for p in pronunciations ] )
+            blobStart      = 0
+            offsets        = [ 1 ]
+            for p in pronunciations:
+                offsets.append( offsets[ -1 ] + len( p ) + 1 )
+        #
+        # One more entry than there are words, for the end of the last
+        #
+        self.wordStarts = [ blobStart + offsets[ i ] for i in sequenceValues( pd.wordIndex ) ]
+        self.fallback   = ScanSearchEngine( pd )
+
+    def matchWordIds( self, query, limit=None, startWordId=0, endWordId=None ):
+        """
+        Return the set of word ids with a pronunciation matching query,
+        stopping once there are limit of them. Only words with ids in
+        [ startWordId, endWordId ) are searched.
+        """
+        if not query.bufferSafe:
+            return self.fallback.matchWordIds( query, limit, startWordId, endWordId )
+        buf        = self.buf
+        wordStarts = self.wordStarts
+        if endWordId is None:
+            endWordId = len( wordStarts ) - 1
+        endPos     = wordStarts[ endWordId ] - 1
+        search     = query.bufferRegex.search
+        matchingWordIds = set()
+        pos = wordStarts[ startWordId ]
+        while pos < endPos:
+            m = search( buf, pos, endPos )
+            if m is None:
+                break
+            lineStart = m.start()
+            lineEnd = buf.find( "\n", lineStart, endPos )
+            if lineEnd < 0:
+                lineEnd = endPos
+            wordId = bisect.bisect_right( wordStarts, lineStart ) - 1
+            if m.end() <= lineEnd or query.matches( buf[ lineStart : lineEnd ] ):
+                #
+                # Skip any remaining pronunciations for this word
+                #
+                matchingWordIds.add( wordId )
+                if len( matchingWordIds ) == limit:
+                    break
+                pos = wordStarts[ wordId + 1 ] if wordId + 1 < len( wordStarts ) else endPos
+            else:
+                #
+                # The match ran past the end of this pronunciation, which
+                # a lone match never could. Move on to the next line.
+                #
+                pos = lineEnd + 1
+        return matchingWordIds
+
+class TrieSearchEngine( object ):
+    """
+    Walk a trie of every pronunciation, carrying the set of automaton
+    states reached by each prefix. Subtrees are cut off as soon as the
+    set empties, and taken whole as soon as a prefix matches, so
+    anchored queries touch only a small part of the dictionary.
+
+    Queries which can't be compiled to an automaton go to the buffer engine.
+    """
+
+    def __init__( self, pd ):
+        self.pd = pd
+        self.trie = pd.getPronunciationTrie()
+        self.lastNodeVisits = 0
+
+    def matchWordIds( self, query, limit=None ):
+        """
+        Return the set of word ids with a pronunciation matching query.
+        The number of trie nodes visited is left in self.lastNodeVisits.
+
+        The trie isn't in word id order, so limit can't cut the walk short.
+        """
+        nfa = query.automaton()
+        if nfa is None:
+            self.lastNodeVisits = 0
+            return self.pd.getSearchEngine( "buffer" ).matchWordIds( query, limit )
+        trie = self.trie
+        ids = trie.ids
+        matchingWordIds = set()
+        visits = 0
+        stack = [ ( trie.root(), nfa.initial ) ]
+        while stack:
+            node, states = stack.pop()
+            visits += 1
+            lo, hi, depth = node
+            if nfa.acceptsPrefix( states ):
+                matchingWordIds.update( ids[ lo : hi ] )
+                continue
+            endingHere = trie.endingHere( node )
+            if endingHere > lo and nfa.acceptsAtEnd( states ):
+                matchingWordIds.update( ids[ lo : endingHere ] )
+            for symbol, child in trie.children( node ):
+                childStates = nfa.step( states, symbol )
+                if childStates:
+                    stack.append( ( child, childStates ) )
+        self.lastNodeVisits = visits
+        return matchingWordIds
+
+class DfaSearchEngine( object ):
+    """
+    Run a minimized DFA over each pronunciation. Each phoneme costs one
+    table lookup, so no query can backtrack its way into trouble.
+
+    Queries which can't be compiled to a DFA go to the buffer engine.
+    """
+
+    def __init__( self, pd ):
+        self.pd = pd
+
+    def matchWordIds( self, query, limit=None ):
+        """
+        Return the set of word ids with a pronunciation matching query,
+        stopping once there are limit of them.
+        """
+        dfa = query.deterministicAutomaton()
+        if dfa is None:
+            return self.pd.getSearchEngine( "buffer" ).matchWordIds( query, limit )
+        matches = dfa.matches
+        matchingWordIds = set()
+        for wordId, encodedPronunciation in self.pd.iterEntries():
+            if matches( encodedPronunciation ):
+                matchingWordIds.add( wordId )
+                if len( matchingWordIds ) == limit:
+                    break
+        return matchingWordIds
+
+#
+# Dictionaries being searched by worker processes, by token. Workers are
+# forked after their dictionary is registered here, so they inherit it,
+# and everything it has loaded, copy-on-write instead of having it pickled.
+#
+_PARALLEL_DICTIONARIES = {}
+_parallelTokens = itertools.count()
+
+def _searchShard( args ):
+    """
+    Worker side of ParallelSearchEngine: search one shard, returning the
+    sorted ids of the matching words.
+    """
+    token, preprocessed, limit, startWordId, endWordId = args
+    pd = _PARALLEL_DICTIONARIES[ token ]
+    query = PhoneticQuery( preprocessed )
+    return sorted( pd.getSearchEngine( "buffer" ).matchWordIds( query, limit, startWordId, endWordId ) )
+
+class ParallelSearchEngine( object ):
+    """
+    Split the dictionary into contiguous shards of word ids, and run the
+    buffer engine, or its scan fallback, on each of them in a persistent
+    pool of worker processes.
+    Each shard's results come back in id order, which is popularity order,
+    and are merged.
+
+    The pool is started on first use and lives until close().
+    """
+
+    def __init__( self, pd ):
+        self.pd = pd
+        self.workers = pd.workers or multiprocessing.cpu_count()
+        self.shards = self._makeShards( pd.getSearchEngine( "buffer" ).wordStarts, self.workers )
+        self.token = next( _parallelTokens )
+        self.pool = None
+
+    @staticmethod
+    def _makeShards( wordStarts, count ):
+        """
+        Split word ids into count ( start, end ) ranges holding about the
+        same amount of buffer each.
+        """
+        total = wordStarts[ -1 ] - wordStarts[ 0 ]
+        bounds = [ 0 ]
+        for i in range( 1, count ):
+            bounds.append( max( bounds[ -1 ], bisect.bisect_left( wordStarts, wordStarts[ 0 ] + total * i // count ) ) )
+        bounds.append( len( wordStarts ) - 1 )
+        return [ ( lo, hi ) for lo, hi in zip( bounds, bounds[ 1: ] ) if lo < hi ]
+
+    def startPool( self ):
+        """
+        Register our dictionary for the workers to find, and fork them.
+        """
+        if self.pool is None:
+            _PARALLEL_DICTIONARIES[ self.token ] = self.pd
+            self.pool = multiprocessing.Pool( self.workers )
+
+    def close( self ):
+        """
+        Stop the worker processes.
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        _PARALLEL_DICTIONARIES.pop( self.token, None )
+
+    def matchWordIds( self, query, limit=None ):
+        """
+        Return the set of word ids with a pronunciation matching query.
+        Each shard stops once it has limit of them.
+        """
+        self.startPool()
+        results = self.pool.map( _searchShard, [ ( self.token, query.preprocessed, limit, lo, hi ) for lo, hi in self.shards ] )
+        return set( itertools.islice( heapq.merge( *results ), limit ) )
+
+SEARCH_ENGINES = {
+    "scan"     : ScanSearchEngine,
+    "buffer"   : BufferSearchEngine,
+    "trie"     : TrieSearchEngine,
+    "dfa"      : DfaSearchEngine,
+    "parallel" : ParallelSearchEngine,
+    }
@@ -14,20 +14,24 @@ class Sylvia( object ):
     Combined API wrapper for Sylvia.
     """
 
-    def __init__( self, phoneticDictionary=None, pronunciationInferencer=None ):
+    def __init__( self, phoneticDictionary=None, pronunciationInferencer=None, workers=None ):
         """
         Construct a new Sylvia instance.
 
         Args:
             phoneticDictionary      - PhoneticDictionary to use. If None, the default will be loaded.
             pronunciationInferencer - PronunciationInferencer to use. If None, the default will be loaded.
+            workers                 - Number of processes to search the dictionary with. If None, searches
+                                      run in this process unless phoneticDictionary was set up otherwise.
         """
         self.pd = phoneticDictionary
         self.pi = pronunciationInferencer
         if self.pd is None:
-            self.pd = loadDefaultPhoneticDictionary()
+            self.pd = loadDefaultPhoneticDictionary( workers=workers )
+        elif workers is not None:
+            self.pd.setWorkers( workers )
         if self.pi is None:
-            self.pi = PronunciationInferencer()
+            self.pi = loadDefaultPronunciationInferencer()
 
     def getPronunciation( self, word, findAll=False ):
         """
@@ -43,14 +47,52 @@ class Sylvia( object ):
         Returns:
             See documentation on findAll argument.
         """
-        dictEntries = self.pd.findPronunciations( word )
+        dictEntries = self.pd.findPronunciations( word, asList=True )
         if findAll or len( dictEntries ) <= 0:
-            inferred = self.pi.pronounce( word )
+            inferred = self.pi.pronounce( word, asList=True )
         if findAll:
             return ( dictEntries, inferred )
         else:
             return dictEntries[ 0 ] if len( dictEntries ) >= 1 else inferred
 
+    def batchGetPronunciation( self, words, findAll=False ):
+        """
+        Get the pronunciation, or pronunciations, of many words at once.
+
+        Args:
+            words   - Iterable of words. Repeats are only looked up once.
+            findAll - As for getPronunciation().
+
+        Returns:
+            A dict from each word to what getPronunciation() would return for it.
+        """
+        results = {}
+        inferred = {}
+        for word, dictEntries in self.pd.batchFindPronunciations( words, asList=True ).iteritems():
+            if findAll or len( dictEntries ) <= 0:
+                inferred[ word ] = self.pi.pronounce( word, asList=True )
+            if findAll:
+                results[ word ] = ( dictEntries, inferred[ word ] )
+            else:
+                results[ word ] = dictEntries[ 0 ] if len( dictEntries ) >= 1 else inferred[ word ]
+        return results
+
+    def batchRhyme( self, words, phoneticPattern="default", limit=None ):
+        """
+        Find rhymes for many words at once. Pronunciations are inferred for
+        words not in the dictionary.
+
+        Args:
+            words           - Iterable of words.
+            phoneticPattern - One of phoneticPatterns.
+            limit           - If given, find only this many of the most popular rhymes for each word.
+
+        Returns:
+            A dict from each word to a list of its rhymes, most popular first.
+        """
+        assert( phoneticPattern in self.phoneticPatterns )
+        return self.pd.batchRhyme( words, phoneticPattern, limit=limit, pronounce=self.pi.pronounce )
+
     @property
     def phoneticPatterns( self ):
         """
@@ -72,6 +114,32 @@ class Sylvia( object ):
         """
         assert( phoneticPattern in self.phoneticPatterns )
         ret = self.pd.getRhymeRegex( pronunciationOrWord, phoneticPattern )
-        if isinstance( pronunciationOrWord, list ):
+        if isinstance( pronunciationOrWord, ( list, tuple ) ):
             ret = ret[0]
         return ret
+
+    def findWords( self, phoneticRegex, limit=None ):
+        """
+        Find the words matching a phonetic regex, most popular first.
+
+        Args:
+            phoneticRegex - A phonetic regex, or a list of them to match any of.
+            limit         - If given, return only this many of the most popular.
+
+        Returns:
+            A list of words.
+        """
+        return self.pd.regexSearch( phoneticRegex, limit=limit )
+
+    def cacheStats( self ):
+        """
+        Report how well the dictionary's query and result caches, and the inferencer's
+        pronunciation cache, are doing.
+
+        Returns:
+            A dict from "queries", "results" and "pronunciations" to a dict of that cache's size,
+            maxSize, hits and misses, or to None if it's turned off.
+        """
+        stats = self.pd.cacheStats()
+        stats[ "pronunciations" ] = self.pi.cacheStats()
+        return stats
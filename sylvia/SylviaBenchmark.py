@@ -0,0 +1,335 @@
+#
+# SylviaBenchmark.py
+#
+# Timing comparisons for the different ways Sylvia can do things.
+#
+# Run with:
+#   python2 -m sylvia.SylviaBenchmark {benchmark}
+#
+
+from PhoneticDictionary import *
+
+import argparse
+import cStringIO
+import os
+import re
+import sys
+import time
+import types
+
+#
+# Example queries from the README and console help
+#
+README_QUERIES = [
+    "G #* AE #* IH #* %",
+    "#* IY #* EH D",
+    "#*IH%%%%%(D|P)",
+    "R@D@NG",
+    "S IH #*V#* % AH",
+    ]
+
+README_RHYME_WORDS = [ "chatter", "lately" ]
+
+def readmeQueries( pd ):
+    """
+    The README example regexes, plus the rhyme regexes for the README
+    rhyme examples at every level.
+    """
+    queries = list( README_QUERIES )
+    for word in README_RHYME_WORDS:
+        for level in pd.getRhymeLevels():
+            queries.extend( pd.getRhymeRegex( word, level ) )
+    return queries
+
+def timeCall( f, repeat ):
+    """
+    Return the best wall time of repeat calls to f, and the last result.
+    """
+    best = None
+    for i in range( repeat ):
+        start = time.time()
+        result = f()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+#
+# Column name for the full regexSearch path, indexes and all
+#
+PLANNED = "planned"
+
+def benchmarkSearchEngines( pd, engines=None, queries=None, repeat=3 ):
+    """
+    Time each search engine on each query, and regexSearch itself,
+    verifying that every one returns the same words as the first.
+    """
+    if engines is None:
+        engines = sorted( SEARCH_ENGINES.keys() ) + [ PLANNED ]
+    if queries is None:
+        queries = readmeQueries( pd )
+    # Every repeat would otherwise be answered from the result cache
+    pd.setCacheSizes( resultCacheSize=0 )
+
+    def search( query, engine ):
+        if engine == PLANNED:
+            return pd.regexSearch( query )
+        return pd.sortWordIdsByPopularity( pd.getSearchEngine( engine ).matchWordIds( pd.compileQuery( query ) ) )
+
+    # Build engines and indexes up front, so that setup isn't counted against the first query
+    for engine in engines:
+        search( queries[ 0 ], engine )
+    if PLANNED in engines:
+        for query in queries:
+            search( query, PLANNED )
+
+    print "{:<32}".format( "query" ) + "".join( [ "{:>12}".format( e ) for e in engines ] ) + "{:>10}".format( "results" )
+    totals = dict( [ ( e, 0.0 ) for e in engines ] )
+    for query in queries:
+        row = "{:<32}".format( repr( query )[ :31 ] )
+        expected = None
+        for engine in engines:
+            elapsed, result = timeCall( lambda: search( query, engine ), repeat )
+            totals[ engine ] += elapsed
+            if expected is None:
+                expected = set( result )
+            elif set( result ) != expected:
+                raise AssertionError( "Engine {} disagrees on query {}".format( engine, repr( query ) ) )
+            row += "{:>10.1f}ms".format( elapsed * 1000 )
+        print row + "{:>10}".format( len( expected ) )
+    print "{:<32}".format( "total" ) + "".join( [ "{:>10.1f}ms".format( totals[ e ] * 1000 ) for e in engines ] )
+
+def syllableQueries( maxCount=12 ):
+    """
+    Queries of 1 to maxCount '%' tokens, anchored and unanchored. These
+    nest quantified alternations, which is the worst case for re.
+    """
+    queries = []
+    for n in range( 1, maxCount + 1 ):
+        queries.append( "%" * n )
+        queries.append( ".*" + "%" * n + " Z" )
+    return queries
+
+def benchmarkTrieVisits( pd, queries=None ):
+    """
+    Report how much of the pronunciation trie each query visits.
+    """
+    if queries is None:
+        queries = readmeQueries( pd )
+    engine = pd.getSearchEngine( "trie" )
+    total = engine.trie.nodeCount
+    print "{:<32}{:>12}{:>12}{:>10}".format( "query", "visits", "of nodes", "percent" )
+    for query in queries:
+        engine.matchWordIds( pd.compileQuery( query ) )
+        visits = engine.lastNodeVisits
+        print "{:<32}{:>12}{:>12}{:>9.2f}%".format( repr( query )[ :31 ], visits, total, 100.0 * visits / total )
+
+SOUND_CLASS_QUERIES = [
+    "[:nasal:] AE T",
+    ".* AE [:plosive:]",
+    "[:fricative:]#*@[:liquid:]%*",
+    ]
+
+PHONEME_SET_RE = re.compile( "\\[([\x80-\xff]+)\\]" )
+
+def alternationForm( preprocessed ):
+    """
+    Rewrite each phoneme character set in a preprocessed regex as the
+    equivalent alternation, the way #, @ and % used to be preprocessed.
+    """
+    return PHONEME_SET_RE.sub( lambda m: "(?:" + "|".join( m.group( 1 ) ) + ")", preprocessed )
+
+def benchmarkPhonemeSets( pd, queries=None, repeat=3 ):
+    """
+    Compare compiling, and searching with the buffer engine, for queries
+    preprocessed to character sets and to alternations.
+    """
+    if queries is None:
+        queries = readmeQueries( pd ) + syllableQueries( 6 ) + SOUND_CLASS_QUERIES
+    engine = pd.getSearchEngine( "buffer" )
+    forms = [ ( "sets", preprocessPhoneticRegex ), ( "alts", lambda q: alternationForm( preprocessPhoneticRegex( q ) ) ) ]
+
+    def compileQuery( preprocessed ):
+        re.purge()
+        return PhoneticQuery( preprocessed )
+
+    print "{:<32}".format( "query" ) + "".join( [ "{:>16}{:>16}".format( name + " compile", name + " search" ) for name, form in forms ] )
+    totals = dict( [ ( name, [ 0.0, 0.0 ] ) for name, form in forms ] )
+    for query in queries:
+        row = "{:<32}".format( repr( query )[ :31 ] )
+        expected = None
+        for name, form in forms:
+            preprocessed = form( query )
+            compileTime, compiled = timeCall( lambda: compileQuery( preprocessed ), repeat )
+            searchTime, result = timeCall( lambda: engine.matchWordIds( compiled ), repeat )
+            if expected is None:
+                expected = result
+            elif result != expected:
+                raise AssertionError( "{} form disagrees on query {}".format( name, repr( query ) ) )
+            totals[ name ][ 0 ] += compileTime
+            totals[ name ][ 1 ] += searchTime
+            row += "{:>14.2f}ms{:>14.1f}ms".format( compileTime * 1000, searchTime * 1000 )
+        print row
+    print "{:<32}".format( "total" ) + "".join( [ "{:>14.2f}ms{:>14.1f}ms".format( totals[ name ][ 0 ] * 1000, totals[ name ][ 1 ] * 1000 ) for name, form in forms ] )
+
+def benchmarkCaches( pd, queries=None, repeat=3 ):
+    """
+    Time regexSearch on each query without the query and result caches,
+    then with them, the first time and again, the way an editor asks for
+    the same rhymes over and over.
+    """
+    if queries is None:
+        queries = readmeQueries( pd ) + [ pd.getRhymeRegex( word ) for word in README_RHYME_WORDS ]
+
+    pd.setCacheSizes( 0, 0 )
+    for query in queries:
+        pd.regexSearch( query )
+
+    print "{:<32}{:>12}{:>12}{:>12}".format( "query", "uncached", "first", "again" )
+    totals = [ 0.0, 0.0, 0.0 ]
+    for query in queries:
+        pd.setCacheSizes( 0, 0 )
+        uncachedTime, expected = timeCall( lambda: pd.regexSearch( query ), repeat )
+        pd.setCacheSizes( QUERY_CACHE_SIZE, RESULT_CACHE_SIZE )
+        firstTime, first = timeCall( lambda: pd.regexSearch( query ), 1 )
+        againTime, again = timeCall( lambda: pd.regexSearch( query ), repeat )
+        if first != expected or again != expected:
+            raise AssertionError( "Cached results disagree on query {}".format( repr( query ) ) )
+        for i, elapsed in enumerate( [ uncachedTime, firstTime, againTime ] ):
+            totals[ i ] += elapsed
+        print "{:<32}".format( repr( query )[ :31 ] ) + "".join( [ "{:>10.3f}ms".format( t * 1000 ) for t in [ uncachedTime, firstTime, againTime ] ] )
+    print "{:<32}".format( "total" ) + "".join( [ "{:>10.3f}ms".format( t * 1000 ) for t in totals ] )
+
+def deepSizeOf( obj, seen=None ):
+    """
+    Return the bytes used by obj and everything it refers to, counting
+    shared objects once.
+    """
+    if seen is None:
+        seen = set()
+    if id( obj ) in seen or isinstance( obj, ( type, types.ModuleType, types.FunctionType ) ):
+        return 0
+    seen.add( id( obj ) )
+    size = sys.getsizeof( obj )
+    if isinstance( obj, dict ):
+        size += sum( [ deepSizeOf( k, seen ) + deepSizeOf( v, seen ) for k, v in obj.iteritems() ] )
+    elif isinstance( obj, ( list, tuple, set, frozenset ) ):
+        size += sum( [ deepSizeOf( x, seen ) for x in obj ] )
+    elif hasattr( obj, "__dict__" ):
+        size += deepSizeOf( obj.__dict__, seen )
+    return size
+
+def residentSetSize():
+    """
+    Return this process's resident set size in bytes, or None where
+    /proc isn't available.
+    """
+    try:
+        with open( "/proc/self/status" ) as fin:
+            for line in fin:
+                if line.startswith( "VmRSS:" ):
+                    return int( line.split()[ 1 ] ) * 1024
+    except IOError:
+        pass
+    return None
+
+def measureLayout( build ):
+    """
+    Return the deep size of build()'s result, and how much the resident
+    set grew while building it, or None where that can't be measured.
+    Each build runs in a forked child, so that every layout starts from
+    the same heap. The resident set keeps whatever heap the build used
+    along the way, so it shows the cost of getting to a layout as well
+    as of keeping it.
+    """
+    rfd, wfd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close( rfd )
+        before = residentSetSize()
+        result = build()
+        after = residentSetSize()
+        growth = -1 if before is None else after - before
+        os.write( wfd, "{} {}".format( deepSizeOf( result ), growth ) )
+        os._exit( 0 )
+    os.close( wfd )
+    size, growth = [ int( x ) for x in os.read( rfd, 64 ).split() ]
+    os.close( rfd )
+    os.waitpid( pid, 0 )
+    return size, ( None if growth < 0 else growth )
+
+def legacyBuffer( pd ):
+    """
+    Return pd in the original newline-split binary format.
+    """
+    fout = cStringIO.StringIO()
+    for wordId, word in enumerate( sequenceValues( pd.words ) ):
+        for p in xrange( pd.wordIndex[ wordId ], pd.wordIndex[ wordId + 1 ] ):
+            fout.write( "{} {} {}\n".format( word, pd.popularityColumn[ wordId ], pd.pronunciations[ p ] ) )
+    return fout.getvalue()
+
+def dictionaryTables( pd ):
+    """
+    The tables holding a dictionary's entries, with rhyme keys for parity
+    with the compact layout, which always carries them.
+    """
+    pd.getRhymeKeys()
+    return [ pd.words, pd.popularityColumn, pd.alphabeticalOrder, pd.wordIndex, pd.pronunciations, pd.rhymeKeys ]
+
+def buildDicts( buf ):
+    """
+    The original layout: a dict of word -> list of pronunciations, and a
+    dict of word -> popularity.
+    """
+    entries = {}
+    popularities = {}
+    for line in buf.split( "\n" ):
+        if len( line ) == 0:
+            continue
+        word, popularity, pronunciation = line.split( " " )
+        popularities[ word ] = int( popularity )
+        dictListAdd( entries, word, pronunciation )
+    return [ entries, popularities ]
+
+#
+# ( name, source format, build ) for each layout. "mapped" reads a
+# versioned .sylviabin, as loadDefaultPhoneticDictionary does.
+#
+MEMORY_LAYOUTS = [
+    ( "dicts",   "legacy", buildDicts ),
+    ( "lists",   "legacy", lambda buf: dictionaryTables( PhoneticDictionary( binFile=cStringIO.StringIO( buf ) ) ) ),
+    ( "compact", "legacy", lambda buf: dictionaryTables( PhoneticDictionary( binFile=cStringIO.StringIO( buf ), compact=True ) ) ),
+    ( "mapped",  "sylviabin", lambda buf: dictionaryTables( PhoneticDictionary( binFile=cStringIO.StringIO( buf ) ) ) ),
+    ]
+
+def benchmarkMemory( pd ):
+    """
+    Compare the memory used by each in-memory layout of the dictionary.
+    """
+    fout = cStringIO.StringIO()
+    pd.writeBin( fout )
+    sources = { "legacy": legacyBuffer( pd ), "sylviabin": fout.getvalue() }
+    print "{:<12}{:>16}{:>16}".format( "layout", "deep size MB", "RSS growth MB" )
+    for name, source, build in MEMORY_LAYOUTS:
+        size, growth = measureLayout( lambda: build( sources[ source ] ) )
+        print "{:<12}{:>16.1f}{:>16}".format( name, size / 1e6, "n/a" if growth is None else "{:.1f}".format( growth / 1e6 ) )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument( "benchmark", choices=[ "engines", "trie", "syllables", "memory", "sets", "caches" ], help="Which benchmark to run." )
+    parser.add_argument( "-r", "--repeat", type=int, default=3, help="Take the best of this many runs." )
+    args = parser.parse_args()
+
+    pd = loadDefaultPhoneticDictionary()
+    if args.benchmark == "engines":
+        benchmarkSearchEngines( pd, repeat=args.repeat )
+    elif args.benchmark == "syllables":
+        benchmarkSearchEngines( pd, engines=[ "scan", "buffer", "dfa", PLANNED ], queries=syllableQueries(), repeat=args.repeat )
+    elif args.benchmark == "trie":
+        benchmarkTrieVisits( pd )
+    elif args.benchmark == "memory":
+        benchmarkMemory( pd )
+    elif args.benchmark == "sets":
+        benchmarkPhonemeSets( pd, repeat=args.repeat )
+    elif args.benchmark == "caches":
+        benchmarkCaches( pd, repeat=args.repeat )
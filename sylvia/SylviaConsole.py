@@ -16,6 +16,7 @@ import sys
 from PhoneticDictionary import *
 from PronunciationInferencer import *
 from Poem import *
+from SylviaApiWrapper import *
 
 def _get_terminal_size():
     """ getTerminalSize()
@@ -167,6 +168,31 @@ class SylviaConsole( cmd.Cmd ):
                     if v is not None:
                         self.settings[ "inferunknown" ] = v
 
+            elif config == "limit":
+                if len( args ) != 2:
+                    if interactive:
+                        self.errorMessage( "limit argument needs to be a single integer. Use 0 for no limit." )
+                    else:
+                        assert( False )
+                else:
+                    v = args[1]
+                    if v.__class__ == str:
+                        v = int( v )
+                    self.settings[ "limit" ] = v if v > 0 else None
+
+            elif config == "workers":
+                if len( args ) != 2:
+                    if interactive:
+                        self.errorMessage( "workers argument needs to be a single integer." )
+                    else:
+                        assert( False )
+                else:
+                    v = args[1]
+                    if v.__class__ == str:
+                        v = int( v )
+                    self.checkPd()
+                    self.pd.setWorkers( v )
+
             else:
                 self.errorMessage( "Unknown configuration option." )
 
@@ -187,6 +213,7 @@ class SylviaConsole( cmd.Cmd ):
         self.settings = {}
         self.settings[ "charwidth" ] = self.findDefaultCharWidth()
         self.settings[ "inferunknown" ] = True
+        self.settings[ "limit" ] = None
         self.poems = {}
 
     def checkPd( self ):
@@ -203,7 +230,7 @@ class SylviaConsole( cmd.Cmd ):
         if one is not set.
         """
         if not hasattr( self, "pi" ):
-            self.pi = PronunciationInferencer()
+            self.pi = loadDefaultPronunciationInferencer()
 
     def tokenizeArgs( self, line ):
         """
@@ -279,6 +306,9 @@ class SylviaConsole( cmd.Cmd ):
         charwidth    int  - The character width of the console.
         inferunknown bool - When asked to rhyme a word not in the dictionary, whether we
                             should infer a pronunciation.
+        limit        int  - Show at most this many of the most popular results of a search.
+                            0 for no limit.
+        workers      int  - Search with this many processes. 1 to search in this one.
         """
         args = self.tokenizeArgs( arg )
         self.setConfig( *args, interactive=True )
@@ -293,7 +323,7 @@ class SylviaConsole( cmd.Cmd ):
         if len( args ) != 1:
             self.errorMessage( "Need a single argument -- the regular expression for which to match." )
         else:
-            self.printWords( self.pd.letterRegexSearch( args[0] ) )
+            self.printWords( self.pd.letterRegexSearch( args[0], limit=self.settings[ "limit" ] ) )
 
     def do_regex( self, arg ):
         """
@@ -304,6 +334,9 @@ class SylviaConsole( cmd.Cmd ):
           * # matches any consonant phoneme
           * @ matches any vowel phoneme
           * % matches any syllable (equivalent to #*@#*)
+          * [:class:] matches any phoneme in a sound class: vowel, consonant, plosive,
+            affricate, fricative, nasal, liquid, glide, voiced or voiceless. Classes,
+            # and @ may be put together in a set, like [[:nasal:] L] or [^[:vowel:]]
           * Whitespace is irrelevant and will be removed, but must be used to separate
             consecutive phoneme literals.
           * See cmudict documentation for list of phoneme literals.
@@ -313,13 +346,14 @@ class SylviaConsole( cmd.Cmd ):
 
         Try it out:
           regex S IH #*V#* % AH
+          regex [:nasal:] AE T
         """
         self.checkPd()
         args = self.tokenizeArgs( arg )
         if len( args ) == 0:
             self.errorMessage( "Need an argument. Type 'help regex' to learn more." )
         else:
-            self.printWords( self.pd.regexSearch( " ".join( args ) ) )
+            self.printWords( self.pd.regexSearch( " ".join( args ), limit=self.settings[ "limit" ] ) )
 
     def do_rhyme( self, arg ):
         """
@@ -345,17 +379,163 @@ class SylviaConsole( cmd.Cmd ):
             results = None
 
             query = word
-            if len( self.pd.findPronunciations( word ) ) == 0:
+            if self.pd.findWordId( word ) is None:
                 if self.settings[ "inferunknown" ]:
                     self.checkPi()
                     pronunciation = self.pi.pronounce( word )
                     query = pronunciation
 
-            results = self.pd.regexSearch( self.pd.getRhymeRegex( query, level ) )
-            results = [ r for r in results if r.lower() != word.lower() ]
+            #
+            # One extra, in case the word itself is among them
+            #
+            limit = self.settings[ "limit" ]
+            results = self.pd.regexSearch( self.pd.getRhymeRegex( query, level ), limit=limit + 1 if limit else None )
+            results = [ r for r in results if r.lower() != word.lower() ][ :limit ]
             if results:
                 self.printWords( results )
 
+    def do_homophones( self, arg ):
+        """
+        Find the words pronounced exactly like a word.
+
+        Try it out:
+          homophones there
+        """
+        self.checkPd()
+        args = self.tokenizeArgs( arg )
+        if len( args ) != 1:
+            self.errorMessage( "Need a single word. Type 'help homophones' for details." )
+            return
+        pronounce = None
+        if self.settings[ "inferunknown" ]:
+            self.checkPi()
+            pronounce = self.pi.pronounce
+        results = self.pd.homophones( args[0], limit=self.settings[ "limit" ], pronounce=pronounce )
+        if results:
+            self.printWords( results )
+
+    def do_pronounced( self, arg ):
+        """
+        Find the words pronounced exactly as the given phonemes.
+
+        Try it out:
+          pronounced DH EH R
+        """
+        self.checkPd()
+        args = self.tokenizeArgs( arg )
+        if len( args ) == 0:
+            self.errorMessage( "Need at least one phoneme. Type 'help pronounced' for details." )
+            return
+        try:
+            results = self.pd.findWordsByPronunciation( args, limit=self.settings[ "limit" ] )
+        except ValueError as e:
+            self.errorMessage( str( e ) )
+            return
+        if results:
+            self.printWords( results )
+
+    def do_near( self, arg ):
+        """
+        Find words which sound close to a word, closest first. Optionally give
+        the greatest distance, in phoneme edits, before the word. It defaults
+        to 1. Swapping one vowel for another counts as half an edit.
+
+        Try it out:
+          near orange
+          near 1.5 chatter
+        """
+        self.checkPd()
+        args = self.tokenizeArgs( arg )
+        if not ( 0 < len( args ) < 3 ):
+            self.errorMessage( "Bad number of arguments. Type 'help near' for details." )
+            return
+        maxDistance = 1.0
+        if len( args ) == 2:
+            try:
+                maxDistance = float( args[0] )
+            except ValueError:
+                self.errorMessage( "The distance needs to be a number. Type 'help near' for details." )
+                return
+        word = args[-1]
+        pronounce = None
+        if self.settings[ "inferunknown" ]:
+            self.checkPi()
+            pronounce = self.pi.pronounce
+        results = self.pd.nearSearch( word, maxDistance, limit=self.settings[ "limit" ], pronounce=pronounce )
+        if results:
+            self.printWords( [ w for w, distance in results ] )
+
+    def do_similar( self, arg ):
+        """
+        Rank the words which sound most like a word, perfect rhymes, loose
+        rhymes and near misses together. Shows the limit configured, or 20.
+        Needs NumPy.
+
+        Try it out:
+          similar orange
+        """
+        self.checkPd()
+        args = self.tokenizeArgs( arg )
+        if len( args ) != 1:
+            self.errorMessage( "Need a single word. Type 'help similar' for details." )
+            return
+        pronounce = None
+        if self.settings[ "inferunknown" ]:
+            self.checkPi()
+            pronounce = self.pi.pronounce
+        try:
+            results = self.pd.similarityRank( args[0], self.settings[ "limit" ] or 20, pronounce=pronounce )
+        except ImportError as e:
+            self.errorMessage( str( e ) )
+            return
+        if results:
+            self.printWords( [ w for w, score in results ] )
+
+    def do_batch_rhyme( self, arg ):
+        """
+        Find rhymes for several words at once. Optionally give a rhyme level
+        before the words.
+
+        Try it out:
+          batch_rhyme lately chatter orange
+          batch_rhyme loose lately chatter orange
+        """
+        self.checkPd()
+        args = self.tokenizeArgs( arg )
+        level = "default"
+        if args and args[0] in self.pd.getRhymeLevels():
+            level = args[0]
+            args = args[1:]
+        if len( args ) == 0:
+            self.errorMessage( "Need at least one word. Type 'help batch_rhyme' for details." )
+            return
+        pronounce = None
+        if self.settings[ "inferunknown" ]:
+            self.checkPi()
+            pronounce = self.pi.pronounce
+        results = self.pd.batchRhyme( args, level, limit=self.settings[ "limit" ], pronounce=pronounce )
+        for word in args:
+            print word + ":"
+            self.printWords( results[ word ] )
+
+    def do_batch_pronunciation( self, arg ):
+        """
+        Get the most likely pronunciation of several words at once, inferring
+        it for words not in the dictionary.
+
+        Try it out:
+          batch_pronunciation cats jabberwocky dogs
+        """
+        self.checkPd()
+        self.checkPi()
+        args = self.tokenizeArgs( arg )
+        if len( args ) == 0:
+            self.errorMessage( "Need at least one word. Type 'help batch_pronunciation' for details." )
+            return
+        results = Sylvia( self.pd, self.pi ).batchGetPronunciation( args )
+        for word in args:
+            print word + ":", " ".join( results[ word ] )
+
     def do_popularity( self, arg ):
         """
         Get the popularity for a word.
@@ -516,6 +696,9 @@ class SylviaConsole( cmd.Cmd ):
 
         Either pass the number of words to test, or no arguments
         for the default of 1000.
+
+        For timings and distance metrics, run:
+          python2 -m sylvia.InferenceBenchmark
         """
         self.checkPi()
         self.checkPd()
@@ -528,9 +711,11 @@ class SylviaConsole( cmd.Cmd ):
         else:
             count= 1000
         hits = 0
-        for word in sorted( self.pd.entries.keys(), key=lambda x: -self.pd.findPopularity( x ) )[:count]:
-            real = self.pd.findPronunciations( word )
-            guess = self.pi.pronounce( word )
+        count = min( count, len( self.pd.words ) )
+        for wordId in xrange( count ):
+            word = self.pd.words[ wordId ]
+            real = self.pd.findPronunciationsById( wordId, asList=True )
+            guess = self.pi.pronounce( word, asList=True )
             if guess in real:
                 hits += 1
             else:
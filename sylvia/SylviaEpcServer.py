@@ -5,6 +5,7 @@
 #
 
 from Poem import *
+from SylviaApiWrapper import *
 
 def as_ascii( maybeAscii ):
     """
@@ -22,6 +23,7 @@ def startEpcServer( pd, pi ):
 
     server = EPCServer(('localhost', 0))
     poem = Poem( pd, pi, "" )
+    sylvia = Sylvia( pd, pi )
 
     # TODO!!!
     # Merge all of this with SylviaConsole in a
@@ -29,11 +31,11 @@ def startEpcServer( pd, pi ):
 
     @server.register_function
     def lookup( word ):
-        return pd.findPronunciations( as_ascii( word ) )
+        return pd.findPronunciations( as_ascii( word ), asList=True )
 
     @server.register_function
     def infer( word ):
-        return pi.pronounce( as_ascii( word ) )
+        return pi.pronounce( as_ascii( word ), asList=True )
 
     @server.register_function
     def rhyme_levels():
@@ -44,22 +46,74 @@ def startEpcServer( pd, pi ):
         return pd.getRhymeRegex( as_ascii( pronunciationOrWord ), as_ascii( rhymeLevel ) )
 
     @server.register_function
-    def rhyme(word, level):
+    def rhyme(word, level, limit=None):
         if level == []:
             level = "default"
+        if limit == []:
+            limit = None
         level = as_ascii( level )
         word = as_ascii( word )
         query = word
         results = None
-        if len( pd.findPronunciations( word ) ) == 0:
+        if pd.findWordId( word ) is None:
             pronunciation = pi.pronounce( word )
             query = pronunciation
-        results = pd.regexSearch( pd.getRhymeRegex( query, level ) )
-        return [ r for r in results if r.lower() != word.lower() ]
+        results = pd.regexSearch( pd.getRhymeRegex( query, level ), limit=limit + 1 if limit else None )
+        return [ r for r in results if r.lower() != word.lower() ][ :limit ]
 
     @server.register_function
-    def regex( phoneme_regex ):
-        return pd.regexSearch( as_ascii( phoneme_regex ) )
+    def homophones( word, limit=None ):
+        if limit == []:
+            limit = None
+        return pd.homophones( as_ascii( word ), limit=limit, pronounce=pi.pronounce )
+
+    @server.register_function
+    def words_pronounced( pronunciation, limit=None ):
+        if limit == []:
+            limit = None
+        if isinstance( pronunciation, basestring ):
+            pronunciation = as_ascii( pronunciation )
+        else:
+            pronunciation = [ as_ascii( p ) for p in pronunciation ]
+        return pd.findWordsByPronunciation( pronunciation, limit=limit )
+
+    @server.register_function
+    def near( word, max_distance=1.0, limit=None ):
+        if max_distance == []:
+            max_distance = 1.0
+        if limit == []:
+            limit = None
+        return [ [ w, d ] for w, d in pd.nearSearch( as_ascii( word ), max_distance, limit=limit, pronounce=pi.pronounce ) ]
+
+    @server.register_function
+    def similar( word, k=20 ):
+        if k == []:
+            k = 20
+        return [ [ w, score ] for w, score in pd.similarityRank( as_ascii( word ), k, pronounce=pi.pronounce ) ]
+
+    @server.register_function
+    def batch_rhyme( words, level, limit=None ):
+        if level == []:
+            level = "default"
+        if limit == []:
+            limit = None
+        results = sylvia.batchRhyme( [ as_ascii( w ) for w in words ], as_ascii( level ), limit=limit )
+        return [ [ word, rhymes ] for word, rhymes in results.iteritems() ]
+
+    @server.register_function
+    def batch_get_pronunciation( words ):
+        results = sylvia.batchGetPronunciation( [ as_ascii( w ) for w in words ] )
+        return [ [ word, pronunciation ] for word, pronunciation in results.iteritems() ]
+
+    @server.register_function
+    def regex( phoneme_regex, limit=None ):
+        if limit == []:
+            limit = None
+        return pd.regexSearch( as_ascii( phoneme_regex ), limit=limit )
+
+    @server.register_function
+    def cache_stats():
+        return [ [ name, stats.items() if stats is not None else None ] for name, stats in sylvia.cacheStats().iteritems() ]
 
     @server.register_function
     def update_poem( poem_text ):
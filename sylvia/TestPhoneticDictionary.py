@@ -0,0 +1,502 @@
+#
+# TestPhoneticDictionary.py
+#
+# Unit tests for the PhoneticDictionary class
+#
+
+import unittest
+import cStringIO
+import tempfile
+import shutil
+import os
+import bisect
+from PhoneticDictionary import *
+from DictionaryCompiler import *
+
+class TestPhoneticDictionary( unittest.TestCase ):
+    """
+    Unit testing for the PhoneticDictionary class.
+    """
+
+    RHYME_WORDS = [ "chatter", "lately", "dogs", "either", "orange", "cat", "supercalifragilisticexpialidocious" ]
+
+    README_REGEXES = [ "G #* AE #* IH #* %", "#* IY #* EH D", "#*IH%%%%%(D|P)", "S IH #*V#* % AH" ]
+
+    @classmethod
+    def setUpClass( cls ):
+        """
+        Load the dictionary once; it's read-only.
+        """
+        cls.pd = loadDefaultPhoneticDictionary()
+
+    def assertSameAsEngine( self, regex ):
+        """
+        Check that regexSearch, with whatever indexes it uses, agrees with
+        a full scan by the buffer engine.
+        """
+        query = self.pd.compileQuery( regex )
+        expected = self.pd.getSearchEngine( "buffer" ).matchWordIds( query )
+        self.assertEqual( set( self.pd.regexSearch( regex ) ), set( [ self.pd.words[ i ] for i in expected ] ) )
+
+    def assertEnginesAgree( self, engine, regexes ):
+        """
+        Check that engine matches the same word ids as a scan, for each regex.
+        """
+        scan = self.pd.getSearchEngine( "scan" )
+        for regex in regexes:
+            query = self.pd.compileQuery( regex )
+            self.assertEqual( self.pd.getSearchEngine( engine ).matchWordIds( query ), scan.matchWordIds( query ), regex )
+
+    def test_bufferEngine( self ):
+        """
+        Test that matching the whole buffer at once finds what matching each
+        pronunciation on its own does, without matching across lines or
+        partway into a pronunciation.
+        """
+        buffer = self.pd.getSearchEngine( "buffer" )
+        cat = self.pd.findWordId( "cat" )
+        self.assertNotIn( cat, buffer.matchWordIds( self.pd.compileQuery( "AE" ) ) )
+        self.assertNotIn( cat, buffer.matchWordIds( self.pd.compileQuery( "K AE" ) ) )
+        self.assertIn( cat, buffer.matchWordIds( self.pd.compileQuery( "K AE T|B AE T" ) ) )
+        self.assertIn( cat, buffer.matchWordIds( self.pd.compileQuery( "B AE T|K AE T" ) ) )
+        self.assertEqual( buffer.matchWordIds( self.pd.compileQuery( "K AE T" ), None, cat, cat + 1 ), set( [ cat ] ) )
+        self.assertNotIn( cat, buffer.matchWordIds( self.pd.compileQuery( "K AE T" ), None, cat + 1 ) )
+        self.assertEnginesAgree( "buffer", self.README_REGEXES + [ "AE", "K AE", "K AE T|B AE T", "AE|.* T", "%%|#", "(K|B) AE T S?", "(#)\\1.*" ] )
+
+    def test_trieEngine( self ):
+        """
+        Test that walking the pronunciation trie finds what a scan does, and
+        that anchored queries only visit a small part of the trie.
+        """
+        trie = self.pd.getSearchEngine( "trie" )
+        self.assertEnginesAgree( "trie", self.README_REGEXES + [ ".* AE T ER", "K AE T|B AE T", "(AE T)+ #*", "%%%%%%", "(#)\\1.*" ] )
+        trie.matchWordIds( self.pd.compileQuery( "S IH #*V#* % AH" ) )
+        self.assertLess( trie.lastNodeVisits * 100, trie.trie.nodeCount )
+
+    def test_dfaEngine( self ):
+        """
+        Test that running a minimized DFA finds what a scan does, that
+        minimization leaves one state per distinct future, and that queries
+        with backreferences fall back.
+        """
+        for regex, stateCount in [ ( "K AE T", 6 ), ( "(K|B) AE T", 6 ), ( "%", 4 ), ( "%%%%%%", 9 ) ]:
+            self.assertEqual( self.pd.compileQuery( regex ).deterministicAutomaton().stateCount, stateCount, regex )
+        self.assertIsNone( self.pd.compileQuery( "(#)\\1.*" ).deterministicAutomaton() )
+        self.assertEnginesAgree( "dfa", self.README_REGEXES + [ "%%%%%%", ".*%%%%%% Z", ".*%%%% Z", "(%)+ Z", "K AE T|B AE T", "(#)\\1.*", "(#)\\1%" ] )
+
+    def test_suffixIndex( self ):
+        """
+        Test that literal suffix queries answered by the suffix index match a full scan.
+        """
+        self.assertIsNotNone( self.pd.compileQuery( ".* AE T ER" ).literalTail )
+        self.assertIsNone( self.pd.compileQuery( ".* AE #* T ER" ).literalTail )
+        for word in self.RHYME_WORDS:
+            for regex in self.pd.getRhymeRegex( word, "perfect" ):
+                self.assertSameAsEngine( regex )
+
+    def test_rhymeIndex( self ):
+        """
+        Test that loose and default rhymes answered by the rhyme index match
+        a full scan, for words spread across the whole dictionary.
+        """
+        self.assertEqual( self.pd.compileQuery( ".* AE #*T #*ER#*" ).rhymeVowels, rhymeKey( encodePronunciation( [ "AE", "ER" ] ) ) )
+        self.assertIsNone( self.pd.compileQuery( ".* AE @*ER" ).rhymeVowels )
+        words = self.pd.getEntries()
+        for word in self.RHYME_WORDS + words[ :: len( words ) // 100 ]:
+            for level in [ "loose", "default" ]:
+                for regex in self.pd.getRhymeRegex( word, level ):
+                    self.assertSameAsEngine( regex )
+
+        #
+        # Every pronunciation is listed, in order, under every tail of its
+        # key, and under nothing else
+        #
+        index = self.pd.getRhymeIndex()
+        for candidates in index.itervalues():
+            self.assertEqual( candidates, sorted( candidates ) )
+        total = 0
+        for pronunciationId, pronunciation in enumerate( sequenceValues( self.pd.pronunciations ) ):
+            key = rhymeKey( pronunciation )
+            total += len( key )
+            for start in xrange( len( key ) ):
+                candidates = index[ key[ start: ] ]
+                i = bisect.bisect_left( candidates, pronunciationId )
+                self.assertTrue( i < len( candidates ) and candidates[ i ] == pronunciationId )
+        self.assertEqual( sum( [ len( candidates ) for candidates in index.itervalues() ] ), total )
+
+    def test_ngramIndex( self ):
+        """
+        Test that queries narrowed down by the n-gram index match a full
+        scan, and that queries with no literal phonemes aren't narrowed.
+        The index is read from the dictionary file, and only built in
+        memory when asked for.
+        """
+        self.assertIsInstance( self.pd.getNgramIndex().postings, MappedColumn )
+        lists = PhoneticDictionary( binFile=cStringIO.StringIO( "".join( [ "{} {} {}\n".format( self.pd.words[ i ], self.pd.popularityColumn[ i ], self.pd.pronunciations[ p ] )
+                                                                           for i in xrange( 0, len( self.pd.words ), 20 ) for p in xrange( self.pd.wordIndex[ i ], self.pd.wordIndex[ i + 1 ] ) ] ) ) )
+        self.assertIsNone( lists.getNgramIndex() )
+        self.assertIsNone( lists.planCandidates( lists.compileQuery( "#* IY #* EH D" ) ) )
+        self.assertIs( lists.buildNgramIndex(), lists.getNgramIndex() )
+        self.assertIsNotNone( lists.planCandidates( lists.compileQuery( "#* IY #* EH D" ) ) )
+        built = PhonemeNgramIndex( sequenceValues( self.pd.pronunciations ) )
+        self.assertEqual( list( built.postings ), list( sequenceValues( self.pd.getNgramIndex().postings ) ) )
+        for runs in [ [ encodePronunciation( [ "IY" ] ), encodePronunciation( [ "EH", "D" ] ) ], [ encodePronunciation( [ "S", "IH", "K", "S" ] ) ], [ encodePronunciation( [ "ZH", "OY" ] ) ] ]:
+            self.assertEqual( built.candidates( runs ), self.pd.getNgramIndex().candidates( runs ) )
+        self.assertIsNotNone( self.pd.planCandidates( self.pd.compileQuery( "#* IY #* EH D" ) ) )
+        self.assertIsNone( self.pd.planCandidates( self.pd.compileQuery( "#*@#*%" ) ) )
+        self.assertIsNone( self.pd.planCandidates( self.pd.compileQuery( "N G|Z" ) ) )
+        for regex in [ "#* IY #* EH D", "R@D@NG", "S IH #*V#* % AH", "(AE T)+ #*", ".*ZH.*", "K AE T|B AE T", "N G" ]:
+            self.assertSameAsEngine( regex )
+
+    def test_pronunciationIndex( self ):
+        """
+        Test exact pronunciation lookups, homophones, and that fully literal
+        queries answered by the pronunciation index match a full scan.
+        """
+        self.assertEqual( self.pd.compileQuery( "K AE T" ).literal, encodePronunciation( [ "K", "AE", "T" ] ) )
+        self.assertIsNone( self.pd.compileQuery( "K AE T?" ).literal )
+        self.assertIsNone( self.pd.compileQuery( ".* AE T" ).literal )
+        self.assertEqual( self.pd.findWordsByPronunciation( "DH EH1 R" ), self.pd.regexSearch( "DH EH R", engine="buffer" ) )
+        self.assertEqual( self.pd.findWordsByPronunciation( [ "DH", "EH", "R" ], limit=1 ), [ "Their" ] )
+        self.assertEqual( set( self.pd.homophones( "there" ) ), set( [ "Their", "They're" ] ) )
+        self.assertEqual( self.pd.homophones( "zzzzqqqq" ), [] )
+        self.assertRaises( ValueError, self.pd.findWordsByPronunciation, "DH QQ R" )
+        for word in self.RHYME_WORDS:
+            for pronunciation in self.pd.findPronunciations( word ):
+                self.assertSameAsEngine( " ".join( pronunciation ) )
+
+    def test_nearSearch( self ):
+        """
+        Test that searching the trie within an edit distance finds what
+        comparing against every pronunciation would, ranked by distance
+        and then popularity.
+        """
+        self.assertEqual( phonemeEditDistance( encodePronunciation( [ "K", "AE", "T" ] ), encodePronunciation( [ "K", "IH", "T" ] ) ), VOWEL_SUBSTITUTION_COST )
+        self.assertEqual( phonemeEditDistance( encodePronunciation( [ "K", "AE", "T" ] ), encodePronunciation( [ "B", "AE", "T" ] ) ), SUBSTITUTION_COST )
+        self.assertEqual( phonemeEditDistance( encodePronunciation( [ "K", "AE", "T" ] ), encodePronunciation( [ "K", "AE", "T", "S" ] ) ), INSERTION_COST )
+        pronunciations = list( sequenceValues( self.pd.pronunciations ) )[ :: 10 ]
+        trie = PronunciationTrie( pronunciations, range( len( pronunciations ) ) )
+        for word in [ "cat", "chatter", "orange" ]:
+            query = encodePronunciation( self.pd.findPronunciations( word )[ 0 ] )
+            expected = set( [ ( phonemeEditDistance( p, query ), i ) for i, p in enumerate( pronunciations ) ] )
+            expected = set( [ ( d, i ) for d, i in expected if d <= 1.5 ] )
+            self.assertEqual( set( searchTrieWithin( trie, query, 1.5 ) ), expected )
+        results = self.pd.nearSearch( "cat", 1.0 )
+        self.assertNotIn( "Cat", [ w for w, d in results ] )
+        self.assertIn( ( "Hat", 1.0 ), results )
+        self.assertEqual( results, sorted( results, key=lambda ( w, d ): ( d, self.pd.findWordId( w ) ) ) )
+        self.assertEqual( self.pd.nearSearch( [ "K", "AE", "T" ], 1.0, limit=5 ), [ ( "Cat", 0.0 ) ] + results[ :4 ] )
+
+    @unittest.skipIf( not hasNumpy(), "Needs NumPy" )
+    def test_similarityRank( self ):
+        """
+        Test that similarity ranking returns the best scoring words, best
+        first, most popular first among equal scores.
+        """
+        index = self.pd.getSimilarityIndex()
+        for word in [ "cat", "chatter", "orange" ]:
+            pronunciations = [ encodePronunciation( p ) for p in self.pd.findPronunciations( word ) ]
+            scores = {}
+            for pronunciation in pronunciations:
+                for pronunciationId, score in enumerate( index.scorePronunciations( pronunciation ) ):
+                    wordId = self.pd.getPronunciationOwners()[ pronunciationId ]
+                    scores[ wordId ] = max( scores.get( wordId, score ), score )
+            del scores[ self.pd.findWordId( word ) ]
+            expected = sorted( scores.items(), key=lambda ( wordId, score ): ( -score, wordId ) )[ :25 ]
+            self.assertEqual( index.topWordIds( pronunciations, 25, self.pd.findWordId( word ) ), [ ( i, float( s ) ) for i, s in expected ] )
+        ranked = [ w for w, score in self.pd.similarityRank( "cat", 20 ) ]
+        self.assertNotIn( "Cat", ranked )
+        self.assertIn( "That", ranked )
+        self.assertIn( "Hat", ranked )
+        self.assertEqual( self.pd.similarityRank( [ "K", "AE", "T" ], 1 )[ 0 ][ 0 ], "Cat" )
+
+    def test_soundClasses( self ):
+        """
+        Test that #, @ and sound classes become character sets, which find
+        what the alternations of their phonemes would, and that inside a
+        set they add their phonemes to it.
+        """
+        self.assertEqual( preprocessPhoneticRegex( "[:nasal:]" ), "[" + "".join( sorted( encodePronunciation( [ "M", "N", "NG" ] ) ) ) + "]" )
+        self.assertEqual( PHONEME_DETAILS__by_text[ "P" ].manner, PhonemeDetails.PLOSIVE )
+        self.assertFalse( PHONEME_DETAILS__by_text[ "P" ].voiced )
+        self.assertRaises( ValueError, preprocessPhoneticRegex, "[:bogus:] AE T" )
+        self.assertRaises( ValueError, preprocessPhoneticRegex, "[[:bogus:] L] AE T" )
+        self.assertRaises( ValueError, preprocessPhoneticRegex, "[% L] AE T" )
+        self.assertEqual( preprocessPhoneticRegex( "[[:nasal:] L]" ), "[" + "".join( sorted( encodePronunciation( [ "M", "N", "NG" ] ) ) ) + encodePronunciation( [ "L" ] ) + "]" )
+        phonemes = set( PHONEME_DETAILS__by_text.keys() )
+        voiced = set( [ p.text for p in SOUND_CLASSES[ "voiced" ] ] )
+        voiceless = set( [ p.text for p in SOUND_CLASSES[ "voiceless" ] ] )
+        self.assertEqual( voiced | voiceless, phonemes )
+        self.assertEqual( voiced & voiceless, set() )
+        self.assertIn( "AE", voiced )
+        for regex, expanded in [ ( "[:nasal:] AE T", "(M|N|NG) AE T" ), ( ".* AE [:plosive:]", ".* AE (B|D|G|K|P|T)" ), ( "[:liquid:]@[:voiceless:]", "(L|R)@(P|T|K|CH|F|TH|S|SH|HH)" ),
+                                 ( "[[:nasal:][:liquid:]] AE T", "(M|N|NG|L|R) AE T" ), ( "[^[:vowel:]] AE T", "# AE T" ), ( "[[:glide:] @] EH #", "(W|Y|@) EH #" ),
+                                 ( "[^#]*", "@*" ), ( "[:voiced:]+", "(@|B|D|DH|G|JH|L|M|N|NG|R|V|W|Y|Z|ZH)+" ) ]:
+            self.assertEqual( self.pd.regexSearch( regex ), self.pd.regexSearch( expanded ) )
+            self.assertSameAsEngine( regex )
+
+    def test_buckets( self ):
+        """
+        Test the length and vowel count bounds of queries, and that searches
+        limited to the buckets within them match a full scan. Buckets are
+        read from the dictionary file, and built the same from text.
+        """
+        buckets = self.pd.getPronunciationBuckets()
+        self.assertIsInstance( buckets.order, MappedColumn )
+        self.assertIs( buckets.pronunciations, self.pd.pronunciations )
+        pronunciations = list( sequenceValues( self.pd.pronunciations ) )
+        order, keys, starts = bucketOrder( pronunciations, [ len( rhymeKey( p ) ) for p in pronunciations ] )
+        self.assertEqual( list( order ), list( sequenceValues( buckets.order ) ) )
+        self.assertEqual( sorted( buckets.buckets.items() ), sorted( PronunciationBuckets( order, keys, starts, pronunciations, self.pd.getPronunciationOwners() ).buckets.items() ) )
+        self.assertEqual( [ ( len( pronunciations[ i ] ), len( rhymeKey( pronunciations[ i ] ) ), i ) for i in order ],
+                          sorted( [ ( len( p ), len( rhymeKey( p ) ), i ) for i, p in enumerate( pronunciations ) ] ) )
+        query = self.pd.compileQuery( "%%%%%%" )
+        keys = buckets.select( query.lengthBounds, query.vowelBounds )
+        self.assertEqual( buckets.matchWordIds( query, keys ), self.pd.getSearchEngine( "scan" ).matchWordIds( query ) )
+        self.assertEqual( self.pd.compileQuery( "%%%" ).vowelBounds, ( 3, 3 ) )
+        self.assertEqual( self.pd.compileQuery( "#{2,3}@" ).lengthBounds, ( 3, 4 ) )
+        self.assertEqual( self.pd.compileQuery( "#{2,3}@|@" ).lengthBounds, ( 1, None ) )
+        for regex in [ "%%%%%%", ".*%%%%% Z", "#{2,3}@", "@#?@", "(#)\\1%", "%%|%%%%%" ]:
+            self.assertSameAsEngine( regex )
+
+    def test_namedEngine( self ):
+        """
+        Test that naming an engine sends queries to it, even those an index
+        or buckets could answer, and that leaving it out doesn't.
+        """
+        pd = loadDefaultPhoneticDictionary()
+        dfa = pd.getSearchEngine( "dfa" )
+        searched = []
+        matchWordIds = dfa.matchWordIds
+        dfa.matchWordIds = lambda query, limit=None: searched.append( query.preprocessed ) or matchWordIds( query, limit )
+        for regex in [ "K AE T", ".* AE T ER", ".*%%%%%% Z", "#* IY #* EH D" ]:
+            expected = self.pd.regexSearch( regex )
+            del searched[ : ]
+            self.assertEqual( pd.regexSearch( regex, engine="dfa" ), expected )
+            self.assertEqual( searched, [ pd.compileQuery( regex ).preprocessed ] )
+        del searched[ : ]
+        self.assertEqual( pd.regexSearch( [ "K AE T", ".* AE T ER" ], engine="dfa" ), self.pd.regexSearch( [ "K AE T", ".* AE T ER" ] ) )
+        self.assertEqual( len( searched ), 1 )
+        del searched[ : ]
+        pd.engine = "dfa"
+        pd.regexSearch( "K AE T" )
+        self.assertEqual( searched, [] )
+
+    def test_letterRegexSearch( self ):
+        """
+        Test that letter searches limited to the word lengths which can match
+        find the same words as checking every word.
+        """
+        words = self.pd.getEntries()
+        for regex in [ "a.*", "...", "ab(c|d)e?", "(a)\\1.*", "cat|.*dog", "x{2,}" ]:
+            compiled = re.compile( "^" + regex + "$", flags=re.I )
+            expected = set( [ word for word in words if compiled.match( word ) ] )
+            self.assertEqual( set( self.pd.letterRegexSearch( regex ) ), expected )
+
+    def test_popularityOrder( self ):
+        """
+        Test that word ids run in order of descending popularity, and that
+        words can still be found by name.
+        """
+        popularities = list( sequenceValues( self.pd.popularityColumn ) )
+        self.assertEqual( popularities, sorted( popularities, reverse=True ) )
+        words = self.pd.getEntries()
+        for wordId in xrange( 0, len( words ), 997 ):
+            self.assertEqual( self.pd.findWordId( words[ wordId ] ), wordId )
+        self.assertIsNone( self.pd.findWordId( "zzzzqqqq" ) )
+        self.assertEqual( self.pd.sortWordsByPopularity( [ "zzzzqqqq", "cat", "the" ] ), [ "the", "cat", "zzzzqqqq" ] )
+
+    def test_limit( self ):
+        """
+        Test that limited searches return the most popular of the full
+        results, and that every engine finds at least the lowest ids of a
+        full scan, and nothing the scan doesn't.
+        """
+        regexes = [ "%%", "#* IY #* EH D", ".*", ".* AE #*ER #*", ".* AE #*T #*ER#*", ".* AE T ER", "#{2,3}@", "(#)\\1.*" ]
+        pd = loadDefaultPhoneticDictionary( workers=2 )
+        try:
+            for regex in regexes:
+                query = self.pd.compileQuery( regex )
+                full = self.pd.getSearchEngine( "scan" ).matchWordIds( query )
+                expected = self.pd.regexSearch( regex )
+                #
+                # The trie walk can't stop early, so it finds the same for any limit
+                #
+                trieFound = pd.getSearchEngine( "trie" ).matchWordIds( query, 1 )
+                for limit in [ 1, 10, 50 ]:
+                    lowest = sorted( full )[ :limit ]
+                    self.assertEqual( self.pd.regexSearch( regex, limit=limit ), expected[ :limit ] )
+                    for engine in sorted( SEARCH_ENGINES.keys() ):
+                        found = trieFound if engine == "trie" else pd.getSearchEngine( engine ).matchWordIds( query, limit )
+                        self.assertEqual( sorted( found )[ :limit ], lowest, ( regex, engine, limit ) )
+                        self.assertTrue( found <= full, ( regex, engine, limit ) )
+        finally:
+            pd.close()
+        self.assertEqual( self.pd.regexSearch( regexes, limit=20 ), self.pd.regexSearch( regexes )[ :20 ] )
+        for regex in [ "ca.*", ".*ing", "...", "(a)\\1.*" ]:
+            self.assertEqual( self.pd.letterRegexSearch( regex, limit=20 ), self.pd.letterRegexSearch( regex )[ :20 ] )
+
+    def test_parallel( self ):
+        """
+        Test that searching shards in worker processes matches searching in this one.
+        """
+        pd = loadDefaultPhoneticDictionary( workers=3 )
+        try:
+            self.assertEqual( pd.engine, "parallel" )
+            self.assertEqual( len( pd.getSearchEngine().shards ), 3 )
+            for regex in [ "%", ".*%% Z", "[^\x80]*", "#*IH%%%%%(D|P)" ]:
+                expected = self.pd.regexSearch( regex, engine="buffer" )
+                self.assertEqual( pd.regexSearch( regex ), expected )
+                self.assertEqual( pd.regexSearch( regex, limit=10 ), expected[ :10 ] )
+            pd.setWorkers( 1 )
+            self.assertEqual( pd.engine, "buffer" )
+        finally:
+            pd.close()
+
+    def test_regexList( self ):
+        """
+        Test that searching for a list of regexes at once finds the words
+        matching any of them.
+        """
+        union = unionQuery( [ self.pd.compileQuery( "%%" ), self.pd.compileQuery( "#%%%" ) ] )
+        self.assertEqual( union.vowelBounds, ( 2, 3 ) )
+        self.assertEqual( union.lengthBounds, ( 2, None ) )
+        self.assertIsNone( unionQuery( [ self.pd.compileQuery( "(#)\\1.*" ), self.pd.compileQuery( "%%" ) ] ) )
+        lists = [ [ "%%", ".*(T|D)", "S @ #*" ], [ "(K|G).*", ".*(T|D)", "(K|G).*", "#*(AE|EH)#*" ], [ "(#)\\1.*", ".*(T|D)" ] ]
+        for word in [ "dogs", "either" ]:
+            lists.append( self.pd.getRhymeRegex( word, "default" ) )
+        for regexes in lists:
+            expected = set()
+            for regex in regexes:
+                expected |= self.pd.matchWordIds( self.pd.compileQuery( regex ) )
+            expected = self.pd.sortWordIdsByPopularity( expected )
+            for engine in [ "buffer", "dfa" ]:
+                self.assertEqual( self.pd.regexSearch( regexes, engine=engine ), expected )
+
+    def test_caches( self ):
+        """
+        Test that repeated searches are answered from the caches, with the
+        same results, and that the caches are emptied when the tables change.
+        """
+        pd = loadDefaultPhoneticDictionary()
+        pd.setCacheSizes( 4, 4 )
+        expected = self.pd.regexSearch( ".* AE #*T #*ER#*" )
+        found = pd.regexSearch( ".* AE #*T #*ER#*" )
+        self.assertEqual( found, expected )
+        found.pop()
+        self.assertEqual( pd.regexSearch( ".*  ae #*t #*er#*" ), expected )
+        self.assertEqual( pd.regexSearch( [ "%", "K AE T" ] ), pd.regexSearch( [ "K AE T", "%", "%" ] ) )
+        stats = pd.cacheStats()
+        self.assertEqual( ( stats[ "queries" ][ "hits" ], stats[ "queries" ][ "misses" ] ), ( 3, 4 ) )
+        self.assertEqual( ( stats[ "results" ][ "hits" ], stats[ "results" ][ "misses" ] ), ( 2, 2 ) )
+        self.assertEqual( pd.regexSearch( ".* AE #*T #*ER#*", limit=3 ), expected[ :3 ] )
+        self.assertEqual( pd.cacheStats()[ "results" ][ "size" ], 3 )
+
+        pd.rebuildTables()
+        self.assertEqual( pd.cacheStats()[ "results" ], { "size": 0, "maxSize": 4, "hits": 0, "misses": 0 } )
+        pd.setCacheSizes( 0, 0 )
+        self.assertEqual( pd.cacheStats(), { "queries": None, "results": None } )
+        self.assertEqual( pd.regexSearch( ".* AE #*T #*ER#*" ), expected )
+
+    def test_batch( self ):
+        """
+        Test that batch rhymes and lookups give what one word at a time would.
+        """
+        words = self.RHYME_WORDS + [ "Cat", "hat", "zzzzqqqq", "cat" ]
+        lookups = self.pd.batchFindPronunciations( words )
+        self.assertEqual( sorted( lookups.keys() ), sorted( set( words ) ) )
+        for word in words:
+            self.assertEqual( lookups[ word ], self.pd.findPronunciations( word ) )
+        for level in self.pd.getRhymeLevels():
+            for limit in [ None, 5 ]:
+                rhymes = self.pd.batchRhyme( words, level, limit=limit )
+                self.assertEqual( rhymes[ "zzzzqqqq" ], [] )
+                for word in words:
+                    if word == "zzzzqqqq":
+                        continue
+                    expected = [ r for r in self.pd.regexSearch( self.pd.getRhymeRegex( word, level ) ) if r.lower() != word.lower() ]
+                    self.assertEqual( rhymes[ word ], expected[ :limit ] )
+        self.assertRaises( ValueError, self.pd.batchRhyme, words, "bogus" )
+
+    def test_compact( self ):
+        """
+        Test that a dictionary packed into the compact layout answers as
+        the list layout does, and that entry views read it correctly.
+        """
+        lines = []
+        for wordId in xrange( 0, len( self.pd.words ), 20 ):
+            for p in xrange( self.pd.wordIndex[ wordId ], self.pd.wordIndex[ wordId + 1 ] ):
+                lines.append( "{} {} {}\n".format( self.pd.words[ wordId ], self.pd.popularityColumn[ wordId ], self.pd.pronunciations[ p ] ) )
+        buf = "".join( lines )
+        lists = PhoneticDictionary( binFile=cStringIO.StringIO( buf ) )
+        compact = PhoneticDictionary( binFile=cStringIO.StringIO( buf ), compact=True )
+        self.assertIsInstance( compact.words, MappedStringTable )
+        self.assertEqual( list( sequenceValues( compact.words ) ), lists.words )
+        for regex in [ "%%", ".* AE #*T #*ER#*", "#* IY #* EH D" ]:
+            self.assertEqual( compact.regexSearch( regex ), lists.regexSearch( regex ) )
+        for word in lists.words[ :: 100 ]:
+            entry = compact.findEntry( word )
+            self.assertEqual( entry.word, word )
+            self.assertEqual( entry.popularity, self.pd.findPopularity( word ) )
+            self.assertEqual( entry.pronunciations, self.pd.findPronunciations( word ) )
+        self.assertIsNone( compact.findEntry( "zzzzqqqq" ) )
+        self.assertEqual( [ e.word for e in compact.iterDictionaryEntries() ], lists.words )
+
+    def test_decode( self ):
+        """
+        Test that pronunciations decode to tuples, or to lists when asked,
+        and that the decoded pronunciation cache hands back the same tuples.
+        """
+        cat = self.pd.findPronunciations( "cat" )
+        self.assertEqual( cat, [ ( "K", "AE", "T" ) ] )
+        self.assertEqual( self.pd.findPronunciations( "cat", asList=True ), [ [ "K", "AE", "T" ] ] )
+        self.assertEqual( decodePronunciation( encodePronunciation( cat[ 0 ] ) ), cat[ 0 ] )
+        self.assertRaises( KeyError, decodePronunciation, "cat" )
+        cache = setDecodedPronunciationCache( 2 )
+        try:
+            self.assertIs( self.pd.findPronunciations( "cat" )[ 0 ], self.pd.findPronunciations( "cat" )[ 0 ] )
+            for word in [ "dog", "cat", "hat" ]:
+                self.pd.findPronunciations( word )
+            self.assertEqual( len( cache ), 2 )
+            self.assertNotIn( encodePronunciation( [ "D", "AO", "G" ] ), cache )
+            self.assertIn( cat[ 0 ], [ decodePronunciation( p ) for p in cache.links ] )
+        finally:
+            setDecodedPronunciationCache( None )
+
+    def test_compile( self ):
+        """
+        Test that text dictionaries load through a compiled copy, which is
+        rebuilt when the text changes.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            phoneticPath = os.path.join( directory, "dict.txt" )
+            popularityPath = os.path.join( directory, "pop.txt" )
+            words = self.pd.getEntries()[ :500 ]
+            with open( phoneticPath, "w" ) as fout:
+                for word in words:
+                    for pronunciation in self.pd.findPronunciations( word ):
+                        fout.write( "{}  {}\n".format( word.upper(), " ".join( pronunciation ) ) )
+            with open( popularityPath, "w" ) as fout:
+                for word in words:
+                    fout.write( "{} {}\n".format( word, self.pd.findPopularity( word ) ) )
+            binPath = defaultCompiledPath( phoneticPath )
+            self.assertIsNone( compiledSourceHash( binPath ) )
+
+            pd = loadCompiledPhoneticDictionary( phoneticPath, popularityPath )
+            self.assertIsInstance( pd.words, MappedStringTable )
+            self.assertEqual( compiledSourceHash( binPath ), hashSources( [ phoneticPath, popularityPath ] ) )
+            self.assertEqual( pd.getEntries(), words )
+            self.assertEqual( pd.regexSearch( "%%" ), [ w for w in self.pd.regexSearch( "%%" ) if w in words ] )
+            self.assertEqual( pd.getWordLengthBuckets()[ 3 ], [ ( i, w ) for i, w in enumerate( words ) if len( w ) == 3 ] )
+
+            with open( popularityPath, "a" ) as fout:
+                fout.write( "{} 1\n".format( words[ 0 ] ) )
+            pd = loadCompiledPhoneticDictionary( phoneticPath, popularityPath )
+            self.assertEqual( pd.sourceHash, hashSources( [ phoneticPath, popularityPath ] ) )
+            self.assertEqual( pd.getEntries()[ -1 ], words[ 0 ] )
+        finally:
+            shutil.rmtree( directory )
+
+if __name__ == '__main__':
+    unittest.main()
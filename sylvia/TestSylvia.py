@@ -5,7 +5,11 @@
 #
 
 import unittest
+import cStringIO
+import tempfile
 from SylviaApiWrapper import Sylvia
+from PronunciationInferencer import *
+from InferenceBenchmark import *
 
 class TestSylvia( unittest.TestCase ):
     """
@@ -87,6 +91,121 @@ class TestSylvia( unittest.TestCase ):
             for p in lookups:
                 self.verifyPronunciation( p )
 
+    def test_inferRuleAutomaton( self ):
+        """
+        Test that inferring pronunciations with the rule automaton agrees
+        with trying each rule in turn.
+        """
+        pi = self.sylvia.pi
+        words = [ "knife", "knee", "kn", "knack", "unknown", "eighty", "quibble", "rafloy", "she'sd", "a", "y" ]
+        pd = self.sylvia.pd
+        words += [ pd.words[ i ] for i in xrange( 0, len( pd.words ), 100 ) ]
+        for word in words:
+            self.assertEqual( pi.pronounce( word, asList=True ), pi.pronounceByRules( word ), word )
+
+    def test_inferencerModel( self ):
+        """
+        Test that the packaged inferencer model is up to date with the
+        generated rules, and that models can be written and read back.
+        """
+        generated = PronunciationInferencer()
+        loaded = loadDefaultPronunciationInferencer()
+        self.assertEqual( [ ( r.kwargs[ 'sequence' ], r.kwargs[ 'phonemes' ], ruleAlignment( r ) ) for r in loaded.rules ],
+                          [ ( r.kwargs[ 'sequence' ], r.kwargs[ 'phonemes' ], ruleAlignment( r ) ) for r in generated.rules ] )
+        self.assertEqual( list( loaded.getRuleAutomaton().table ), generated.getRuleAutomaton().table )
+        self.assertEqual( loaded.getRuleAutomaton().outputs, generated.getRuleAutomaton().outputs )
+
+        buf = cStringIO.StringIO()
+        loaded.writeModel( buf )
+        reloaded = PronunciationInferencer( modelFile=cStringIO.StringIO( buf.getvalue() ) )
+        for word in [ "knife", "rafloy", "fihlbart", "sylvia" ]:
+            self.assertEqual( reloaded.pronounce( word ), generated.pronounce( word ) )
+        self.assertRaises( ValueError, PronunciationInferencer, modelFile=cStringIO.StringIO( buf.getvalue().replace( "MVER", "XXXX" ) ) )
+
+        #
+        # However much is cut off, truncated models are refused as ValueErrors
+        #
+        model = buf.getvalue()
+        for length in range( 0, 64 ) + range( 64, len( model ), len( model ) // 50 ) + [ len( model ) - 1 ]:
+            self.assertRaises( ValueError, PronunciationInferencer, modelFile=cStringIO.StringIO( model[ :length ] ) )
+        with tempfile.TemporaryFile() as fin:
+            self.assertRaises( ValueError, PronunciationInferencer, modelFile=fin )
+
+    def test_inferenceCache( self ):
+        """
+        Test that inferred pronunciations are remembered by sanitized word,
+        can't be changed through what's returned, and are forgotten when
+        the rules change.
+        """
+        pi = PronunciationInferencer( cacheSize=2 )
+        pronunciation = pi.pronounce( "Rafloy" )
+        self.assertIsInstance( pronunciation, tuple )
+        self.assertEqual( list( pronunciation ), pi.pronounceByRules( "rafloy" ) )
+        asList = pi.pronounce( "rafloy!", asList=True )
+        asList.append( "Z" )
+        self.assertEqual( pi.pronounce( "RAFLOY" ), pronunciation )
+        self.assertEqual( pi.cacheStats(), { "size": 1, "maxSize": 2, "hits": 2, "misses": 1 } )
+
+        pi.addRule( PronunciationRule( sequence="oy", phonemes=[ "OW", "IY" ] ) )
+        self.assertEqual( pi.cacheStats()[ "size" ], 0 )
+        self.assertEqual( pi.pronounce( "rafloy" )[ -2: ], ( "OW", "IY" ) )
+        pi.setCacheSize( 0 )
+        self.assertIsNone( pi.cacheStats() )
+        self.assertEqual( pi.pronounce( "rafloy" )[ -2: ], ( "OW", "IY" ) )
+
+    def test_pronounceMany( self ):
+        """
+        Test that pronounceMany gives each distinct word once, in order,
+        pronounced as pronounceList would, whether or not it uses workers,
+        and that workers aren't sent words far ahead of what's been yielded.
+        """
+        pi = self.sylvia.pi
+        words = [ "rafloy", "fihlbart", "Rafloy", "123", "rafloy", "knife" ] * 3 + [ "sylvia" ]
+        distinct = [ "rafloy", "fihlbart", "Rafloy", "123", "knife", "sylvia" ]
+        expected = zip( distinct, pi.pronounceList( distinct ) )
+        self.assertEqual( expected[ 3 ], ( "123", () ) )
+        self.assertEqual( list( pi.pronounceMany( iter( words ), chunksize=4 ) ), expected )
+        self.assertEqual( list( pi.pronounceMany( iter( words ), workers=2, chunksize=4 ) ), expected )
+        self.assertRaises( ValueError, list, pi.pronounceMany( words, chunksize=0 ) )
+
+        read = []
+        def generate():
+            for i in xrange( 10000 ):
+                read.append( i )
+                yield "word{}".format( i )
+        pronounced = pi.pronounceMany( generate(), workers=2, chunksize=10 )
+        self.assertEqual( next( pronounced )[ 0 ], "word0" )
+        self.assertLessEqual( len( read ), 2 * PRONOUNCE_CHUNKS_PER_WORKER * 10 )
+        for i in xrange( 99 ):
+            next( pronounced )
+        self.assertLessEqual( len( read ), 100 + 2 * PRONOUNCE_CHUNKS_PER_WORKER * 10 )
+        pronounced.close()
+
+    def test_evaluateInferencer( self ):
+        """
+        Test that scoring the inferencer covers the words asked for, gives
+        rates between 0 and 1, and leaves its cache as it was.
+        """
+        self.assertEqual( percentile( [ 1, 2, 3, 4, 5, 6, 7, 8, 9, 10 ], 0.5 ), 5 )
+        self.assertEqual( percentile( [ 1, 2, 3, 4, 5, 6, 7, 8, 9, 10 ], 0.99 ), 10 )
+        self.assertEqual( percentile( [ 7 ], 0.0 ), 7 )
+        self.assertIsNone( percentile( [], 0.5 ) )
+        self.assertEqual( popularityWeight( -1 ), 0.0 )
+        self.assertLess( popularityWeight( 10 ), popularityWeight( 1000 ) )
+
+        pi = self.sylvia.pi
+        cache = pi.cache
+        results = evaluateInferencer( self.sylvia.pd, pi, count=20, workers=1 )
+        self.assertIs( pi.cache, cache )
+        self.assertEqual( sorted( results.keys() ), sorted( [ "words", "workers", "rules", "seconds", "words_per_second", "latency_p50_us", "latency_p99_us",
+                                                             "exact_match_rate", "mean_distance", "weighted_exact_match_rate", "weighted_distance" ] ) )
+        self.assertEqual( results[ "words" ], 20 )
+        self.assertEqual( results[ "workers" ], 1 )
+        for key in [ "exact_match_rate", "weighted_exact_match_rate" ]:
+            self.assertGreaterEqual( results[ key ], 0.0 )
+            self.assertLessEqual( results[ key ], 1.0 )
+        self.assertLessEqual( results[ "latency_p50_us" ], results[ "latency_p99_us" ] )
+
     def test_getPhoneticRegex_word( self ):
         """
         Test Sylvia.getPhoneticRegex() with words as input
@@ -103,13 +222,49 @@ class TestSylvia( unittest.TestCase ):
         """
         Test Sylvia.getPhoneticRegex() with pronunciations as input
         """
-        words = [ [ "K", "AE", "T" ], [ "SH", "EH", "S", "D" ] ]
+        words = [ [ "K", "AE", "T" ], [ "SH", "EH", "S", "D" ], ( "K", "AE", "T" ), self.sylvia.pd.findPronunciations( "cat" )[ 0 ], self.sylvia.pi.pronounce( "zorblax" ) ]
 
         for word in words:
             for pattern in self.sylvia.phoneticPatterns:
                 regex = self.sylvia.generatePhoneticRegex( word, pattern )
                 self.assertIsInstance( regex, basestring )
+                self.assertEqual( regex, self.sylvia.generatePhoneticRegex( list( word ), pattern ) )
                 # TODO check contents once we have linting
 
+    def test_findWords( self ):
+        """
+        Test Sylvia.findWords(), searching in this process and in worker processes.
+        """
+        regexes = self.sylvia.generatePhoneticRegex( "cat", "default" )
+        words = self.sylvia.findWords( regexes )
+        self.assertIn( "Hat", words )
+        self.assertEqual( self.sylvia.findWords( regexes, limit=5 ), words[ :5 ] )
+
+        parallel = Sylvia( workers=2 )
+        try:
+            self.assertEqual( parallel.findWords( "%%%" ), self.sylvia.findWords( "%%%" ) )
+            self.assertEqual( parallel.findWords( "%%%", limit=5 ), self.sylvia.findWords( "%%%", limit=5 ) )
+        finally:
+            parallel.pd.close()
+
+    def test_batchGetPronunciation( self ):
+        """
+        Test Sylvia.batchGetPronunciation() agrees with Sylvia.getPronunciation().
+        """
+        words = [ "cats", "dogs", "rafloy", "she's", "cats" ]
+        for findAll in [ False, True ]:
+            results = self.sylvia.batchGetPronunciation( words, findAll=findAll )
+            self.assertEqual( sorted( results.keys() ), sorted( set( words ) ) )
+            for word in words:
+                self.assertEqual( results[ word ], self.sylvia.getPronunciation( word, findAll=findAll ) )
+
+    def test_batchRhyme( self ):
+        """
+        Test Sylvia.batchRhyme() finds rhymes for known and unknown words.
+        """
+        results = self.sylvia.batchRhyme( [ "cat", "rafloy" ], "loose", limit=10 )
+        self.assertIn( "That", results[ "cat" ] )
+        self.assertTrue( 0 < len( results[ "rafloy" ] ) <= 10 )
+
 if __name__ == '__main__':
     unittest.main()
@@ -4,8 +4,20 @@ if sys.version_info[0] > 2:
 
 from PhonemeDetails import *
 from LetterDetails import *
+from AhoCorasick import *
 from PronunciationInferencer import *
+from LruCache import *
+from DictionaryFormat import *
+from PhoneticAutomaton import *
+from PronunciationTrie import *
+from PhonemeEditDistance import *
+from PhoneticSimilarity import *
+from PhonemeNgramIndex import *
+from PronunciationBuckets import *
+from PhoneticQuery import *
+from SearchEngines import *
 from PhoneticDictionary import *
+from DictionaryCompiler import *
 from Poem import *
 from SylviaConsole import *
 from SylviaEpcServer import *
@@ -8,15 +8,33 @@ if __name__ == "__main__":
     # parse args
     #
     parser = argparse.ArgumentParser()
-    parser.add_argument( "-o", "--optimize_dictionary", help="Compile the dictionary to speed up later queries.")
+    parser.add_argument( "-o", "--optimize_dictionary", help="Compile the dictionary to this path, to speed up later loads, and exit." )
     parser.add_argument( "-d", "--dictionary_path", help="Point to an alternate dictionary file.")
     parser.add_argument( "-w", "--popularity_path", help="Point to an alternate popularity file.")
     parser.add_argument( "-c", "--command", help="Run a one-off command." )
     parser.add_argument( "-e", "--emacs_server", action="store_true", help="Start Emacs RPC Server" )
+    parser.add_argument( "-i", "--infer_file", help="Infer the pronunciation of every word in this file, or - for stdin, writing one line per word, and exit." )
+    parser.add_argument( "-j", "--workers", type=int, help="Search the dictionary, or infer pronunciations, with this many processes." )
     args = parser.parse_args()
 
+    if args.infer_file:
+        #
+        # Infer and exit. Words are separated by whitespace, and each
+        # distinct one is written once, followed by its phonemes.
+        #
+        pi = loadDefaultPronunciationInferencer()
+        fin = sys.stdin if args.infer_file == "-" else open( args.infer_file, "r" )
+        with fin:
+            words = ( word for line in fin for word in line.split() )
+            for word, pronunciation in pi.pronounceMany( words, workers=args.workers ):
+                sys.stdout.write( " ".join( ( word, ) + pronunciation ) + "\n" )
+        exit()
+
+    compiled = False
+
     #
-    # Open dictionary
+    # Open dictionary. Text dictionaries are loaded through a compiled
+    # copy, rebuilt whenever the text changes.
     #
     if args.dictionary_path:
         if os.path.splitext( args.dictionary_path )[1].upper() == ".TXT":
@@ -24,19 +42,31 @@ if __name__ == "__main__":
             if not args.popularity_path:
                 print "If using a text dictionary file, a popularity file is also needed."
                 exit()
-            with open( args.dictionary_path, "r" ) as f1:
-                with open( args.popularity_path, "r" ) as f2:
-                    pd = PhoneticDictionary( textFile=f1, wordPopFile=f2 )
+            if args.optimize_dictionary:
+                pd = compileDictionary( args.dictionary_path, args.popularity_path, args.optimize_dictionary )
+                compiled = True
+            else:
+                pd = loadCompiledPhoneticDictionary( args.dictionary_path, args.popularity_path, workers=args.workers )
         else:
             with open( args.dictionary_path, "rb" ) as f:
-                pd = PhoneticDictionary( binFile=f )
+                pd = PhoneticDictionary( binFile=f, workers=args.workers )
     else:
-        pd = loadDefaultPhoneticDictionary()
+        pd = loadDefaultPhoneticDictionary( workers=args.workers )
+
+    if args.optimize_dictionary:
+        #
+        # Compile and exit. Binary dictionaries are rewritten in the
+        # current format, with every precomputed index.
+        #
+        if not compiled:
+            saveBinAtomically( pd, args.optimize_dictionary )
+        print "Wrote", len( pd.words ), "words to", args.optimize_dictionary
+        exit()
 
     #
     # Create inference engine
     #
-    pi = PronunciationInferencer()
+    pi = loadDefaultPronunciationInferencer()
 
     #
     # Create the console